@@ -1,9 +1,25 @@
 import os
+import math
+import time
+import cProfile
+import threading
+import hashlib
 import logging
-from flask import Flask, request, jsonify
+import itertools
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
-from controllers.controller import Controller
+from config import db_config, AUDIO_BLOB_DIR
 from models.audio_model import AudioModel
+from models.blob_store import LocalBlobStore
+from models.job_store import JobStore
+from models.result_cache import ResultCache
+from models.audio_decoder import iter_audio_blocks, ffmpeg_disponivel
+from models.energy_gate import EnergyGate
+from models.feature_pipeline import get_pipeline, read_feature_pipeline
+from models.timeline import SnoreTimeline, dequantize_probabilities, downsample_curve
+from controllers.job_runner import JobRunner
+from controllers.session_manager import SessionManager, SessaoNaoEncontrada, ConflitoSessao
+from metrics import registry, stage_timer, Gauge, ERRORS
 from pydub import AudioSegment
 from pydub.utils import which
 
@@ -17,33 +33,268 @@ CORS(app)
 logging.basicConfig(level=logging.DEBUG)
 app.logger.setLevel(logging.DEBUG)
 
-controller = Controller()
+# Backend de inferência: 'keras' (modelo_sono.h5) ou 'tflite' (modelo_sono.tflite, exportado pelo app.py)
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'keras')
+
+# Com ENERGY_GATE=1, os segmentos silenciosos são descartados antes do modelo (ver `EnergyGate`); os limiares
+# são GATE_RMS_DB (dBFS) e GATE_FLUX_DB (dB; vazio desativa o fluxo espectral)
+ENERGY_GATE = EnergyGate(
+    rms_threshold_db=float(os.environ.get('GATE_RMS_DB', -50)),
+    flux_threshold_db=float(os.environ['GATE_FLUX_DB']) if os.environ.get('GATE_FLUX_DB') else None
+) if os.environ.get('ENERGY_GATE') == '1' else None
+
+# Com PRELOAD_MODEL=1 o modelo é carregado na importação do módulo, para servidores WSGI com vários
+# workers e pré-carregamento (ex.: gunicorn --preload -w 4 api:app) compartilharem o modelo via fork
+PRELOAD_MODEL = os.environ.get('PRELOAD_MODEL') == '1'
+
+# Taxa de amostragem fixa da decodificação em memória. O padrão é a taxa das features (22050 Hz), para que o
+# pipeline de features não precise reamostrar o sinal decodificado
+DECODE_SAMPLE_RATE = int(os.environ.get('DECODE_SAMPLE_RATE', 22050))
+
+# O pool de conexões é criado no primeiro acesso ao banco (ou pela inicialização em segundo plano), então a
+# API sobe mesmo com o MySQL indisponível
+audio_model = AudioModel(**db_config, pool_size=int(os.environ.get('DB_POOL_SIZE', 5)),
+                         blob_store=LocalBlobStore(AUDIO_BLOB_DIR))
+
+# Cache de resultados por conteúdo do áudio + versão do modelo + parâmetros da avaliação
+result_cache = ResultCache(audio_model, max_bytes=int(os.environ.get('RESULT_CACHE_MAX_BYTES', 4 * 1024 * 1024)))
+
+
+def hash_upload(audio_file):
+    """Calcula o SHA-256 dos bytes enviados e volta o stream ao início."""
+    sha = hashlib.sha256()
+    for chunk in iter(lambda: audio_file.stream.read(1 << 20), b''):
+        sha.update(chunk)
+    audio_file.stream.seek(0)
+    return sha.hexdigest()
+
+
+_identidade_modelo = None
+
+
+def identidade_modelo():
+    """
+    Retorna (fingerprint, pipeline de features) do modelo do backend padrão, ou (None, None) se ele não existir.
+
+    Se o Controller já foi carregado, usa os valores dele; caso contrário, eles são calculados uma única vez a
+    partir do arquivo do modelo e da sua descrição de pipeline, como faz o Controller, mas sem carregar o
+    modelo: um acerto no cache de resultados não depende do Controller.
+    """
+    global _identidade_modelo
+    if _controller is not None:
+        if _controller.model_fingerprint is None:
+            return None, None
+        return _controller.model_fingerprint, _controller.pipeline.describe()
+    with _init_lock:
+        if _identidade_modelo is None:
+            model_path = 'modelo_sono.tflite' if INFERENCE_BACKEND == 'tflite' else 'modelo_sono.h5'
+            if not os.path.exists(model_path):
+                return None, None
+            sha = hashlib.sha256()
+            with open(model_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    sha.update(chunk)
+            # Modelos sem a descrição do pipeline usam features na taxa original (ver `verificar_pipeline_modelo`)
+            pipeline = read_feature_pipeline(model_path) or get_pipeline(sample_rate=None).describe()
+            _identidade_modelo = (sha.hexdigest(), pipeline)
+        return _identidade_modelo
+
+
+def versao_resultados(gate=None, decode_rate=None):
+    """
+    Versão dos resultados de uma avaliação, usada na chave do cache e gravada com a linha do tempo: o modelo,
+    o gate de energia efetivamente aplicado (ou 'gate:off'), a taxa de decodificação do áudio (ou 'native') e
+    o pipeline de features. Resultados com e sem o gate, decodificados em outra taxa ou de outro pipeline não
+    são misturados.
+    """
+    fingerprint, pipeline = identidade_modelo()
+    if fingerprint is None:
+        return None
+    return "|".join([fingerprint, gate.describe() if gate is not None else "gate:off",
+                     f"decode:{decode_rate or 'native'}", pipeline])
+
+
+def salvar_resultado_job(job, upload_path, resultado, timeline):
+    with open(upload_path, 'rb') as f:
+        resultado['audio_id'] = audio_model.insert_audio(None, job['filename'], f.read(), resultado["message"],
+                                                         resultado["percent_ronco"], timeline=timeline,
+                                                         model_version=versao_resultados())
+
+
+def salvar_resultado_sessao(sessao, audio_path, resultado, timeline):
+    with open(audio_path, 'rb') as f:
+        return audio_model.insert_audio(None, sessao.name, f.read(), resultado["message"],
+                                        float(resultado["percent_ronco"]), timeline=timeline,
+                                        model_version=versao_resultados())
+
+
+# Controller (modelo e motor de inferência) e executor de jobs são criados sob demanda, por processo
+_controller = None
+_job_runner = None
+_session_manager = None
+_init_lock = threading.RLock()
+_estado = {'init_started': False, 'warmed_up': False}
+
+
+def carregar_controller(iniciar_motor=True):
+    """
+    Retorna o Controller do processo, carregando o modelo na primeira chamada. Com `iniciar_motor=True`,
+    também inicia o motor de inferência e aquece o modelo com uma predição fictícia.
+    """
+    global _controller
+    if _controller is not None and (_controller.inference_engine is not None or not iniciar_motor):
+        return _controller
+    with _init_lock:
+        if _controller is None:
+            # O TensorFlow só é importado aqui, para que a importação do módulo seja rápida
+            from controllers.controller import Controller
+            _controller = Controller(backend=INFERENCE_BACKEND, energy_gate=ENERGY_GATE)
+        if not _estado['warmed_up'] and not iniciar_motor:
+            _estado['warmed_up'] = _controller.aquecer()
+        if iniciar_motor and _controller.inference_engine is None:
+            # Agrupa as predições de requisições concorrentes em lotes compartilhados
+            _controller.iniciar_motor_inferencia(
+                max_batch_size=int(os.environ.get('INFERENCE_MAX_BATCH', 512)),
+                max_wait=float(os.environ.get('INFERENCE_MAX_WAIT_MS', 5)) / 1000
+            )
+            _estado['warmed_up'] = _controller.aquecer()
+    return _controller
+
+
+def obter_job_runner():
+    """Retorna o executor de jobs do processo, criando-o (e retomando jobs pendentes) na primeira chamada."""
+    global _job_runner
+    with _init_lock:
+        if _job_runner is None:
+            # Jobs assíncronos para gravações longas: decodificação e features em um pool de processos
+            _job_runner = JobRunner(
+                carregar_controller(),
+                JobStore(os.environ.get('JOBS_DB', 'jobs.db')),
+                on_result=salvar_resultado_job,
+                workers=int(os.environ.get('JOB_WORKERS', 2)),
+                max_pending=int(os.environ.get('JOB_MAX_PENDING', 16))
+            )
+            _job_runner.recover()
+    return _job_runner
+
+
+def obter_session_manager():
+    """Retorna o gerenciador de sessões de avaliação incremental do processo, criando-o na primeira chamada."""
+    global _session_manager
+    with _init_lock:
+        if _session_manager is None:
+            _session_manager = SessionManager(
+                carregar_controller(),
+                on_close=salvar_resultado_sessao,
+                max_sessions=int(os.environ.get('SESSION_MAX_OPEN', 64)),
+                ttl_seconds=float(os.environ.get('SESSION_TTL_SECONDS', 3 * 3600))
+            )
+    return _session_manager
+
+
+def iniciar_em_segundo_plano():
+    """
+    Inicia, uma única vez por processo, uma thread que carrega e aquece o modelo, conecta ao banco de dados
+    (tentando novamente com espera exponencial enquanto ele estiver indisponível) e retoma os jobs pendentes.
+    """
+    with _init_lock:
+        if _estado['init_started']:
+            return
+        _estado['init_started'] = True
+    threading.Thread(target=_inicializar, name="api-init", daemon=True).start()
+
+
+def _inicializar():
+    try:
+        carregar_controller()
+    except Exception as e:
+        app.logger.error(f"Erro ao carregar o modelo: {e}")
+
+    espera = 1
+    while True:
+        try:
+            audio_model.connect()
+            break
+        except Exception as e:
+            app.logger.warning(f"Banco de dados indisponível, nova tentativa em {espera}s: {e}")
+            time.sleep(espera)
+            espera = min(espera * 2, 30)
 
-db_config = {
-    'host': '89.116.74.250',
-    'port': 3307,  
-    'user': 'dbaudio',
-    'password': 'dbaudio',
-    'database': 'dbaudio'
-}
+    try:
+        obter_job_runner()
+    except Exception as e:
+        app.logger.error(f"Erro ao retomar os jobs pendentes: {e}")
 
-audio_model = AudioModel(**db_config)
-audio_model.connect()
+
+def _reiniciar_apos_fork():
+    # O processo filho herda o modelo carregado, mas não as threads (motor de inferência, inicialização)
+    # nem pode reutilizar as conexões do pai: esses recursos são recriados sob demanda no filho
+    global _job_runner, _session_manager, _init_lock
+    _init_lock = threading.RLock()
+    _job_runner = None
+    _session_manager = None
+    _estado['init_started'] = False
+    if _controller is not None:
+        _controller.inference_engine = None
+    audio_model.discard_pool()
+
+
+os.register_at_fork(after_in_child=_reiniciar_apos_fork)
 
 
 def converter_audio_para_wav(input_path, output_path):
     try:
         # Verificar o tipo de formato antes de converter
-        audio = AudioSegment.from_file(input_path)
-        audio.export(output_path, format="wav")
+        with stage_timer('pydub_conversion'):
+            audio = AudioSegment.from_file(input_path)
+            audio.export(output_path, format="wav")
         return output_path
     except Exception as e:
         app.logger.error(f"Erro ao converter áudio para WAV: {e}")
         return None
 
 
+def avaliar_por_arquivo(audio_file, timeline=None):
+    """
+    Caminho alternativo de avaliação: salva o upload em 'uploads/', converte para WAV com o pydub e avalia
+    o arquivo. Retorna o resultado da avaliação, ou None se a conversão falhar.
+    """
+    audio_filename = audio_file.filename
+
+    # Definir o caminho para salvar o arquivo temporariamente em 'uploads/'
+    file_path = os.path.join('uploads', audio_filename)
+
+    # Verificar se a pasta 'uploads/' existe, caso contrário, criar
+    if not os.path.exists('uploads'):
+        os.makedirs('uploads')
+
+    # Salvar o arquivo temporariamente na pasta uploads/
+    audio_file.save(file_path)
+    app.logger.info(f"Arquivo de áudio salvo temporariamente em {file_path}")
+
+    # Converter áudio para WAV (funciona com MP3, AAC, etc.)
+    wav_path = file_path.replace(os.path.splitext(file_path)[1], ".wav")
+    wav_file = converter_audio_para_wav(file_path, wav_path)
+
+    try:
+        if not wav_file:
+            return None
+        # Agora use o arquivo WAV para o processamento, lido em blocos para limitar o uso de memória
+        return carregar_controller().avaliar_noite_streaming(wav_file, timeline=timeline)
+    finally:
+        for path in {file_path, wav_path}:
+            if os.path.exists(path):
+                os.remove(path)  # Remover os arquivos temporários
+        app.logger.info(f"Arquivo {file_path} e {wav_path} excluídos após o processamento.")
+
+
 @app.route('/avaliar_sono', methods=['POST'])
 def avaliar_sono():
+    with stage_timer('avaliar_sono'):
+        return _avaliar_sono()
+
+
+def _avaliar_sono():
     try:
         if 'audio' not in request.files:
             app.logger.error("Arquivo de áudio não encontrado")
@@ -52,65 +303,319 @@ def avaliar_sono():
         audio_file = request.files['audio']
         audio_filename = audio_file.filename
 
-        # Definir o caminho para salvar o arquivo temporariamente em 'uploads/'
-        file_path = os.path.join('uploads', audio_filename)
+        # Uploads repetidos do mesmo áudio reaproveitam o resultado sem carregar nem passar pelo modelo. O gate
+        # de energia e a taxa DECODE_SAMPLE_RATE só valem na decodificação em memória; o caminho por arquivo
+        # temporário avalia todos os segmentos na taxa original do áudio, e o seu resultado tem outra chave
+        em_memoria = ffmpeg_disponivel()
+        versao = versao_resultados(ENERGY_GATE, DECODE_SAMPLE_RATE) if em_memoria else versao_resultados()
+        audio_hash = hash_upload(audio_file)
+        cache_key = ResultCache.make_key(audio_hash, versao, segment_duration=1.0, threshold=20)
+        resultado = result_cache.get(cache_key)
+        cache_hit = resultado is not None
+
+        if not cache_hit and em_memoria:
+            # Decodifica o upload em memória, enviando os bytes ao ffmpeg por pipe, e avalia o sinal em blocos
+            # à medida que ele é decodificado, sem mantê-lo inteiro na memória
+            try:
+                timeline = SnoreTimeline(segment_duration=1.0)
+                resultado = carregar_controller().avaliar_blocos(
+                    iter_audio_blocks(audio_file.stream, DECODE_SAMPLE_RATE), DECODE_SAMPLE_RATE, timeline=timeline)
+            except RuntimeError as e:
+                app.logger.warning(f"Decodificação em memória falhou, usando arquivo temporário: {e}")
+                audio_file.stream.seek(0)
+                # O caminho por arquivo tem a sua própria chave, que pode já estar no cache
+                versao = versao_resultados()
+                cache_key = ResultCache.make_key(audio_hash, versao, segment_duration=1.0, threshold=20)
+                resultado = result_cache.get(cache_key)
+                cache_hit = resultado is not None
+
+        app.logger.info(f"Cache de resultados: {'acerto' if cache_hit else 'falha'} "
+                        f"(taxa de acerto {result_cache.stats()['hit_rate']:.1%})")
+
+        if resultado is None:
+            timeline = SnoreTimeline(segment_duration=1.0)
+            resultado = avaliar_por_arquivo(audio_file, timeline)
+            if resultado is None:
+                return jsonify({"error": "Falha na conversão do arquivo para WAV."}), 500
+
+        # Se o processamento for bem-sucedido, insira os dados no banco de dados
+        if "message" in resultado and "percent_ronco" in resultado:
+            if not cache_hit and versao is not None:
+                result_cache.put(cache_key, resultado)
+            audio_file.stream.seek(0)
+            with stage_timer('db_insert'):
+                audio_id = audio_model.insert_audio(None, audio_filename, audio_file.read(), resultado["message"],
+                                                    resultado["percent_ronco"],
+                                                    timeline=None if cache_hit else timeline, model_version=versao)
+                if cache_hit and audio_id is not None:
+                    # O resultado veio do cache: reaproveita a linha do tempo da avaliação original
+                    try:
+                        audio_model.copy_timeline(audio_id, audio_hash, versao)
+                    except Exception as e:
+                        app.logger.warning(f"Não foi possível copiar a linha do tempo do áudio: {e}")
+            resultado["audio_id"] = audio_id
+        else:
+            app.logger.error(f"Erro no resultado da avaliação: {str(resultado)}")
+            return jsonify({"error": "Erro ao avaliar o áudio."}), 500
+
+        return jsonify(resultado), 200
 
-        # Verificar se a pasta 'uploads/' existe, caso contrário, criar
-        if not os.path.exists('uploads'):
-            os.makedirs('uploads')
+    except Exception as e:
+        ERRORS.inc(stage='avaliar_sono')
+        app.logger.error(f"Erro durante o processamento do áudio: {str(e)}")
+        return jsonify({"error": str(e)}), 500
 
-        # Salvar o arquivo temporariamente na pasta uploads/
-        audio_file.save(file_path)
-        app.logger.info(f"Arquivo de áudio salvo temporariamente em {file_path}")
 
-        # Converter áudio para WAV (funciona com MP3, AAC, etc.)
-        wav_path = file_path.replace(os.path.splitext(file_path)[1], ".wav")
-        wav_file = converter_audio_para_wav(file_path, wav_path)
+@app.route('/jobs/avaliar_sono', methods=['POST'])
+def submeter_job():
+    try:
+        if 'audio' not in request.files:
+            app.logger.error("Arquivo de áudio não encontrado")
+            return jsonify({"error": "Arquivo de áudio não encontrado"}), 400
 
-        if wav_file:
-            # Agora use o arquivo WAV para o processamento
-            resultado = controller.avaliar_noite(wav_file)
+        audio_file = request.files['audio']
+        try:
+            params = {
+                'segment_duration': float(request.form.get('segment_duration', 1.0)),
+                'threshold': float(request.form.get('threshold', 20))
+            }
+        except ValueError as e:
+            return jsonify({"error": f"Parâmetro inválido: {e}"}), 400
+        # threshold é o percentual de segmentos com ronco a partir do qual o sono é considerado não saudável
+        if not (math.isfinite(params['segment_duration']) and params['segment_duration'] > 0
+                and 0 <= params['threshold'] <= 100):
+            return jsonify({"error": "Parâmetros inválidos."}), 400
+
+        job_id = obter_job_runner().submit(audio_file.filename, audio_file, params)
+        if job_id is None:
+            return jsonify({"error": "Fila de avaliações cheia. Tente novamente mais tarde."}), 429
+
+        app.logger.info(f"Job {job_id} criado para {audio_file.filename}")
+        return jsonify({"job_id": job_id, "status": "queued"}), 202
 
-            # Se o processamento for bem-sucedido, insira os dados no banco de dados
-            if "message" in resultado and "percent_ronco" in resultado:
-                audio_model.insert_audio(None, audio_filename, audio_file.read(), resultado["message"], resultado["percent_ronco"])
-            else:
-                app.logger.error(f"Erro no resultado da avaliação: {str(resultado)}")
-                return jsonify({"error": "Erro ao avaliar o áudio."}), 500
+    except Exception as e:
+        app.logger.error(f"Erro ao criar o job: {str(e)}")
+        return jsonify({"error": str(e)}), 500
 
-            os.remove(file_path)  # Remover o arquivo temporário
-            os.remove(wav_path)  # Remover o arquivo WAV convertido
-            app.logger.info(f"Arquivo {file_path} e {wav_path} excluídos após o processamento.")
 
-            return jsonify(resultado), 200
+@app.route('/jobs/<job_id>', methods=['GET'])
+def status_job(job_id):
+    try:
+        job = obter_job_runner().job_store.get_job(job_id)
+        if not job:
+            return jsonify({"error": "Job não encontrado."}), 404
 
-        return jsonify({"error": "Falha na conversão do arquivo para WAV."}), 500
+        resposta = {"job_id": job['id'], "status": job['status'], "name": job['filename']}
+        if job['status'] == 'done':
+            resposta.update(job['result'])
+        elif job['status'] == 'error':
+            resposta['error'] = job['error']
+        return jsonify(resposta), 200
 
     except Exception as e:
-        app.logger.error(f"Erro durante o processamento do áudio: {str(e)}")
+        app.logger.error(f"Erro ao consultar o job {job_id}: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/listar_audios', methods=['GET'])
-def listar_audios():
+@app.route('/sessoes', methods=['POST'])
+def abrir_sessao():
+    """
+    Abre uma sessão de avaliação incremental: a gravação é enviada em trechos durante a noite
+    (POST /sessoes/<id>/trechos) e avaliada à medida que chega.
+
+    Parâmetros (formulário, todos opcionais): name, segment_duration, threshold.
+    """
     try:
-        audios = audio_model.get_all_audios()
+        try:
+            segment_duration = float(request.form.get('segment_duration', 1.0))
+            threshold = float(request.form.get('threshold', 20))
+        except ValueError as e:
+            return jsonify({"error": f"Parâmetro inválido: {e}"}), 400
+        if segment_duration <= 0:
+            return jsonify({"error": "Parâmetros inválidos."}), 400
 
-        audio_list = []
-        for audio in audios:
-            audio_list.append({
-                'id': audio[0],
-                'name': audio[1],
-                'resultado': audio[2],
-                'percent_ronco': audio[3]
-            })
+        sessao = obter_session_manager().abrir(request.form.get('name'), segment_duration, threshold)
+        if sessao is None:
+            return jsonify({"error": "Limite de sessões abertas atingido. Tente novamente mais tarde."}), 429
 
-        return jsonify(audio_list), 200
+        app.logger.info(f"Sessão {sessao.id} aberta para {sessao.name}")
+        return jsonify(sessao.estado()), 201
 
     except Exception as e:
+        app.logger.error(f"Erro ao abrir a sessão: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/sessoes/<session_id>/trechos', methods=['POST'])
+def anexar_trecho(session_id):
+    """
+    Envia o próximo trecho da gravação, como arquivo 'audio' (multipart) ou no corpo da requisição, com o
+    número de sequência em `seq` (0, 1, 2, ...). O trecho é avaliado antes da resposta, que traz o
+    percent_ronco parcial da sessão.
+    """
+    try:
+        try:
+            seq = int(request.args.get('seq', request.form.get('seq', '')))
+        except ValueError:
+            return jsonify({"error": "Parâmetro 'seq' ausente ou inválido."}), 400
+        stream = request.files['audio'].stream if 'audio' in request.files else request.stream
+
+        estado = obter_session_manager().anexar(session_id, seq, stream)
+        return jsonify(estado), 200
+
+    except SessaoNaoEncontrada:
+        return jsonify({"error": "Sessão não encontrada."}), 404
+    except ConflitoSessao as e:
+        return jsonify({"error": str(e)}), 409
+    except Exception as e:
+        ERRORS.inc(stage='sessao_trecho')
+        app.logger.error(f"Erro ao avaliar o trecho da sessão {session_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/sessoes/<session_id>', methods=['GET'])
+def status_sessao(session_id):
+    try:
+        return jsonify(obter_session_manager().obter(session_id).estado()), 200
+    except SessaoNaoEncontrada:
+        return jsonify({"error": "Sessão não encontrada."}), 404
+
+
+@app.route('/sessoes/<session_id>/fechar', methods=['POST'])
+def fechar_sessao(session_id):
+    """Fecha a sessão, avaliando o último segmento, e grava o resultado e a linha do tempo no banco."""
+    try:
+        estado = obter_session_manager().fechar(session_id)
+        if 'error' in estado:
+            return jsonify(estado), 400
+        return jsonify(estado), 200
+
+    except SessaoNaoEncontrada:
+        return jsonify({"error": "Sessão não encontrada."}), 404
+    except Exception as e:
+        ERRORS.inc(stage='fechar_sessao')
+        app.logger.error(f"Erro ao fechar a sessão {session_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+LISTAGEM_LIMITE_MAXIMO = 1000
+CURVA_PONTOS_MAXIMO = 5000
+
+
+def _parametro_numerico(nome, tipo):
+    valor = request.args.get(nome)
+    return tipo(valor) if valor not in (None, '') else None
+
+
+@app.route('/listar_audios', methods=['GET'])
+def listar_audios():
+    """
+    Lista os áudios em ordem de id, como um array JSON transmitido linha a linha.
+
+    Parâmetros de consulta (todos opcionais):
+        after_id: Retorna apenas áudios com id maior que este valor (use o último id da página anterior).
+        limit: Quantidade máxima de áudios (até 1000). Sem limit, percorre todos os áudios.
+        min_percent / max_percent: Faixa de percent_ronco.
+        name: Prefixo do nome do áudio.
+    """
+    try:
+        limit = _parametro_numerico('limit', int)
+        if limit is not None:
+            limit = max(1, min(limit, LISTAGEM_LIMITE_MAXIMO))
+        audios = audio_model.iter_audios(
+            after_id=_parametro_numerico('after_id', int) or 0,
+            limit=limit,
+            min_percent=_parametro_numerico('min_percent', float),
+            max_percent=_parametro_numerico('max_percent', float),
+            name=request.args.get('name')
+        )
+    except ValueError as e:
+        return jsonify({"error": f"Parâmetro inválido: {e}"}), 400
+
+    # A consulta é executada e a primeira linha lida antes de enviar o status, para que uma falha no banco
+    # ainda resulte em um erro 500, e não em um JSON truncado com status 200
+    try:
+        primeiro = next(audios, None)
+    except Exception as e:
+        audios.close()
         app.logger.error(f"Erro ao listar os áudios: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+    def gerar():
+        try:
+            yield '['
+            if primeiro is not None:
+                for i, audio in enumerate(itertools.chain([primeiro], audios)):
+                    item = app.json.dumps({
+                        'id': audio[0],
+                        'name': audio[1],
+                        'resultado': audio[2],
+                        'percent_ronco': audio[3]
+                    })
+                    yield item if i == 0 else ',' + item
+            yield ']'
+        except Exception as e:
+            app.logger.error(f"Erro ao listar os áudios: {str(e)}")
+            raise
+        finally:
+            audios.close()
+
+    return Response(gerar(), status=200, mimetype='application/json')
+
+@app.route('/audios/<int:audio_id>/timeline', methods=['GET'])
+def timeline_audio(audio_id):
+    """
+    Retorna a linha do tempo de ronco de um áudio em um intervalo de tempo, lida do banco sem decodificar o
+    áudio novamente.
+
+    Parâmetros de consulta (todos opcionais):
+        start / end: Intervalo, em segundos (padrão: a gravação inteira).
+        view: 'episodes' (padrão) para os episódios de ronco que se sobrepõem ao intervalo, ou 'curve' para a
+              curva de probabilidades de ronco reduzida.
+        points: Quantidade máxima de pontos da curva (padrão 500, até 5000).
+        agg: Agregação dos segmentos em cada ponto da curva: 'mean' (padrão) ou 'max'.
+    """
+    try:
+        info = audio_model.get_timeline_info(audio_id)
+        if not info:
+            return jsonify({"error": "Linha do tempo não encontrada para este áudio."}), 404
+        segment_duration, num_segments = float(info[0]), int(info[1])
+
+        try:
+            start = _parametro_numerico('start', float) or 0.0
+            end = _parametro_numerico('end', float)
+            end = num_segments * segment_duration if end is None else end
+            points = min(_parametro_numerico('points', int) or 500, CURVA_PONTOS_MAXIMO)
+        except ValueError as e:
+            return jsonify({"error": f"Parâmetro inválido: {e}"}), 400
+        view = request.args.get('view', 'episodes')
+        agg = request.args.get('agg', 'mean')
+        if view not in ('episodes', 'curve') or agg not in ('mean', 'max') or end <= start or start < 0:
+            return jsonify({"error": "Parâmetros inválidos."}), 400
+
+        start_segment = int(math.floor(start / segment_duration))
+        end_segment = min(num_segments, int(math.ceil(end / segment_duration)))
+        resposta = {"audio_id": audio_id, "segment_duration": segment_duration,
+                    "start": start_segment * segment_duration, "end": end_segment * segment_duration}
+
+        if view == 'episodes':
+            resposta["episodes"] = [
+                {"start": s * segment_duration, "end": e * segment_duration, "mean_probability": round(float(m), 4)}
+                for s, e, m in audio_model.get_episodes(audio_id, start_segment, end_segment)
+            ]
+        else:
+            probabilities = dequantize_probabilities(
+                audio_model.get_timeline_probabilities(audio_id, start_segment, end_segment))
+            curve, step = downsample_curve(probabilities, points, agg)
+            resposta["step_seconds"] = step * segment_duration
+            resposta["curve"] = [round(float(value), 4) for value in curve]
+        return jsonify(resposta), 200
+
+    except Exception as e:
+        app.logger.error(f"Erro ao consultar a linha do tempo: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/listar_audio_recente', methods=['GET'])
 def listar_audio_recente():
     try:
@@ -135,11 +640,89 @@ def listar_audio_recente():
         return jsonify({"error": str(e)}), 500
 
 
+# Métricas do motor de inferência e do cache de resultados, lidas no momento da exportação
+registry.register(Gauge('sonosense_inference_queue_depth', 'Itens aguardando na fila do motor de inferência.',
+                        lambda: _controller.inference_engine.metrics()['queue_depth']))
+registry.register(Gauge('sonosense_inference_mean_batch_size', 'Tamanho médio dos lotes do motor de inferência.',
+                        lambda: _controller.inference_engine.metrics()['mean_batch_size']))
+registry.register(Gauge('sonosense_result_cache_hit_rate', 'Taxa de acerto do cache de resultados.',
+                        lambda: result_cache.stats()['hit_rate']))
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(registry.render(), status=200, mimetype='text/plain; version=0.0.4')
+
+
+# Perfilamento opcional por requisição: com PROFILING_ENABLED=1, uma requisição com ?profile=1 ou com o
+# cabeçalho 'X-Profile: 1' é executada sob o cProfile e o resultado é gravado em PROFILE_DIR
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED') == '1'
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+
+@app.before_request
+def iniciar_perfilamento():
+    if PROFILING_ENABLED and (request.args.get('profile') == '1' or request.headers.get('X-Profile') == '1'):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+@app.after_request
+def finalizar_perfilamento(response):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profile_path = os.path.join(PROFILE_DIR, f"{int(time.time() * 1000)}_{request.endpoint}.prof")
+        profiler.dump_stats(profile_path)
+        response.headers['X-Profile-File'] = profile_path
+        app.logger.info(f"Perfil da requisição gravado em {profile_path}")
+    return response
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Verificação de vida: responde assim que o processo atende requisições, sem depender do modelo ou do banco."""
+    return jsonify({"status": "ok"}), 200
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """
+    Verificação de prontidão: responde 200 apenas quando o modelo está carregado e aquecido e o banco de
+    dados responde; caso contrário, 503. A primeira chamada dispara a inicialização em segundo plano.
+    """
+    iniciar_em_segundo_plano()
+    checks = {
+        "model": _controller is not None and _controller.obter_modelo() is not None,
+        "warmed_up": _estado['warmed_up'],
+        "database": False
+    }
+    if audio_model.pool is not None:
+        try:
+            checks["database"] = audio_model.ping()
+        except Exception as e:
+            app.logger.warning(f"Banco de dados não respondeu à verificação de prontidão: {e}")
+    pronto = all(checks.values())
+    return jsonify({"status": "ready" if pronto else "not_ready", **checks}), 200 if pronto else 503
+
+
 @app.route('/teste', methods=['GET'])
 def home():
     app.logger.info("Rota /teste acessada")
     return jsonify({"message": "Avaliação concluída com sucesso!"}), 200
 
 
+if PRELOAD_MODEL:
+    if INFERENCE_BACKEND == 'tflite':
+        # O interpretador TFLite pode ser usado pelos workers após o fork: carrega e aquece no processo pai
+        carregar_controller(iniciar_motor=False)
+    else:
+        # O runtime do TensorFlow não sobrevive a um fork depois de carregar um modelo; o processo pai
+        # apenas importa o TensorFlow (compartilhado com os workers) e cada worker carrega o modelo
+        import controllers.controller  # noqa: F401
+
+
 if __name__ == '__main__':
+    iniciar_em_segundo_plano()
     app.run(debug=False, host='0.0.0.0', port=5179)
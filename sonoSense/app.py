@@ -1,14 +1,68 @@
+import os
+import argparse
 from controllers.controller import Controller
 
 def main():
     """
     Função principal que orquestra a execução do projeto sonoSense.
+
+    Com `--feature-store DIR`, o treinamento lê os dados da feature store em DIR (criada na primeira
+    execução) em vez de extrair as features novamente.
+
+    Com `--export-tflite ARQUIVO`, o modelo treinado é exportado para TFLite (quantizado para int8 com
+    `--int8`, calibrado com o conjunto de treino) e, com `--compare-backends`, comparado ao modelo Keras
+    no conjunto de teste. `--skip-training` reaproveita o modelo_sono.h5 existente.
+
+    Com `--fine-tune DIR`, em vez de treinar do zero, o modelo_sono.h5 existente é ajustado com os clipes
+    rotulados de DIR (subpastas "1" e "0") e uma amostra de replay das features já extraídas, e gravado
+    como uma nova versão em `--models-dir`; `--promote` substitui o modelo_sono.h5 pela versão ajustada.
     """
+    parser = argparse.ArgumentParser(description="Treinamento do modelo sonoSense.")
+    parser.add_argument("--feature-store", default=None,
+                        help="Diretório da feature store usada para treinar a partir do disco.")
+    parser.add_argument("--skip-training", action="store_true",
+                        help="Não treina; usa o modelo_sono.h5 existente (para exportar ou comparar).")
+    parser.add_argument("--export-tflite", default=None, metavar="ARQUIVO",
+                        help="Exporta o modelo para TFLite no arquivo informado (ex.: modelo_sono.tflite).")
+    parser.add_argument("--int8", action="store_true",
+                        help="Quantiza o modelo TFLite exportado para int8.")
+    parser.add_argument("--compare-backends", action="store_true",
+                        help="Compara acurácia e latência dos backends Keras e TFLite no conjunto de teste.")
+    parser.add_argument("--fine-tune", default=None, metavar="DIR",
+                        help="Ajusta o modelo_sono.h5 existente com os clipes novos de DIR (subpastas '1' e '0').")
+    parser.add_argument("--replay-ratio", type=float, default=1.0,
+                        help="Amostras antigas de replay por clipe novo no ajuste fino.")
+    parser.add_argument("--fine-tune-epochs", type=int, default=10,
+                        help="Máximo de épocas do ajuste fino (com parada antecipada).")
+    parser.add_argument("--models-dir", default="modelos", help="Diretório das versões do modelo.")
+    parser.add_argument("--promote", action="store_true",
+                        help="Substitui o modelo_sono.h5 pela versão ajustada, se não houver regressão.")
+    parser.add_argument("--dataset", default=None,
+                        help="Diretório do dataset já baixado (com a pasta 'Snoring Dataset').")
+    args = parser.parse_args()
+
     ctrl = Controller()
     
     # Preparação dos dados e treinamento do modelo
-    X_train, X_test, y_train_cat, y_test_cat = ctrl.preparar_dados()
-    ctrl.treinar_modelo(X_train, X_test, y_train_cat, y_test_cat, epochs=30, batch_size=32)
+    if args.fine_tune:
+        ctrl.ajustar_modelo(args.fine_tune, store_dir=args.feature_store, dataset_path=args.dataset,
+                            replay_ratio=args.replay_ratio, epochs=args.fine_tune_epochs,
+                            output_dir=args.models_dir, promover=args.promote)
+    elif args.skip_training:
+        print("Treinamento ignorado; usando o modelo salvo.")
+    elif args.feature_store:
+        if not os.path.exists(os.path.join(args.feature_store, "features.npy")):
+            ctrl.preparar_feature_store(args.feature_store)
+        ctrl.treinar_modelo_do_store(args.feature_store, epochs=30, batch_size=32)
+    else:
+        X_train, X_test, y_train_cat, y_test_cat = ctrl.preparar_dados(args.dataset)
+        ctrl.treinar_modelo(X_train, X_test, y_train_cat, y_test_cat, epochs=30, batch_size=32)
+
+    # Exportação e comparação do backend TFLite
+    if args.export_tflite:
+        ctrl.exportar_tflite(args.export_tflite, quantize=args.int8, store_dir=args.feature_store)
+    if args.compare_backends:
+        ctrl.comparar_backends(store_dir=args.feature_store)
     
     # Exemplo: avaliação de uma gravação noturna
     # Substitua 'caminho_para_audio_noite.wav' pelo caminho real do arquivo de áudio.
@@ -0,0 +1,101 @@
+import os
+import json
+import argparse
+from controllers.batch_evaluator import BatchEvaluator, listar_gravacoes, ler_checkpoint, gravar_resultados
+
+
+def _saida_padrao():
+    try:
+        import pyarrow  # type: ignore  # noqa: F401
+        return 'resultados_lote.parquet'
+    except ImportError:
+        return 'resultados_lote.npz'
+
+
+def main():
+    """
+    Avalia em lote as gravações de um diretório ou de um manifesto (um caminho por linha), por exemplo para
+    reprocessar as noites arquivadas após uma atualização do modelo.
+
+    A decodificação e os MFCCs rodam em um pool de processos e a inferência agrupa os segmentos de vários
+    arquivos em lotes (ver `BatchEvaluator`). Cada arquivo concluído é registrado no checkpoint (JSON lines);
+    executar novamente o mesmo comando retoma de onde parou, avaliando de novo apenas os arquivos sem
+    resultado da versão atual do modelo. Ao final, os resultados são gravados em formato colunar
+    (Parquet com o pyarrow instalado, ou .npz) e, com `--inserir-banco`, inseridos no MySQL em lotes.
+    """
+    parser = argparse.ArgumentParser(description="Avaliação em lote de gravações noturnas.")
+    parser.add_argument("entrada", help="Diretório com as gravações ou manifesto com um caminho por linha.")
+    parser.add_argument("--output", default=None,
+                        help="Arquivo de resultados (.parquet, .npz ou .csv). Padrão: resultados_lote.parquet "
+                             "com o pyarrow instalado, senão resultados_lote.npz.")
+    parser.add_argument("--checkpoint", default=None,
+                        help="Arquivo de checkpoint (JSON lines). Padrão: o arquivo de resultados + '.checkpoint.jsonl'.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processos de decodificação e extração de features.")
+    parser.add_argument("--batch-size", type=int, default=1024, help="Segmentos por lote enviado ao modelo.")
+    parser.add_argument("--backend", default="keras", choices=["keras", "tflite"])
+    parser.add_argument("--segment-duration", type=float, default=1.0)
+    parser.add_argument("--threshold", type=float, default=20)
+    parser.add_argument("--work-dir", default=None, help="Diretório das features intermediárias.")
+    parser.add_argument("--inserir-banco", action="store_true",
+                        help="Insere os resultados na tabela audios (AudioModel.insert_audio_files).")
+    parser.add_argument("--flush-every", type=int, default=50,
+                        help="Arquivos concluídos por gravação no checkpoint (e por inserção no banco).")
+    parser.add_argument("--report-every", type=float, default=10.0, help="Intervalo, em segundos, do relatório.")
+    args = parser.parse_args()
+
+    output = args.output or _saida_padrao()
+    if output.endswith('.parquet'):
+        import pyarrow  # type: ignore  # noqa: F401  # Falha antes do processamento se o pyarrow faltar
+    checkpoint = args.checkpoint or output + '.checkpoint.jsonl'
+
+    # O TensorFlow só é importado aqui: os processos do pool ('spawn') reimportam este módulo
+    from controllers.controller import Controller
+    ctrl = Controller(backend=args.backend)
+    if ctrl.obter_modelo() is None:
+        raise SystemExit("Modelo não encontrado. Treine (ou exporte) o modelo antes da avaliação em lote.")
+
+    evaluator = BatchEvaluator(ctrl, workers=args.workers, batch_size=args.batch_size,
+                               segment_duration=args.segment_duration, threshold=args.threshold,
+                               work_dir=args.work_dir)
+    paths = listar_gravacoes(args.entrada)
+    concluidos = ler_checkpoint(checkpoint, evaluator.model_version)
+    faltando = [path for path in paths if path not in concluidos]
+    print(f"{len(paths)} gravações; {len(paths) - len(faltando)} já avaliadas com esta versão do modelo "
+          f"(checkpoint {checkpoint}); {len(faltando)} a avaliar.")
+
+    audio_model = None
+    if args.inserir_banco:
+        from config import db_config, AUDIO_BLOB_DIR
+        from models.audio_model import AudioModel
+        from models.blob_store import LocalBlobStore
+        audio_model = AudioModel(**db_config, blob_store=LocalBlobStore(AUDIO_BLOB_DIR))
+        audio_model.connect()
+
+    def registrar(linhas):
+        if audio_model is not None:
+            # Os arquivos vão para o blob store um de cada vez; o banco recebe apenas os metadados
+            audios = [(linha['name'], linha['path'], linha['message'], linha['percent_ronco'])
+                      for linha in linhas if linha['status'] == 'done']
+            if audios:
+                audio_model.insert_audio_files(audios)
+        # O checkpoint só registra os arquivos depois da inserção, para que uma falha no banco os reavalie
+        with open(checkpoint, 'a') as f:
+            for linha in linhas:
+                f.write(json.dumps(linha) + '\n')
+                concluidos[linha['path']] = linha
+
+    try:
+        stats = evaluator.run(faltando, registrar, flush_every=args.flush_every, report_every=args.report_every)
+    finally:
+        if audio_model is not None:
+            audio_model.close_connection()
+
+    gravar_resultados(output, [concluidos[path] for path in paths if path in concluidos])
+    print(f"Concluído: {stats['files']} arquivos avaliados ({stats['errors']} com erro) em "
+          f"{stats['wall_seconds']:.1f}s; {stats['audio_seconds'] / max(stats['wall_seconds'], 1e-9):.0f}x tempo real. "
+          f"Resultados em {output}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np  # type: ignore
+import soundfile as sf  # type: ignore
+
+# Durações (em segundos) e taxas de amostragem padrão das gravações sintéticas
+DEFAULT_DURATIONS = [60, 600]
+DEFAULT_SAMPLE_RATES = [16000, 22050, 44100]
+ALL_CASES = ['decode_librosa', 'decode_ffmpeg', 'features', 'features_streaming', 'inference', 'inference_tflite',
+             'inference_tflite_int8', 'end_to_end', 'load_dataset']
+DATASET_CLIPS_PER_CLASS = 100
+
+
+def write_synthetic_recording(path, duration, sample_rate, seed=0, block_duration=60):
+    """
+    Gera uma gravação noturna sintética em WAV (PCM 16 bits): ruído de fundo baixo com episódios de
+    "ronco" (tons graves harmônicos com envelope) a cada poucos segundos. A escrita é feita em blocos,
+    então gravações longas (até 8 horas) não precisam caber na memória.
+    """
+    rng = np.random.default_rng(seed)
+    total = int(duration * sample_rate)
+    block = int(block_duration * sample_rate)
+    with sf.SoundFile(path, 'w', samplerate=sample_rate, channels=1, subtype='PCM_16') as f:
+        for first in range(0, total, block):
+            n = min(block, total - first)
+            t = (first + np.arange(n)) / sample_rate
+            signal = 0.01 * rng.standard_normal(n)
+            # Episódio de ronco de ~1.5 s a cada 4 s
+            phase = np.mod(t, 4.0)
+            envelope = np.where(phase < 1.5, np.sin(np.pi * phase / 1.5) ** 2, 0.0)
+            snore = sum(np.sin(2 * np.pi * f0 * t) / (k + 1) for k, f0 in enumerate((90, 180, 270)))
+            signal += 0.3 * envelope * snore
+            f.write(np.clip(signal, -1, 1).astype(np.float32))
+    return path
+
+
+def write_synthetic_dataset(root, clips_per_class=DATASET_CLIPS_PER_CLASS, sample_rate=22050, seed=0):
+    """
+    Gera uma árvore no formato do dataset de ronco ("Snoring Dataset/1" e "Snoring Dataset/0") com
+    clipes sintéticos de 1 segundo, para medir `extract_features` e `load_dataset`.
+    """
+    for label in (1, 0):
+        folder = os.path.join(root, "Snoring Dataset", str(label))
+        os.makedirs(folder, exist_ok=True)
+        for i in range(clips_per_class):
+            path = os.path.join(folder, f"{label}_{i}.wav")
+            write_synthetic_recording(path, 1.0, sample_rate, seed=seed + 2 * i + label)
+            if label == 0:
+                # Clipes sem ronco: apenas ruído
+                audio, _ = sf.read(path, dtype='float32')
+                sf.write(path, (audio * 0.05).astype(np.float32), sample_rate, subtype='PCM_16')
+    return root
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é em kB no Linux e em bytes no macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _stub_database():
+    """Substitui o pool do MySQL por um stub em memória, para medir a API sem banco de dados."""
+    from models import audio_model
+
+    class StubCursor:
+        lastrowid = 1
+
+        def execute(self, query, params=None):
+            pass
+
+        def executemany(self, query, rows):
+            pass
+
+        def fetchall(self):
+            return []
+
+        def fetchmany(self, size):
+            return []
+
+        def fetchone(self):
+            return None
+
+        def close(self):
+            pass
+
+    class StubConnection:
+        unread_result = False
+
+        def cursor(self, *args, **kwargs):
+            return StubCursor()
+
+        def commit(self):
+            pass
+
+        def rollback(self):
+            pass
+
+        def close(self):
+            pass
+
+    class StubPool:
+        def __init__(self, **kwargs):
+            pass
+
+        def set_config(self, **kwargs):
+            pass
+
+        def add_connection(self, connection):
+            pass
+
+        def get_connection(self):
+            return StubConnection()
+
+    audio_model.pooling.MySQLConnectionPool = StubPool
+    audio_model.mysql.connector.connect = lambda **kwargs: StubConnection()
+
+
+def _random_model():
+    from models.model import build_model
+    return build_model((40, 44, 1))
+
+
+def run_case(case, recording, sample_rate, duration, workdir, repeat):
+    """Executa um caso de benchmark e retorna o melhor tempo entre `repeat` execuções."""
+    if case == 'end_to_end':
+        # Antes de qualquer importação do projeto: o config lê AUDIO_BLOB_DIR na importação
+        os.environ['JOBS_DB'] = os.path.join(workdir, 'jobs.db')
+        os.environ['AUDIO_BLOB_DIR'] = os.path.join(workdir, 'blobs')
+    import librosa  # type: ignore
+    from models.features import extract_segment_features, stream_segment_features
+
+    audio_seconds = duration
+    setup = None
+    if case in ('features', 'inference', 'inference_tflite', 'inference_tflite_int8'):
+        audio, sr = librosa.load(recording, sr=None)
+        setup = (audio, sr)
+    if case == 'inference':
+        model = _random_model()
+        segments = extract_segment_features(audio, sr)
+        setup = (model, segments)
+    if case in ('inference_tflite', 'inference_tflite_int8'):
+        from models.tflite_model import export_tflite, TFLiteModel
+        segments = extract_segment_features(audio, sr)
+        model_path = os.path.join(workdir, f"{case}.tflite")
+        export_tflite(_random_model(), model_path, quantize=case.endswith('int8'), calibration_data=segments)
+        setup = (TFLiteModel(model_path), segments)
+    if case == 'end_to_end':
+        _stub_database()
+        import api
+        from models.blob_store import LocalBlobStore
+        controller = api.carregar_controller()
+        controller.model = controller.model or _random_model()
+        # Com --in-process o config pode já ter sido importado por outro caso: o diretório dos blobs é passado
+        # explicitamente, e as requisições rodam no diretório temporário, onde fica o 'uploads/' da API
+        api.audio_model.blob_store = LocalBlobStore(os.path.join(workdir, 'blobs'))
+        api.result_cache.get = lambda key: None  # Sem acertos de cache entre as repetições
+        client = api.app.test_client()
+        with open(recording, 'rb') as f:
+            payload = f.read()
+    if case == 'decode_ffmpeg':
+        from models.audio_decoder import decode_audio_stream, ffmpeg_disponivel
+        if not ffmpeg_disponivel():
+            return None
+    if case == 'load_dataset':
+        from models.dataset import load_dataset
+        dataset_root = os.path.join(workdir, 'dataset')
+        if not os.path.exists(dataset_root):
+            write_synthetic_dataset(dataset_root, sample_rate=sample_rate)
+        audio_seconds = 2 * DATASET_CLIPS_PER_CLASS * 1.0
+
+    previous_cwd = os.getcwd()
+    if case == 'end_to_end':
+        os.chdir(workdir)
+    timings = []
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            if case == 'decode_librosa':
+                librosa.load(recording, sr=None)
+            elif case == 'decode_ffmpeg':
+                with open(recording, 'rb') as f:
+                    decode_audio_stream(f)
+            elif case == 'features':
+                extract_segment_features(*setup)
+            elif case == 'features_streaming':
+                for _ in stream_segment_features(recording):
+                    pass
+            elif case in ('inference', 'inference_tflite', 'inference_tflite_int8'):
+                setup[0].predict(setup[1], verbose=0)
+            elif case == 'end_to_end':
+                response = client.post('/avaliar_sono', data={'audio': (io.BytesIO(payload), 'bench.wav')},
+                                       content_type='multipart/form-data')
+                if response.status_code != 200:
+                    raise RuntimeError(f"/avaliar_sono retornou {response.status_code}: "
+                                       f"{response.get_data(as_text=True)}")
+            elif case == 'load_dataset':
+                load_dataset(dataset_root, workers=os.cpu_count() or 1)
+            timings.append(time.perf_counter() - start)
+    finally:
+        os.chdir(previous_cwd)
+
+    seconds = min(timings)
+    return {
+        'case': case,
+        'sample_rate': sample_rate,
+        'duration': duration if case != 'load_dataset' else None,
+        'seconds': seconds,
+        'audio_seconds_per_second': audio_seconds / seconds if seconds > 0 else None,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+def _run_isolated(args):
+    # Executado em um processo novo, para que o pico de memória medido seja apenas o do caso
+    return run_case(*args)
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='sonosense-bench-')
+    results = []
+    try:
+        cases = args.cases.split(',') if args.cases else ALL_CASES
+        durations = [float(d) for d in args.durations.split(',')]
+        sample_rates = [int(s) for s in args.sample_rates.split(',')]
+        for sample_rate in sample_rates:
+            for duration in durations:
+                recording = os.path.join(workdir, f"night_{int(duration)}s_{sample_rate}.wav")
+                write_synthetic_recording(recording, duration, sample_rate)
+                for case in cases:
+                    if case == 'load_dataset' and duration != durations[0]:
+                        continue
+                    case_args = (case, recording, sample_rate, duration, workdir, args.repeat)
+                    if args.in_process:
+                        result = run_case(*case_args)
+                    else:
+                        with ProcessPoolExecutor(max_workers=1,
+                                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+                            result = executor.submit(_run_isolated, case_args).result()
+                    if result is None:
+                        print(f"{case}: ignorado (dependência indisponível)")
+                        continue
+                    results.append(result)
+                    print(f"{case} sr={sample_rate} dur={duration:.0f}s: {result['seconds']:.3f}s, "
+                          f"{result['audio_seconds_per_second'] or 0:.1f} s de áudio/s, pico {result['peak_rss_mb']:.0f} MB")
+                os.remove(recording)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Resultados gravados em {args.output}")
+
+
+def _result_key(result):
+    return (result['case'], result['sample_rate'], result['duration'])
+
+
+def compare(args):
+    """
+    Compara um resultado com uma linha de base. Falha (código de saída 1) se algum caso ficou mais
+    lento (vazão menor) ou usou mais memória que a linha de base além da tolerância.
+    """
+    with open(args.results) as f:
+        current = {_result_key(r): r for r in json.load(f)['results']}
+    with open(args.baseline) as f:
+        baseline = {_result_key(r): r for r in json.load(f)['results']}
+
+    regressions = []
+    for key, base in baseline.items():
+        result = current.get(key)
+        if result is None:
+            continue
+        if base['audio_seconds_per_second'] and result['audio_seconds_per_second'] is not None:
+            ratio = result['audio_seconds_per_second'] / base['audio_seconds_per_second']
+            if ratio < 1 - args.tolerance:
+                regressions.append(f"{key}: vazão {ratio:.0%} da linha de base")
+        if base['peak_rss_mb'] and result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + args.rss_tolerance):
+            regressions.append(f"{key}: pico de memória {result['peak_rss_mb']:.0f} MB "
+                               f"(linha de base {base['peak_rss_mb']:.0f} MB)")
+
+    if regressions:
+        print("Regressões encontradas:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print("Nenhuma regressão em relação à linha de base.")
+
+
+def main():
+    """
+    Benchmarks reproduzíveis dos pipelines de avaliação e de treinamento do sonoSense, com gravações
+    e dataset sintéticos.
+
+    Uso:
+        python benchmark.py run --output resultados.json [--durations 60,600,28800] [--sample-rates 16000,44100]
+        python benchmark.py compare resultados.json linha_de_base.json [--tolerance 0.1]
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks do sonoSense.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="Executa os benchmarks e grava os resultados em JSON.")
+    run_parser.add_argument('--output', default='benchmark_results.json')
+    run_parser.add_argument('--durations', default=','.join(str(d) for d in DEFAULT_DURATIONS),
+                            help="Durações das gravações, em segundos (ex.: 60,600,28800).")
+    run_parser.add_argument('--sample-rates', default=','.join(str(s) for s in DEFAULT_SAMPLE_RATES))
+    run_parser.add_argument('--cases', default=None, help=f"Casos separados por vírgula: {','.join(ALL_CASES)}.")
+    run_parser.add_argument('--repeat', type=int, default=3, help="Repetições por caso (vale o melhor tempo, o que descarta a compilação da primeira execução).")
+    run_parser.add_argument('--in-process', action='store_true',
+                            help="Executa os casos no mesmo processo (o pico de memória passa a ser acumulado).")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = subparsers.add_parser('compare', help="Compara resultados com uma linha de base.")
+    compare_parser.add_argument('results')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('--tolerance', type=float, default=0.10,
+                                help="Perda de vazão tolerada (fração). Valor padrão é 0.10.")
+    compare_parser.add_argument('--rss-tolerance', type=float, default=0.20,
+                                help="Aumento de pico de memória tolerado (fração). Valor padrão é 0.20.")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
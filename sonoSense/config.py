@@ -0,0 +1,21 @@
+import os
+
+# Configuração do banco de dados MySQL, compartilhada pela API e pelas ferramentas de linha de comando
+db_config = {
+    'host': os.environ.get('DB_HOST', '89.116.74.250'),
+    'port': int(os.environ.get('DB_PORT', 3307)),
+    'user': os.environ.get('DB_USER', 'dbaudio'),
+    'password': os.environ.get('DB_PASSWORD', 'dbaudio'),
+    'database': os.environ.get('DB_NAME', 'dbaudio')
+}
+
+# Diretório do blob store local com os bytes dos áudios enviados
+AUDIO_BLOB_DIR = os.environ.get('AUDIO_BLOB_DIR', 'audio_blobs')
+
+# Taxa de amostragem das features (MFCC), comum ao treinamento e à avaliação: todo áudio é reamostrado para
+# ela antes da extração. Com 22050 Hz e hop de 512 amostras, um segmento de 1 s tem exatamente os 44 frames
+# esperados pelo modelo. FEATURE_SAMPLE_RATE=0 mantém a taxa original de cada áudio (comportamento antigo).
+# O pipeline de treinamento fica gravado ao lado do modelo (modelo_sono.features.json), e um modelo treinado
+# com outro pipeline não é carregado; modelos sem esse arquivo (anteriores ao pipeline com taxa fixa) são
+# carregados com um aviso e avaliados com features na taxa original, como foram treinados.
+FEATURE_SAMPLE_RATE = int(os.environ.get('FEATURE_SAMPLE_RATE', 22050)) or None
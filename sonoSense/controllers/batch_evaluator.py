@@ -0,0 +1,274 @@
+import os
+import csv
+import json
+import time
+import shutil
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np  # type: ignore
+from controllers.job_runner import preparar_segmentos
+
+EXTENSOES_AUDIO = ('.wav', '.mp3', '.m4a', '.aac', '.flac', '.ogg', '.opus', '.webm', '.3gp', '.amr')
+
+COLUNAS = ('path', 'name', 'status', 'error', 'segments', 'snore_segments', 'percent_ronco', 'message',
+           'audio_seconds', 'model_version')
+
+
+def listar_gravacoes(entrada):
+    """
+    Lista as gravações a avaliar: todos os arquivos de áudio de um diretório (recursivamente, em ordem
+    alfabética) ou os caminhos de um manifesto (um por linha; linhas vazias e iniciadas por '#' são
+    ignoradas; caminhos relativos são resolvidos a partir do diretório do manifesto).
+    """
+    if os.path.isdir(entrada):
+        paths = []
+        for root, _, files in os.walk(entrada):
+            paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(EXTENSOES_AUDIO))
+        return sorted(paths)
+
+    base = os.path.dirname(os.path.abspath(entrada))
+    with open(entrada) as f:
+        linhas = [linha.strip() for linha in f]
+    return [os.path.join(base, linha) for linha in linhas if linha and not linha.startswith('#')]
+
+
+def ler_checkpoint(checkpoint_path, model_version):
+    """
+    Lê as linhas já gravadas no checkpoint. Apenas os resultados bem-sucedidos da mesma versão do modelo
+    são reaproveitados; os demais arquivos (com erro ou de outra versão) são avaliados novamente.
+    Retorna um dicionário caminho -> linha.
+    """
+    linhas = {}
+    if not os.path.exists(checkpoint_path):
+        return linhas
+    with open(checkpoint_path) as f:
+        for texto in f:
+            try:
+                linha = json.loads(texto)
+            except ValueError:
+                continue  # Última linha incompleta de uma execução interrompida
+            if linha.get('status') == 'done' and linha.get('model_version') == model_version:
+                linhas[linha['path']] = linha
+    return linhas
+
+
+def gravar_resultados(output_path, linhas):
+    """
+    Grava os resultados em formato colunar: Parquet (.parquet, requer o pyarrow) ou um arquivo NumPy com
+    um array por coluna (.npz). Com a extensão .csv, grava um CSV comum.
+    """
+    colunas = {nome: [linha.get(nome) for linha in linhas] for nome in COLUNAS}
+    tmp_path = f"{output_path}.tmp{os.path.splitext(output_path)[1]}"
+    if output_path.endswith('.parquet'):
+        import pyarrow as pa  # type: ignore
+        import pyarrow.parquet as pq  # type: ignore
+        pq.write_table(pa.table(colunas), tmp_path)
+    elif output_path.endswith('.npz'):
+        np.savez(tmp_path, **{nome: np.array(['' if v is None else v for v in valores])
+                              if nome in ('path', 'name', 'status', 'error', 'message', 'model_version')
+                              else np.array([np.nan if v is None else v for v in valores], dtype=np.float64)
+                              for nome, valores in colunas.items()})
+    else:
+        with open(tmp_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=COLUNAS)
+            writer.writeheader()
+            writer.writerows({nome: linha.get(nome) for nome in COLUNAS} for linha in linhas)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+class _Arquivo:
+    def __init__(self, path, features_path):
+        self.path = path
+        self.features_path = features_path
+        self.segments = np.load(features_path, mmap_mode='r')
+        self.predicted = 0
+        self.snore_segments = 0
+
+
+class BatchEvaluator:
+    def __init__(self, controller, workers=None, batch_size=1024, segment_duration=1.0, threshold=20,
+                 max_inflight=None, work_dir=None):
+        """
+        Avalia muitas gravações de uma vez, por exemplo para reprocessar o arquivo de noites após uma
+        atualização do modelo.
+
+        A decodificação e a extração de features de cada arquivo rodam em um pool de `workers` processos
+        (`preparar_segmentos`, a mesma etapa dos jobs assíncronos). No processo principal, os segmentos de
+        vários arquivos são agrupados em lotes de `batch_size` para o modelo, de modo que gravações curtas
+        não geram lotes pequenos.
+
+        Parâmetros:
+            controller (Controller): Controller com o modelo carregado.
+            workers (int, opcional): Processos de decodificação/features. Se None, usa todos os núcleos.
+            batch_size (int, opcional): Quantidade de segmentos em cada lote enviado ao modelo.
+            segment_duration (float, opcional): Duração de cada segmento em segundos. Valor padrão é 1.0.
+            threshold (float, opcional): Limiar de percent_ronco do resultado. Valor padrão é 20.
+            max_inflight (int, opcional): Máximo de arquivos decodificados aguardando o modelo, o que limita
+                                          o espaço em disco das features intermediárias. Padrão: 2 * workers.
+            work_dir (str, opcional): Diretório das features intermediárias. Se None, usa um temporário.
+        """
+        self.controller = controller
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.segment_duration = segment_duration
+        self.threshold = threshold
+        self.max_inflight = max_inflight or 2 * self.workers
+        self.work_dir = work_dir
+
+    @property
+    def model_version(self):
+        """Versão gravada em cada resultado: o modelo e o pipeline de features usados na avaliação."""
+        if self.controller.model_fingerprint is None:
+            return None
+        return f"{self.controller.model_fingerprint}|{self.controller.pipeline.describe()}"
+
+    def run(self, paths, on_results, flush_every=50, report_every=10.0):
+        """
+        Avalia as gravações de `paths`, chamando `on_results(linhas)` a cada `flush_every` arquivos
+        concluídos (e no final) com as linhas de resultado (ver `COLUNAS`), na ordem de conclusão.
+
+        Retorna:
+            dict: Totais da execução (arquivos, erros, segmentos, segundos de áudio e de relógio).
+        """
+        work_dir = self.work_dir or tempfile.mkdtemp(prefix='sonosense_lote_')
+        os.makedirs(work_dir, exist_ok=True)
+        model_version = self.model_version
+        self._stats = {'files': 0, 'errors': 0, 'segments': 0, 'audio_seconds': 0.0, 'start': time.perf_counter()}
+        self._total_files = len(paths)
+        self._last_report = time.perf_counter()
+        self._report_every = report_every
+        self._done = []
+        pending = []
+
+        def concluir(linha):
+            linha['model_version'] = model_version
+            self._done.append(linha)
+            self._stats['files'] += 1
+            self._stats['errors'] += linha['status'] != 'done'
+            self._stats['segments'] += linha.get('segments') or 0
+            self._stats['audio_seconds'] += linha.get('audio_seconds') or 0.0
+            if len(self._done) >= flush_every:
+                on_results(self._done)
+                self._done = []
+            self._relatar()
+
+        # 'spawn': os processos do pool não herdam o runtime do TensorFlow já inicializado no processo principal
+        executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        try:
+            remaining = iter(enumerate(paths))
+            inflight = {}
+            while True:
+                while len(inflight) + len(pending) < self.max_inflight:
+                    item = next(remaining, None)
+                    if item is None:
+                        break
+                    index, path = item
+                    features_path = os.path.join(work_dir, f"{index}.npy")
+                    inflight[executor.submit(preparar_segmentos, path, features_path, self.segment_duration,
+                                                    self.controller.pipeline)] = path
+                if not inflight and not pending:
+                    break
+
+                if inflight:
+                    # Sem lote completo para o modelo, espera ao menos um arquivo terminar a decodificação
+                    pending_segments = sum(len(a.segments) - a.predicted for a in pending)
+                    timeout = 0 if pending_segments >= self.batch_size else None
+                    finished, _ = wait(inflight, timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        path = inflight.pop(future)
+                        try:
+                            arquivo = _Arquivo(path, future.result())
+                        except Exception as e:
+                            concluir({'path': path, 'name': os.path.basename(path), 'status': 'error',
+                                      'error': str(e)})
+                            continue
+                        if len(arquivo.segments) == 0:
+                            os.remove(arquivo.features_path)
+                            concluir({'path': path, 'name': os.path.basename(path), 'status': 'error',
+                                      'error': "Gravação sem áudio para avaliar."})
+                        else:
+                            pending.append(arquivo)
+
+                # Com todos os arquivos já enviados ao pool decodificados, o último lote pode ser parcial
+                final = not inflight
+                for arquivo in self._classificar(pending, final):
+                    pending.remove(arquivo)
+                    concluir(self._resultado(arquivo))
+        finally:
+            executor.shutdown(cancel_futures=True)
+            if self.work_dir is None:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        if self._done:
+            on_results(self._done)
+            self._done = []
+        self._relatar(force=True)
+        return dict(self._stats, wall_seconds=time.perf_counter() - self._stats['start'])
+
+    def _classificar(self, pending, final):
+        """
+        Envia ao modelo lotes de `batch_size` segmentos, montados com os segmentos ainda não classificados dos
+        arquivos pendentes, na ordem de chegada. Retorna os arquivos que tiveram todos os segmentos classificados.
+        """
+        completed = []
+        while pending:
+            available = sum(len(a.segments) - a.predicted for a in pending if a not in completed)
+            if available == 0 or (available < self.batch_size and not final):
+                break
+            parts, owners = [], []
+            size = 0
+            for arquivo in pending:
+                take = min(self.batch_size - size, len(arquivo.segments) - arquivo.predicted)
+                if take <= 0:
+                    continue
+                parts.append(arquivo.segments[arquivo.predicted:arquivo.predicted + take])
+                owners.append((arquivo, take))
+                size += take
+                if size == self.batch_size:
+                    break
+
+            predictions = self.controller.predizer(np.concatenate(parts))
+            labels = np.argmax(predictions, axis=1)
+            first = 0
+            for arquivo, take in owners:
+                arquivo.snore_segments += int(np.sum(labels[first:first + take]))
+                arquivo.predicted += take
+                first += take
+                if arquivo.predicted == len(arquivo.segments):
+                    completed.append(arquivo)
+        return completed
+
+    def _resultado(self, arquivo):
+        total_segments = len(arquivo.segments)
+        # Libera o memory-map antes de remover o arquivo de features
+        arquivo.segments = None
+        os.remove(arquivo.features_path)
+        percent_ronco = arquivo.snore_segments / total_segments * 100
+        resultado = self.controller._montar_resultado(percent_ronco, self.threshold)
+        return {
+            'path': arquivo.path,
+            'name': os.path.basename(arquivo.path),
+            'status': 'done',
+            'error': None,
+            'segments': total_segments,
+            'snore_segments': arquivo.snore_segments,
+            'percent_ronco': float(percent_ronco),
+            'message': resultado['message'],
+            'audio_seconds': total_segments * self.segment_duration
+        }
+
+    def _relatar(self, force=False):
+        now = time.perf_counter()
+        if not force and now - self._last_report < self._report_every:
+            return
+        self._last_report = now
+        stats = self._stats
+        elapsed = max(now - stats['start'], 1e-9)
+        files_per_second = stats['files'] / elapsed
+        eta = (self._total_files - stats['files']) / files_per_second if files_per_second > 0 else float('inf')
+        print(f"[{stats['files']}/{self._total_files}] {stats['errors']} erros | "
+              f"{stats['segments'] / elapsed:.0f} segmentos/s | "
+              f"{stats['audio_seconds'] / elapsed:.0f}x tempo real | "
+              f"decorrido {elapsed:.0f}s | restante ~{eta:.0f}s", flush=True)
@@ -1,20 +1,52 @@
 import os
+import time
+import shutil
+import hashlib
 import numpy as np  # type: ignore
-from tensorflow.keras.models import load_model  # type: ignore
 from sklearn.model_selection import train_test_split  # type: ignore
-from tensorflow.keras.utils import to_categorical  # type: ignore
 import librosa
-from models.dataset import download_dataset, load_dataset
-from models.model import build_model
+from models.dataset import download_dataset, load_dataset, load_files, list_labelled_files
+from models.features import extract_segment_features, stream_segment_features, IncrementalSegmentFeatures
+from models.feature_pipeline import (get_pipeline, feature_metadata_path, save_feature_pipeline,
+                                     read_feature_pipeline)
+from models.tflite_model import TFLiteModel, export_tflite, compare_backends
+from controllers.inference_engine import InferenceEngine
+from metrics import stage_timer, record_evaluation, SEGMENTS_SKIPPED
+
+# O TensorFlow (Keras, feature store, modelo de treino) é importado apenas nos métodos de treinamento e do
+# backend Keras: um Controller com backend='tflite' não carrega o TensorFlow completo
 
 class Controller:
-    def __init__(self):
+    def __init__(self, backend='keras', energy_gate=None):
         """
         Inicializa a classe Controller, que orquestra o fluxo da aplicação, incluindo o carregamento de dados,
         treinamento do modelo e avaliação de gravações noturnas.
+
+        Parâmetros:
+            backend (str, opcional): Backend de inferência padrão: 'keras' (modelo_sono.h5) ou 'tflite'
+                                     (modelo_sono.tflite, ver `exportar_tflite`). Valor padrão é 'keras'.
+            energy_gate (EnergyGate, opcional): Primeiro estágio que descarta segmentos silenciosos antes do
+                                                modelo em `avaliar_noite` e `avaliar_audio`. Se None, todos
+                                                os segmentos são classificados pelo modelo.
         """
-        self.model = self.carregar_modelo()  # Carrega o modelo salvo, se existir
+        if backend not in ('keras', 'tflite'):
+            raise ValueError(f"Backend de inferência desconhecido: {backend}")
+        self.backend = backend
+        self.energy_gate = energy_gate
+        self.model_fingerprint = None
+        self.model = None
+        self.tflite_model = None
+        # Pipeline de features do treinamento (taxa de amostragem fixa, ver FeaturePipeline). A avaliação usa
+        # `pipeline`, o do modelo carregado: o mesmo, exceto para modelos anteriores a ele (ver
+        # `verificar_pipeline_modelo`)
+        self.training_pipeline = get_pipeline()
+        self.pipeline = self.training_pipeline
+        if backend == 'tflite':
+            self.tflite_model = self.carregar_modelo_tflite()
+        else:
+            self.model = self.carregar_modelo()  # Carrega o modelo salvo, se existir
         self.input_shape = None
+        self.inference_engine = None
 
 
     def carregar_modelo(self):
@@ -23,8 +55,14 @@ class Controller:
         """
         try:
             if os.path.exists('modelo_sono.h5'):
+                from tensorflow.keras.models import load_model  # type: ignore
+                pipeline = self.verificar_pipeline_modelo('modelo_sono.h5', principal=self.backend == 'keras')
+                model = load_model('modelo_sono.h5')
                 print("Modelo carregado com sucesso.")
-                return load_model('modelo_sono.h5')
+                if self.backend == 'keras':
+                    self.pipeline = pipeline
+                    self.model_fingerprint = self.calcular_fingerprint('modelo_sono.h5')
+                return model
             else:
                 print("Modelo não encontrado. Necessário treinar o modelo primeiro.")
                 return None
@@ -33,14 +71,142 @@ class Controller:
             return None
 
 
-    def preparar_dados(self):
+    def carregar_modelo_tflite(self, model_path='modelo_sono.tflite'):
         """
-        Baixa o dataset e carrega os dados, extraindo as features dos áudios e separando os dados em conjuntos
-        de treino e teste.
+        Carrega o modelo TFLite exportado por `exportar_tflite`. Se o arquivo não existir, retorna None.
         """
-        path = download_dataset()
+        try:
+            if os.path.exists(model_path):
+                pipeline = self.verificar_pipeline_modelo(model_path, principal=self.backend == 'tflite')
+                model = TFLiteModel(model_path)
+                print("Modelo TFLite carregado com sucesso.")
+                if self.backend == 'tflite':
+                    self.pipeline = pipeline
+                    self.model_fingerprint = self.calcular_fingerprint(model_path)
+                return model
+            else:
+                print("Modelo TFLite não encontrado. Necessário exportar o modelo primeiro.")
+                return None
+        except Exception as e:
+            print(f"Erro ao carregar o modelo TFLite: {e}")
+            return None
+
+
+    def pipeline_do_modelo(self, model_path):
+        """
+        Descrição do pipeline de features com que o modelo foi treinado (ver `save_feature_pipeline`). Modelos
+        sem essa informação são anteriores ao pipeline com taxa fixa e foram treinados com features na taxa
+        original dos áudios (FEATURE_SAMPLE_RATE=0).
+        """
+        return read_feature_pipeline(model_path) or get_pipeline(sample_rate=None).describe()
+
+
+    def verificar_pipeline_modelo(self, model_path, principal=True):
+        """
+        Retorna o pipeline de features com que o modelo foi treinado, a ser usado na avaliação.
+
+        Um modelo sem a descrição do pipeline é anterior ao pipeline com taxa fixa: ele é carregado com um
+        aviso e avaliado com features na taxa original dos áudios, como foi treinado. Um modelo treinado
+        com outro pipeline registrado (que não seja o atual nem o da taxa original) não é carregado. Um modelo
+        que não é o do backend padrão (`principal`) precisa usar o mesmo pipeline dele, já que a avaliação extrai as features uma única vez.
+        """
+        treinado_com = read_feature_pipeline(model_path)
+        legado = get_pipeline(sample_rate=None)
+        if treinado_com is None and self.training_pipeline.describe() == legado.describe():
+            pipeline = self.training_pipeline  # FEATURE_SAMPLE_RATE=0: o pipeline atual já é o da taxa original
+        elif treinado_com is None:
+            pipeline = legado
+            print(f"Aviso: o modelo '{model_path}' não registra o pipeline de features do treinamento; usando "
+                  f"features na taxa original dos áudios ('{legado.describe()}'). Treine (ou ajuste) o modelo "
+                  f"para usar o pipeline atual ('{self.training_pipeline.describe()}').")
+        elif treinado_com == self.training_pipeline.describe():
+            pipeline = self.training_pipeline
+        elif treinado_com == legado.describe():
+            pipeline = legado  # Ex.: modelo legado exportado para TFLite
+        else:
+            raise RuntimeError(f"O modelo '{model_path}' foi treinado com '{treinado_com}', mas o pipeline atual é "
+                               f"'{self.training_pipeline.describe()}'. Ajuste FEATURE_SAMPLE_RATE ou treine (ou "
+                               f"ajuste) o modelo com as features atuais.")
+        if not principal and pipeline.describe() != self.pipeline.describe():
+            raise RuntimeError(f"O modelo '{model_path}' usa o pipeline '{pipeline.describe()}', diferente do "
+                               f"modelo do backend padrão ('{self.pipeline.describe()}').")
+        return pipeline
+
+
+    def obter_modelo(self, backend=None):
+        """
+        Retorna o modelo do backend de inferência informado (ou do backend padrão), carregando-o na
+        primeira utilização. Retorna None se o modelo não estiver disponível.
+        """
+        backend = backend or self.backend
+        if backend == 'tflite':
+            if self.tflite_model is None:
+                self.tflite_model = self.carregar_modelo_tflite()
+            return self.tflite_model
+        if backend != 'keras':
+            raise ValueError(f"Backend de inferência desconhecido: {backend}")
+        if self.model is None and self.backend != 'keras':
+            self.model = self.carregar_modelo()
+        return self.model
+
+
+    def calcular_fingerprint(self, model_path):
+        """
+        Calcula o hash SHA-256 do arquivo do modelo, usado para identificar a versão do modelo (por exemplo,
+        nas chaves do cache de resultados).
+        """
+        sha = hashlib.sha256()
+        with open(model_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+
+    def iniciar_motor_inferencia(self, max_batch_size=512, max_wait=0.005):
+        """
+        Inicia o motor de inferência com micro-batching (ver `InferenceEngine`). A partir daí, as predições
+        de `avaliar_noite` de requisições concorrentes são agrupadas em lotes compartilhados.
+        """
+        if self.inference_engine is None:
+            self.inference_engine = InferenceEngine(lambda batch: self.obter_modelo().predict_on_batch(batch),
+                                                    max_batch_size=max_batch_size, max_wait=max_wait)
+        return self.inference_engine
+
+
+    def aquecer(self):
+        """
+        Executa uma predição com um lote fictício (1, 40, 44, 1), para que a primeira requisição real não
+        pague o custo de inicialização do modelo (tracing do grafo, alocação dos tensores).
+        Retorna True se o modelo estiver disponível.
+        """
+        if self.obter_modelo() is None:
+            return False
+        start = time.perf_counter()
+        self.predizer(np.zeros((1, 40, 44, 1), dtype=np.float32))
+        print(f"Modelo aquecido em {time.perf_counter() - start:.2f}s.")
+        return True
+
+
+    def predizer(self, segments, backend=None):
+        """
+        Realiza a predição dos segmentos, usando o motor de inferência compartilhado quando ele estiver ativo
+        (o motor usa o backend padrão; outro `backend` é executado diretamente).
+        """
+        with stage_timer('predict'):
+            if self.inference_engine is not None and backend in (None, self.backend):
+                return self.inference_engine.predict(segments)
+            return self.obter_modelo(backend).predict(segments)
+
+
+    def preparar_dados(self, dataset_path=None):
+        """
+        Baixa o dataset (ou usa o já existente em `dataset_path`) e carrega os dados, extraindo as features dos
+        áudios e separando os dados em conjuntos de treino e teste.
+        """
+        from tensorflow.keras.utils import to_categorical  # type: ignore
+        path = dataset_path or download_dataset()
         print("Carregando dataset e extraindo features...")
-        X, y = load_dataset(path)
+        X, y = load_dataset(path, workers=os.cpu_count() or 1, cache_dir='features_cache')
         print("Dataset carregado. Formato de X:", X.shape, "e y:", y.shape)
         
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
@@ -53,6 +219,7 @@ class Controller:
         """
         Constrói, treina e avalia o modelo de rede neural.
         """
+        from models.model import build_model
         self.input_shape = X_train.shape[1:]
         self.model = build_model(self.input_shape)
         self.model.summary()
@@ -63,24 +230,297 @@ class Controller:
         loss, accuracy = self.model.evaluate(X_test, y_test_cat)
         print("Acurácia no conjunto de teste: {:.2f}%".format(accuracy * 100))
         
-        # Salva o modelo treinado
+        # Salva o modelo treinado, com o pipeline de features usado no treinamento
         self.model.save('modelo_sono.h5')
+        save_feature_pipeline('modelo_sono.h5', self.training_pipeline.describe())
+        self.pipeline = self.training_pipeline
+        self.model_fingerprint = self.calcular_fingerprint('modelo_sono.h5')
         print("Modelo salvo como 'modelo_sono.h5'.")
 
 
-    def avaliar_noite(self, audio_path, segment_duration=1.0, threshold=20):
+    def preparar_feature_store(self, store_dir='feature_store'):
+        """
+        Baixa o dataset, extrai as features e grava uma feature store em disco (ver `write_feature_store`),
+        para que os próximos treinamentos leiam os dados sem extrair as features novamente.
+        """
+        from models.feature_store import write_feature_store
+        path = download_dataset()
+        print("Carregando dataset e extraindo features...")
+        X, y = load_dataset(path, workers=os.cpu_count() or 1, cache_dir='features_cache')
+        return write_feature_store(store_dir, X, y, feature_pipeline=self.training_pipeline.describe())
+
 
+    def verificar_feature_store(self, store_dir):
         """
-        Processa uma gravação noturna completa e classifica cada segmento.
-        Retorna um dicionário com os resultados da avaliação.
+        Garante que a feature store foi extraída com o mesmo pipeline de features da avaliação; caso
+        contrário, o modelo seria treinado com features diferentes das que recebe em produção.
         """
-        if self.model is None:
-            return {"error": "Modelo não treinado. Treine o modelo antes de avaliar uma gravação."}
-        
-        # Carrega a gravação completa e obtém a taxa de amostragem
-        audio, sample_rate = librosa.load(audio_path, sr=None)
+        from models.feature_store import read_feature_store_meta
+        extraida_com = read_feature_store_meta(store_dir).get("feature_pipeline")
+        if extraida_com is None:
+            print(f"Aviso: a feature store '{store_dir}' não registra o pipeline de features usado na extração.")
+        elif extraida_com != self.training_pipeline.describe():
+            raise RuntimeError(f"A feature store '{store_dir}' foi extraída com '{extraida_com}', mas o pipeline "
+                               f"atual é '{self.training_pipeline.describe()}'. Gere a feature store novamente.")
+
+
+    def treinar_modelo_do_store(self, store_dir='feature_store', epochs=30, batch_size=32):
+        """
+        Constrói, treina e avalia o modelo lendo os dados de uma feature store com `tf.data`, sem carregar
+        o dataset inteiro na memória.
+        """
+        from models.model import build_model
+        from models.feature_store import open_feature_store, make_dataset
+        self.verificar_feature_store(store_dir)
+        features, _, _ = open_feature_store(store_dir)
+        self.input_shape = features.shape[1:]
+        self.model = build_model(self.input_shape)
+        self.model.summary()
+
+        train_ds = make_dataset(store_dir, "train", batch_size=batch_size)
+        test_ds = make_dataset(store_dir, "test", batch_size=batch_size, shuffle=False)
+
+        self.model.fit(train_ds, epochs=epochs, validation_data=test_ds)
+
+        loss, accuracy = self.model.evaluate(test_ds)
+        print("Acurácia no conjunto de teste: {:.2f}%".format(accuracy * 100))
+
+        # Salva o modelo treinado, com o pipeline de features usado no treinamento
+        self.model.save('modelo_sono.h5')
+        save_feature_pipeline('modelo_sono.h5', self.training_pipeline.describe())
+        self.pipeline = self.training_pipeline
+        self.model_fingerprint = self.calcular_fingerprint('modelo_sono.h5')
+        print("Modelo salvo como 'modelo_sono.h5'.")
+
+
+    def ajustar_modelo(self, novos_dir, store_dir=None, dataset_path=None, replay_ratio=1.0, epochs=10,
+                       batch_size=32, patience=3, learning_rate=1e-4, validation_size=0.2, output_dir='modelos',
+                       promover=False, tolerancia=0.01):
+        """
+        Ajuste fino (warm start) do modelo_sono.h5 com clipes rotulados novos, sem treinar do zero.
+
+        O treino usa os clipes novos de `novos_dir` (subpastas "1" e "0", como o dataset) e uma amostra de
+        replay das features de treino já existentes (feature store em `store_dir` ou features em cache do
+        dataset), com `replay_ratio` amostras antigas por amostra nova, para que o modelo não esqueça o que
+        já aprendeu. A validação do treinamento usa uma parte (`validation_size`) dos clipes novos e uma
+        amostra de replay de validação, tirada do conjunto de treino antigo sem repetir as amostras de
+        treino; o treinamento para cedo quando a perda de validação deixa de melhorar (`patience` épocas) e
+        volta aos melhores pesos. O modelo de cada época é gravado em `checkpoints/` da versão. O conjunto de
+        teste do dataset não participa do treinamento nem da parada antecipada: ele é reservado para a
+        decisão de promoção.
+
+        O resultado é gravado como uma nova versão em `output_dir` (ver `save_model_version`), com as
+        métricas de validação do modelo de origem e do ajustado. Com `promover=True`, a versão substitui o
+        modelo_sono.h5, exceto se a acurácia no conjunto de teste do dataset cair mais que `tolerancia`.
+
+        Retorna:
+            dict: Os metadados da versão gravada.
+        """
+        from tensorflow.keras.models import load_model  # type: ignore
+        from tensorflow.keras.utils import to_categorical  # type: ignore
+        from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint  # type: ignore
+        from models.model import compile_for_fine_tuning, create_version_dir, save_model_version
+
+        if not os.path.exists('modelo_sono.h5'):
+            raise RuntimeError("Modelo não encontrado. Treine o modelo antes do ajuste fino.")
+        parent_fingerprint = self.calcular_fingerprint('modelo_sono.h5')
+        model = load_model('modelo_sono.h5')
+
+        # Clipes novos, com o mesmo cache de features do dataset
+        X_new, y_new = load_files(list_labelled_files(novos_dir), workers=os.cpu_count() or 1,
+                                  cache_dir='features_cache')
+        if len(X_new) == 0:
+            raise RuntimeError(f"Nenhum clipe rotulado encontrado em '{novos_dir}'.")
+        if validation_size > 0 and len(X_new) >= 5:
+            stratify = y_new if np.bincount(y_new, minlength=2).min() >= 2 else None
+            X_new_train, X_new_val, y_new_train, y_new_val = train_test_split(
+                X_new, y_new, test_size=validation_size, random_state=42, stratify=stratify)
+        else:
+            X_new_train, y_new_train = X_new, y_new
+            X_new_val, y_new_val = X_new[:0], y_new[:0]
+
+        # Amostras de replay do conjunto de treino antigo, para o treino e para a validação; o conjunto de
+        # teste antigo fica reservado para a decisão de promoção
+        if store_dir is not None:
+            X_old, y_old = self.amostras_do_dataset(store_dir, 'train')
+            X_old_test, y_old_test = self.amostras_do_dataset(store_dir, 'test')
+        else:
+            X_old, X_old_test, y_old_cat, y_old_test_cat = self.preparar_dados(dataset_path)
+            y_old, y_old_test = np.argmax(y_old_cat, axis=1), np.argmax(y_old_test_cat, axis=1)
+        order = np.random.default_rng(42).permutation(len(X_old))
+        num_replay = min(len(X_old), int(round(replay_ratio * len(X_new_train))))
+        num_replay_val = min(len(X_old) - num_replay, int(round(replay_ratio * len(X_new_val))))
+        replay_idx = np.sort(order[:num_replay])
+        replay_val_idx = np.sort(order[num_replay:num_replay + num_replay_val])
+
+        X_train = np.concatenate([X_new_train, X_old[replay_idx]])
+        y_train = np.concatenate([y_new_train, y_old[replay_idx]])
+        X_val = np.concatenate([X_new_val, X_old[replay_val_idx]])
+        y_val = np.concatenate([y_new_val, y_old[replay_val_idx]])
+        print(f"Ajuste fino: {len(X_new_train)} clipes novos + {num_replay} de replay; validação com "
+              f"{len(X_new_val)} novos + {num_replay_val} de replay; {len(X_old_test)} clipes do teste do "
+              f"dataset reservados para a promoção.")
+
+        def avaliar(m):
+            metricas = {}
+            for nome, X, y in (('dataset_test', X_old_test, y_old_test), ('new_val', X_new_val, y_new_val)):
+                if len(X) > 0:
+                    loss, accuracy = m.evaluate(X, to_categorical(y, 2), verbose=0)
+                    metricas[nome] = {"loss": float(loss), "accuracy": float(accuracy), "samples": int(len(X))}
+            return metricas
+
+        antes = avaliar(model)
+        version_dir = create_version_dir(output_dir)
+        os.makedirs(os.path.join(version_dir, 'checkpoints'))
+        compile_for_fine_tuning(model, learning_rate)
+        callbacks = [ModelCheckpoint(os.path.join(version_dir, 'checkpoints', 'epoch_{epoch:02d}.h5'))]
+        if len(X_val) > 0:
+            callbacks.append(EarlyStopping(monitor='val_loss', patience=patience, restore_best_weights=True))
+        else:
+            print("Aviso: sem amostras de validação; o ajuste fino roda todas as épocas.")
+        history = model.fit(
+            X_train, to_categorical(y_train, 2), epochs=epochs, batch_size=batch_size,
+            validation_data=(X_val, to_categorical(y_val, 2)) if len(X_val) > 0 else None,
+            callbacks=callbacks
+        )
+        depois = avaliar(model)
+
+        metadata = {
+            "parent_fingerprint": parent_fingerprint,
+            "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "new_samples": int(len(X_new_train)),
+            "replay_samples": int(num_replay),
+            "replay_validation_samples": int(num_replay_val),
+            "epochs_run": len(history.history['loss']),
+            "params": {"replay_ratio": replay_ratio, "epochs": epochs, "batch_size": batch_size,
+                       "patience": patience, "learning_rate": learning_rate},
+            "feature_pipeline": self.training_pipeline.describe(),
+            "parent_feature_pipeline": self.pipeline_do_modelo('modelo_sono.h5'),
+            "history": {k: [float(v) for v in values] for k, values in history.history.items()},
+            "validation_before": antes,
+            "validation": depois,
+        }
+        for nome, metricas in depois.items():
+            print(f"{nome}: acurácia {antes[nome]['accuracy'] * 100:.2f}% -> {metricas['accuracy'] * 100:.2f}%")
+
+        if promover:
+            queda = (antes['dataset_test']['accuracy'] - depois['dataset_test']['accuracy']
+                     if 'dataset_test' in depois else 0.0)
+            metadata["promoted"] = queda <= tolerancia
+            if not metadata["promoted"]:
+                print(f"Versão não promovida: a acurácia no conjunto de teste caiu {queda * 100:.2f} pontos.")
+        model_path = save_model_version(model, version_dir, metadata)
+
+        if metadata.get("promoted"):
+            # Cópia seguida de rename, para que a API nunca leia um arquivo incompleto
+            tmp_path = 'modelo_sono.h5.tmp'
+            shutil.copyfile(model_path, tmp_path)
+            os.replace(tmp_path, 'modelo_sono.h5')
+            save_feature_pipeline('modelo_sono.h5', self.training_pipeline.describe())
+            self.model = model
+            if self.backend == 'keras':
+                self.pipeline = self.training_pipeline
+                self.model_fingerprint = self.calcular_fingerprint('modelo_sono.h5')
+            print(f"Versão {os.path.basename(version_dir)} promovida para 'modelo_sono.h5'.")
+            self.reexportar_tflite(store_dir)
+        return metadata
+
+
+    def reexportar_tflite(self, store_dir=None, model_path='modelo_sono.tflite'):
+        """
+        Após a promoção de um novo modelo_sono.h5, exporta novamente o modelo TFLite, se ele existir, com a
+        mesma quantização do arquivo anterior; caso contrário, o backend TFLite continuaria servindo o modelo
+        antigo. Se a exportação falhar, o arquivo antigo (e a sua descrição de pipeline) é removido, para que
+        ele não seja carregado por engano.
+        """
+        if not os.path.exists(model_path):
+            return
+        try:
+            quantize = TFLiteModel(model_path).quantized
+            self.exportar_tflite(model_path, quantize=quantize, store_dir=store_dir)
+        except Exception as e:
+            print(f"Erro ao exportar novamente o modelo TFLite: {e}. '{model_path}' foi removido; exporte-o "
+                  f"novamente.")
+            for path in (model_path, feature_metadata_path(model_path)):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.tflite_model = None
+
+
+    def amostras_do_dataset(self, store_dir=None, subset='train', dataset_path=None):
+        """
+        Retorna as features e rótulos de uma parte do dataset ('train' ou 'test'), lidos da feature store
+        em `store_dir` ou, se None, extraídos do dataset (com o cache de features) e divididos como em
+        `preparar_dados`. Usado na calibração e na comparação do modelo TFLite.
+        """
+        if store_dir is not None:
+            from models.feature_store import open_feature_store, SPLIT_TRAIN, SPLIT_TEST
+            self.verificar_feature_store(store_dir)
+            features, labels, split = open_feature_store(store_dir)
+            idx = np.flatnonzero(split == (SPLIT_TRAIN if subset == 'train' else SPLIT_TEST))
+            return np.asarray(features[idx]), labels[idx]
+
+        X_train, X_test, y_train_cat, y_test_cat = self.preparar_dados(dataset_path)
+        if subset == 'train':
+            return X_train, np.argmax(y_train_cat, axis=1)
+        return X_test, np.argmax(y_test_cat, axis=1)
+
+
+    def exportar_tflite(self, output_path='modelo_sono.tflite', quantize=False, store_dir=None):
+        """
+        Exporta o modelo Keras treinado para TFLite (ver `export_tflite`). Com `quantize=True`, o modelo é
+        quantizado para int8, calibrado com as amostras de treino do dataset (feature store em `store_dir`
+        ou features extraídas do dataset).
+        """
+        model = self.obter_modelo('keras')
+        if model is None:
+            raise RuntimeError("Modelo não treinado. Treine o modelo antes de exportá-lo.")
+        calibration_data = self.amostras_do_dataset(store_dir, 'train')[0] if quantize else None
+        export_tflite(model, output_path, quantize=quantize, calibration_data=calibration_data)
+        # O pipeline é o do modelo Keras exportado, que pode ser mais novo que o do backend padrão
+        save_feature_pipeline(output_path, self.pipeline_do_modelo('modelo_sono.h5'))
+        self.tflite_model = TFLiteModel(output_path)
+        if self.backend == 'tflite':
+            self.pipeline = self.verificar_pipeline_modelo(output_path)
+            self.model_fingerprint = self.calcular_fingerprint(output_path)
+        return output_path
+
+
+    def comparar_backends(self, store_dir=None):
+        """
+        Compara acurácia e latência dos backends Keras e TFLite no conjunto de teste (ver `compare_backends`).
+        """
+        keras_model = self.obter_modelo('keras')
+        tflite_model = self.obter_modelo('tflite')
+        if keras_model is None or tflite_model is None:
+            raise RuntimeError("A comparação precisa do modelo Keras e do modelo TFLite exportado.")
+        X_test, y_test = self.amostras_do_dataset(store_dir, 'test')
+        report = compare_backends(keras_model, tflite_model, X_test, y_test)
+        for name in ('keras', 'tflite'):
+            print(f"{name}: acurácia {report[name]['accuracy'] * 100:.2f}%, "
+                  f"{report[name]['ms_per_segment']:.3f} ms por segmento")
+        print(f"Concordância entre os backends: {report['agreement'] * 100:.2f}%; "
+              f"aceleração do TFLite: {report['speedup']:.1f}x")
+        return report
+
+
+    def extrair_segmentos(self, audio, sample_rate, segment_duration=1.0, vectorized=True, mask=None):
+        """
+        Divide o áudio em segmentos de `segment_duration` segundos e extrai os MFCCs de cada um.
+        Retorna um array de forma (num_segmentos, 40, 44, 1). Se `mask` for informada, retorna apenas os
+        segmentos marcados como True.
+
+        Por padrão usa o caminho vetorizado (`extract_segment_features`), que processa os segmentos em
+        lotes. Com `vectorized=False`, usa o laço original segmento a segmento, mantido como referência. Nos
+        dois caminhos o sinal é antes reamostrado para a taxa do pipeline do modelo (`self.pipeline`).
+        """
+        if vectorized:
+            return extract_segment_features(audio, sample_rate, segment_duration, n_mfcc=40, fixed_frames=44,
+                                            mask=mask, pipeline=self.pipeline)
+
+        audio, sample_rate = self.pipeline.resample(audio, sample_rate)
         total_duration = librosa.get_duration(y=audio, sr=sample_rate)
-        
+
         segments = []
         # Segmenta o áudio e processa cada segmento
         for start in np.arange(0, total_duration, segment_duration):
@@ -106,15 +546,210 @@ class Controller:
         
         # Garanta que a forma dos dados seja (num_samples, 40, 44, 1)
         segments = segments.reshape(segments.shape[0], 40, 44, 1)
+        return segments[mask] if mask is not None else segments
+
+
+    def avaliar_noite(self, audio_path, segment_duration=1.0, threshold=20, vectorized=True, backend=None,
+                      gate=None, timeline=None):
+
+        """
+        Processa uma gravação noturna completa e classifica cada segmento.
+        Retorna um dicionário com os resultados da avaliação.
+
+        `backend` escolhe o backend de inferência ('keras' ou 'tflite'); se None, usa o padrão do Controller.
+        `gate` (EnergyGate) descarta os segmentos silenciosos antes do modelo (ver `avaliar_audio`).
+        Se `timeline` (SnoreTimeline) for informada, recebe a probabilidade de ronco de cada segmento.
+        """
+        if self.obter_modelo(backend) is None:
+            return {"error": "Modelo não treinado. Treine o modelo antes de avaliar uma gravação."}
+        
+        # Carrega a gravação completa e obtém a taxa de amostragem
+        with stage_timer('librosa_load'):
+            audio, sample_rate = librosa.load(audio_path, sr=None)
+
+        return self.avaliar_audio(audio, sample_rate, segment_duration, threshold, vectorized=vectorized,
+                                  backend=backend, gate=gate, timeline=timeline)
+
+
+    def avaliar_audio(self, audio, sample_rate, segment_duration=1.0, threshold=20, vectorized=True, backend=None,
+                      gate=None, timeline=None):
+        """
+        Classifica cada segmento de um sinal de áudio mono já decodificado (por exemplo, por
+        `decode_audio_stream`), sem precisar de um arquivo em disco.
+        Retorna um dicionário com os resultados da avaliação, no mesmo formato de `avaliar_noite`.
+
+        Com um `gate` (ou o `energy_gate` do Controller), os segmentos silenciosos são contados como sem
+        ronco sem passar pelos MFCCs e pelo modelo; `percent_ronco` continua sendo calculado sobre todos os
+        segmentos, e o resultado informa a fração descartada em `skipped_fraction`.
+
+        Se `timeline` (SnoreTimeline) for informada, recebe a probabilidade de ronco de cada segmento (zero
+        para os descartados pelo gate).
+        """
+        if self.obter_modelo(backend) is None:
+            return {"error": "Modelo não treinado. Treine o modelo antes de avaliar uma gravação."}
+
+        start = time.perf_counter()
+        gate = gate if gate is not None else self.energy_gate
+
+        # Reamostra para a taxa das features uma única vez: o gate e os MFCCs usam os mesmos segmentos
+        with stage_timer('resample'):
+            audio, sample_rate = self.pipeline.resample(audio, sample_rate)
+
+        # Primeiro estágio: seleciona os segmentos candidatos pela energia
+        mask = None
+        if gate is not None:
+            with stage_timer('energy_gate'):
+                mask = gate.candidates(audio, sample_rate, segment_duration)
+
+        # Segmenta o áudio e extrai os MFCCs dos segmentos (candidatos)
+        with stage_timer('mfcc'):
+            segments = self.extrair_segmentos(audio, sample_rate, segment_duration, vectorized=vectorized,
+                                              mask=mask)
+        total_segments = len(mask) if mask is not None else len(segments)
+        if total_segments == 0:
+            return {"error": "Gravação sem áudio para avaliar."}
 
         # Realiza a predição
-        predictions = self.model.predict(segments)
-        pred_labels = np.argmax(predictions, axis=1)
+        snore_segments = 0
+        probabilities = np.zeros(total_segments, dtype=np.float32)
+        if len(segments) > 0:
+            predictions = self.predizer(segments, backend)
+            snore_segments = np.sum(np.argmax(predictions, axis=1))
+            probabilities[mask if mask is not None else slice(None)] = predictions[:, 1]
+        if timeline is not None:
+            timeline.append(probabilities)
         
-        # Calcula a porcentagem de segmentos com ronco
-        percent_ronco = np.sum(pred_labels) / len(pred_labels) * 100
+        # Calcula a porcentagem de segmentos com ronco (os descartados pelo gate contam como sem ronco)
+        percent_ronco = snore_segments / total_segments * 100
+        record_evaluation(len(audio) / sample_rate, total_segments, time.perf_counter() - start)
         
-        # Retorna a resposta como um dicionário
+        resultado = self._montar_resultado(percent_ronco, threshold)
+        if mask is not None:
+            skipped = total_segments - len(segments)
+            SEGMENTS_SKIPPED.inc(skipped)
+            resultado["skipped_fraction"] = skipped / total_segments
+        return resultado
+
+
+    def avaliar_noite_streaming(self, audio_path, segment_duration=1.0, threshold=20, batch_size=256,
+                                block_duration=60.0, backend=None, timeline=None):
+        """
+        Avalia uma gravação noturna em modo streaming: o arquivo WAV é lido em blocos de `block_duration`
+        segundos e os MFCCs são enviados ao modelo em lotes de `batch_size` segmentos, mantendo apenas
+        os totais acumulados. O uso de memória não depende da duração da gravação (exceto pela `timeline`
+        opcional, que guarda uma probabilidade por segmento).
+        Retorna um dicionário com os resultados da avaliação, no mesmo formato de `avaliar_noite`.
+        """
+        if self.obter_modelo(backend) is None:
+            return {"error": "Modelo não treinado. Treine o modelo antes de avaliar uma gravação."}
+
+        batches = stream_segment_features(audio_path, segment_duration, n_mfcc=40, fixed_frames=44,
+                                          batch_size=batch_size, block_duration=block_duration,
+                                          pipeline=self.pipeline)
+        return self.avaliar_lotes(batches, threshold, segment_duration,
+                                  audio_seconds=librosa.get_duration(path=audio_path), backend=backend,
+                                  timeline=timeline)
+
+
+    def avaliar_blocos(self, blocks, sample_rate, segment_duration=1.0, threshold=20, batch_size=256, backend=None,
+                       gate=None, timeline=None):
+        """
+        Avalia um sinal mono recebido em blocos (por exemplo, a saída do ffmpeg lida por `iter_audio_blocks`),
+        com a mesma segmentação de `avaliar_audio`, mas sem manter o sinal inteiro na memória: os MFCCs são
+        extraídos à medida que os blocos chegam (ver `IncrementalSegmentFeatures`) e classificados em lotes
+        de até `batch_size` segmentos, mantendo apenas os totais acumulados. O pico de memória depende do
+        tamanho dos blocos e dos lotes, e não da duração da gravação.
+
+        Com um `gate` (ou o `energy_gate` do Controller), os segmentos silenciosos são descartados antes dos
+        MFCCs, como em `avaliar_audio`, e o resultado informa a fração descartada em `skipped_fraction`.
+        Se `timeline` (SnoreTimeline) for informada, recebe a probabilidade de ronco de cada segmento.
+        Retorna um dicionário com os resultados da avaliação, no mesmo formato de `avaliar_noite`.
+        """
+        if self.obter_modelo(backend) is None:
+            return {"error": "Modelo não treinado. Treine o modelo antes de avaliar uma gravação."}
+
+        start = time.perf_counter()
+        gate = gate if gate is not None else self.energy_gate
+        extractor = IncrementalSegmentFeatures(sample_rate, segment_duration, n_mfcc=40, fixed_frames=44,
+                                               batch_size=batch_size, gate=gate, pipeline=self.pipeline)
+        total_segments = 0
+        snore_segments = 0
+        candidates = 0
+        blocks = iter(blocks)
+        while True:
+            with stage_timer('decode'):
+                block = next(blocks, None)
+            with stage_timer('mfcc'):
+                segments = extractor.push(block) if block is not None else extractor.finish()
+            probabilities = np.zeros(len(extractor.mask), dtype=np.float32)
+            for first in range(0, len(segments), batch_size):
+                predictions = self.predizer(segments[first:first + batch_size], backend)
+                snore_segments += int(np.sum(np.argmax(predictions, axis=1)))
+                probabilities[np.flatnonzero(extractor.mask)[first:first + batch_size]] = predictions[:, 1]
+            if timeline is not None:
+                timeline.append(probabilities)
+            total_segments += len(extractor.mask)
+            candidates += len(segments)
+            if block is None:
+                break
+
+        if total_segments == 0:
+            return {"error": "Gravação sem áudio para avaliar."}
+        audio_seconds = extractor.total_samples / extractor.sample_rate
+        record_evaluation(audio_seconds, total_segments, time.perf_counter() - start)
+
+        resultado = self._montar_resultado(snore_segments / total_segments * 100, threshold)
+        if gate is not None:
+            skipped = total_segments - candidates
+            SEGMENTS_SKIPPED.inc(skipped)
+            resultado["skipped_fraction"] = skipped / total_segments
+        return resultado
+
+
+    def avaliar_lotes(self, batches, threshold=20, segment_duration=1.0, audio_seconds=None, backend=None,
+                      timeline=None):
+        """
+        Classifica uma sequência de lotes de segmentos (N, 40, 44, 1), mantendo apenas os totais acumulados
+        de segmentos e de segmentos com ronco. `audio_seconds` (duração da gravação) é usado apenas nas
+        métricas de vazão; se omitido, é estimado pelo número de segmentos. Se `timeline` (SnoreTimeline) for
+        informada, recebe a probabilidade de ronco de cada segmento.
+        Retorna um dicionário com os resultados da avaliação, no mesmo formato de `avaliar_noite`.
+        """
+        if self.obter_modelo(backend) is None:
+            return {"error": "Modelo não treinado. Treine o modelo antes de avaliar uma gravação."}
+
+        start = time.perf_counter()
+        total_segments = 0
+        snore_segments = 0
+        batches = iter(batches)
+        while True:
+            # Os lotes podem ser gerados sob demanda (leitura e MFCC em streaming)
+            with stage_timer('mfcc'):
+                batch = next(batches, None)
+            if batch is None:
+                break
+            predictions = self.predizer(np.asarray(batch), backend)
+            pred_labels = np.argmax(predictions, axis=1)
+            if timeline is not None:
+                timeline.append(predictions[:, 1])
+            snore_segments += int(np.sum(pred_labels))
+            total_segments += len(pred_labels)
+
+        if total_segments == 0:
+            return {"error": "Gravação sem áudio para avaliar."}
+
+        if audio_seconds is None:
+            audio_seconds = total_segments * segment_duration
+        record_evaluation(audio_seconds, total_segments, time.perf_counter() - start)
+
+        percent_ronco = snore_segments / total_segments * 100
+        return self._montar_resultado(percent_ronco, threshold)
+
+
+    def _montar_resultado(self, percent_ronco, threshold):
+        """
+        Monta o dicionário de resposta a partir da porcentagem de segmentos com ronco.
+        """
         if percent_ronco > threshold:
             return {
                 "message": "Sono possivelmente não saudável.",
@@ -125,5 +760,3 @@ class Controller:
                 "message": "Sono possivelmente saudável.",
                 "percent_ronco": percent_ronco
             }
-
-
@@ -0,0 +1,116 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+import numpy as np  # type: ignore
+
+
+class InferenceEngine:
+    def __init__(self, predict_fn, max_batch_size=512, max_wait=0.005):
+        """
+        Motor de inferência com micro-batching compartilhado entre requisições concorrentes.
+
+        As requisições colocam seus segmentos em uma fila; uma única thread de trabalho junta os segmentos
+        de várias requisições em um lote de até `max_batch_size` segmentos (ou o que chegar até `max_wait`
+        segundos após o primeiro), faz uma única predição por lote e devolve a cada requisição a sua fatia
+        das predições.
+
+        Parâmetros:
+            predict_fn (callable): Função que recebe um array (N, 40, 44, 1) e retorna as predições (N, classes).
+            max_batch_size (int, opcional): Número máximo de segmentos por predição. Valor padrão é 512.
+            max_wait (float, opcional): Tempo máximo, em segundos, de espera por mais segmentos. Valor padrão é 0.005.
+        """
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._carry = None
+        self._lock = threading.Lock()
+        self._pending_segments = 0
+        self._batches = 0
+        self._segments = 0
+        self._requests = 0
+        self._last_batch_size = 0
+        self._max_batch_seen = 0
+        self._worker = threading.Thread(target=self._run, name="inference-engine", daemon=True)
+        self._worker.start()
+
+    def predict(self, segments):
+        """
+        Envia os segmentos para a fila e bloqueia até que todas as predições estejam prontas.
+        Requisições maiores que `max_batch_size` são divididas em partes.
+        """
+        if len(segments) == 0:
+            return self.predict_fn(segments)
+
+        futures = []
+        with self._lock:
+            self._requests += 1
+            self._pending_segments += len(segments)
+        for first in range(0, len(segments), self.max_batch_size):
+            future = Future()
+            self._queue.put((segments[first:first + self.max_batch_size], future))
+            futures.append(future)
+        return np.concatenate([future.result() for future in futures])
+
+    def metrics(self):
+        """Retorna as métricas de fila e de tamanho de lote do motor."""
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "pending_segments": self._pending_segments,
+                "requests": self._requests,
+                "batches": self._batches,
+                "segments": self._segments,
+                "mean_batch_size": self._segments / self._batches if self._batches else 0.0,
+                "last_batch_size": self._last_batch_size,
+                "max_batch_size_seen": self._max_batch_seen,
+            }
+
+    def _collect(self):
+        """Junta itens da fila até atingir `max_batch_size` segmentos ou o prazo de espera."""
+        if self._carry is not None:
+            items, self._carry = [self._carry], None
+        else:
+            items = [self._queue.get()]
+        size = len(items[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if size + len(item[0]) > self.max_batch_size:
+                # Não cabe neste lote: abre o próximo
+                self._carry = item
+                break
+            items.append(item)
+            size += len(item[0])
+        return items
+
+    def _dispatch(self, items):
+        batch = np.concatenate([segments for segments, _ in items])
+        try:
+            predictions = np.asarray(self.predict_fn(batch))
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+        else:
+            first = 0
+            for segments, future in items:
+                future.set_result(predictions[first:first + len(segments)])
+                first += len(segments)
+
+        with self._lock:
+            self._batches += 1
+            self._segments += len(batch)
+            self._pending_segments -= len(batch)
+            self._last_batch_size = len(batch)
+            self._max_batch_seen = max(self._max_batch_seen, len(batch))
+
+    def _run(self):
+        while True:
+            self._dispatch(self._collect())
@@ -0,0 +1,145 @@
+import os
+import uuid
+import threading
+import collections
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np  # type: ignore
+import librosa  # type: ignore
+from pydub import AudioSegment  # type: ignore
+from models.features import extract_segment_features
+from models.timeline import SnoreTimeline
+
+
+def preparar_segmentos(upload_path, features_path, segment_duration=1.0, pipeline=None):
+    """
+    Decodifica o áudio enviado, extrai os MFCCs de todos os segmentos e grava o resultado em `features_path`
+    (.npy). Executada nos processos do pool, fora do processo que atende as requisições HTTP. `pipeline` é o
+    pipeline de features do modelo (`Controller.pipeline`); se None, usa o do FEATURE_SAMPLE_RATE.
+
+    Retorna:
+        str: O caminho do arquivo .npy com os segmentos, de forma (num_segmentos, 40, 44, 1).
+    """
+    # O WAV intermediário fica junto das features, e não da gravação (que pode estar em um diretório só de leitura)
+    wav_path = os.path.splitext(features_path)[0] + ".decoded.wav"
+    AudioSegment.from_file(upload_path).export(wav_path, format="wav")
+    try:
+        audio, sample_rate = librosa.load(wav_path, sr=None)
+        segments = extract_segment_features(audio, sample_rate, segment_duration, n_mfcc=40, fixed_frames=44,
+                                            pipeline=pipeline)
+        np.save(features_path, segments)
+    finally:
+        os.remove(wav_path)
+    return features_path
+
+
+class JobRunner:
+    def __init__(self, controller, job_store, on_result=None, workers=2, max_pending=16, jobs_dir='uploads/jobs'):
+        """
+        Executa avaliações de gravações como jobs assíncronos.
+
+        A decodificação e a extração de features rodam em um pool de `workers` processos; a predição e a
+        gravação do resultado rodam no processo principal, usando o modelo já carregado no `controller`.
+        O estado de cada job é mantido no `job_store`, e jobs não concluídos são retomados por `recover()`
+        após um reinício.
+
+        Parâmetros:
+            controller (Controller): Controller com o modelo carregado.
+            job_store (JobStore): Armazenamento persistente dos jobs.
+            on_result (callable, opcional): Chamado com (job, upload_path, resultado, timeline) quando um job
+                                            termina com sucesso, por exemplo para gravar o resultado e a
+                                            linha do tempo (SnoreTimeline) no MySQL.
+            workers (int, opcional): Número de processos do pool de decodificação/features. Valor padrão é 2.
+            max_pending (int, opcional): Número máximo de jobs na fila ou em execução. Acima disso, novos
+                                         jobs são recusados e os jobs retomados por `recover()` aguardam
+                                         uma vaga. Valor padrão é 16.
+            jobs_dir (str, opcional): Diretório onde os uploads e features dos jobs são guardados.
+        """
+        self.controller = controller
+        self.job_store = job_store
+        self.on_result = on_result
+        self.max_pending = max_pending
+        self.jobs_dir = jobs_dir
+        os.makedirs(jobs_dir, exist_ok=True)
+
+        # Os processos do pool só usam librosa/pydub; o modelo continua apenas no processo principal. 'spawn':
+        # um fork do processo do Flask, com threads e o TensorFlow já carregado, pode travar
+        self.process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        self.dispatcher = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job-runner')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._backlog = collections.deque()  # Jobs retomados que aguardam uma vaga
+
+    def submit(self, filename, file_storage, params):
+        """
+        Salva o upload e enfileira um novo job. Retorna o id do job, ou None se a fila estiver cheia.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return None
+            self._pending += 1
+
+        job_id = uuid.uuid4().hex
+        upload_path = os.path.join(self.jobs_dir, job_id + os.path.splitext(filename)[1])
+        try:
+            file_storage.save(upload_path)
+            self.job_store.create_job(job_id, filename, upload_path, params)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        self.dispatcher.submit(self._run_job, self.job_store.get_job(job_id))
+        return job_id
+
+    def recover(self):
+        """
+        Reenfileira os jobs que não terminaram antes do último encerramento do processo. Até `max_pending`
+        jobs são executados de imediato; os demais aguardam, em ordem de criação, que um job termine.
+        """
+        jobs = self.job_store.get_unfinished_jobs()
+        for job in jobs:
+            with self._lock:
+                if self._pending >= self.max_pending:
+                    self._backlog.append(job)
+                    continue
+                self._pending += 1
+            self.dispatcher.submit(self._run_job, job)
+        return len(jobs)
+
+    def _run_job(self, job):
+        features_path = os.path.join(self.jobs_dir, job['id'] + '.npy')
+        try:
+            self.job_store.update_status(job['id'], 'running')
+            params = job['params']
+            self.process_pool.submit(preparar_segmentos, job['upload_path'], features_path,
+                                     params.get('segment_duration', 1.0), self.controller.pipeline).result()
+
+            # Lê os segmentos por memory-map e classifica em lotes
+            segments = np.load(features_path, mmap_mode='r')
+            batches = (segments[first:first + 256] for first in range(0, len(segments), 256))
+            timeline = SnoreTimeline(params.get('segment_duration', 1.0))
+            resultado = self.controller.avaliar_lotes(batches, threshold=params.get('threshold', 20),
+                                                      segment_duration=params.get('segment_duration', 1.0),
+                                                      timeline=timeline)
+            if 'error' in resultado:
+                self.job_store.update_status(job['id'], 'error', error=resultado['error'])
+                return
+
+            resultado['percent_ronco'] = float(resultado['percent_ronco'])
+            if self.on_result is not None:
+                self.on_result(job, job['upload_path'], resultado, timeline)
+            self.job_store.update_status(job['id'], 'done', result=resultado)
+        except Exception as e:
+            print(f"Erro no job {job['id']}: {e}")
+            self.job_store.update_status(job['id'], 'error', error=str(e))
+        finally:
+            for path in (features_path, job['upload_path']):
+                if os.path.exists(path):
+                    os.remove(path)
+            with self._lock:
+                # A vaga liberada vai primeiro para os jobs retomados que aguardam
+                next_job = self._backlog.popleft() if self._backlog else None
+                if next_job is None:
+                    self._pending -= 1
+            if next_job is not None:
+                self.dispatcher.submit(self._run_job, next_job)
@@ -0,0 +1,242 @@
+import io
+import os
+import time
+import uuid
+import shutil
+import threading
+import numpy as np  # type: ignore
+import soxr  # type: ignore
+import soundfile as sf  # type: ignore
+from models.audio_decoder import decode_audio_stream, ffmpeg_disponivel
+from models.features import IncrementalSegmentFeatures
+from models.timeline import SnoreTimeline
+from metrics import stage_timer, record_evaluation
+
+
+class SessaoNaoEncontrada(KeyError):
+    pass
+
+
+class ConflitoSessao(ValueError):
+    pass
+
+
+def decodificar_trecho(stream, sample_rate=None):
+    """
+    Decodifica um trecho de áudio enviado em uma sessão para um sinal mono float32.
+
+    Usa o ffmpeg em memória quando disponível (qualquer formato); caso contrário, lê o trecho com o
+    soundfile (WAV, FLAC, OGG). Se `sample_rate` for None, o trecho mantém a sua taxa original; caso
+    contrário, é convertido para ela.
+
+    Retorna:
+        tuple: (audio, sample_rate).
+    """
+    if ffmpeg_disponivel():
+        return decode_audio_stream(stream, sample_rate=sample_rate)
+    audio, rate = sf.read(io.BytesIO(stream.read()), dtype='float32', always_2d=True)
+    audio = audio.mean(axis=1) if audio.shape[1] > 1 else audio[:, 0]
+    if sample_rate is not None and rate != sample_rate:
+        audio = soxr.resample(audio, rate, sample_rate, quality='HQ')
+        rate = sample_rate
+    return audio, rate
+
+
+class SessaoAvaliacao:
+    def __init__(self, session_id, name, session_dir, segment_duration=1.0, threshold=20):
+        """
+        Estado de uma gravação avaliada à medida que os trechos chegam: extrator incremental de MFCCs,
+        totais de segmentos, linha do tempo de ronco e o arquivo FLAC com o áudio decodificado até o momento.
+        """
+        self.id = session_id
+        self.name = name
+        self.session_dir = session_dir
+        self.segment_duration = segment_duration
+        self.threshold = threshold
+        self.status = 'open'
+        self.next_seq = 0
+        self.sample_rate = None
+        self.total_segments = 0
+        self.snore_segments = 0
+        self.processing_seconds = 0.0
+        self.updated_at = time.time()
+        self.resultado = None
+        self.timeline = SnoreTimeline(segment_duration)
+        self.extractor = None
+        self.writer = None
+        self.lock = threading.Lock()
+
+    @property
+    def audio_path(self):
+        return os.path.join(self.session_dir, 'audio.flac')
+
+    @property
+    def audio_seconds(self):
+        return self.extractor.total_samples / self.extractor.sample_rate if self.extractor is not None else 0.0
+
+    def estado(self):
+        """Estado atual da sessão, com o percent_ronco parcial dos segmentos já avaliados."""
+        estado = {
+            "session_id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "next_seq": self.next_seq,
+            "audio_seconds": self.audio_seconds,
+            "segments": self.total_segments,
+            "snore_segments": self.snore_segments,
+            "percent_ronco": self.snore_segments / self.total_segments * 100 if self.total_segments else 0.0
+        }
+        if self.resultado is not None:
+            estado.update(self.resultado)
+        return estado
+
+
+class SessionManager:
+    def __init__(self, controller, on_close=None, sessions_dir='uploads/sessions', max_sessions=64,
+                 ttl_seconds=3 * 3600):
+        """
+        Avalia gravações longas enviadas em trechos durante a noite (sessões), em vez de um único upload ao
+        final. Cada trecho é decodificado e classificado assim que chega, com a mesma segmentação e o mesmo
+        modelo de `avaliar_noite`: os segmentos que atravessam a fronteira entre dois trechos são completados
+        com o trecho seguinte (ver `IncrementalSegmentFeatures`). O percent_ronco parcial fica disponível a
+        qualquer momento e o fechamento só avalia o último segmento.
+
+        As sessões ficam na memória do processo: com vários workers, os trechos de uma sessão precisam ser
+        enviados ao mesmo worker.
+
+        Parâmetros:
+            controller (Controller): Controller com o modelo carregado.
+            on_close (callable, opcional): Chamado com (sessao, audio_path, resultado, timeline) quando uma
+                                           sessão é fechada, por exemplo para gravar o resultado no MySQL.
+                                           O valor retornado é incluído no resultado como 'audio_id'.
+            sessions_dir (str, opcional): Diretório onde o áudio decodificado das sessões é guardado.
+            max_sessions (int, opcional): Número máximo de sessões abertas. Valor padrão é 64.
+            ttl_seconds (float, opcional): Sessões sem atividade por mais que esse tempo são descartadas.
+
+        Os trechos são decodificados na taxa original do primeiro trecho (os seguintes são convertidos para
+        ela, se necessário) e reamostrados uma única vez, em fluxo, pelo pipeline de features.
+        """
+        self.controller = controller
+        self.on_close = on_close
+        self.sessions_dir = sessions_dir
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions = {}
+        self._lock = threading.Lock()
+        os.makedirs(sessions_dir, exist_ok=True)
+
+    def abrir(self, name=None, segment_duration=1.0, threshold=20):
+        """Abre uma nova sessão. Retorna a sessão, ou None se o limite de sessões abertas foi atingido."""
+        self.expirar()
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            if sum(s.status == 'open' for s in self._sessions.values()) >= self.max_sessions:
+                return None
+            session_dir = os.path.join(self.sessions_dir, session_id)
+            os.makedirs(session_dir, exist_ok=True)
+            sessao = SessaoAvaliacao(session_id, name or f"sessao_{session_id}.flac", session_dir,
+                                     segment_duration, threshold)
+            self._sessions[session_id] = sessao
+        return sessao
+
+    def obter(self, session_id):
+        with self._lock:
+            sessao = self._sessions.get(session_id)
+        if sessao is None:
+            raise SessaoNaoEncontrada(session_id)
+        return sessao
+
+    def anexar(self, session_id, seq, stream):
+        """
+        Decodifica e avalia o trecho `seq` da sessão. Os trechos devem chegar em ordem, a partir de 0; o
+        reenvio do último trecho aceito (por exemplo, após uma falha de rede) é ignorado.
+
+        Retorna:
+            dict: O estado da sessão após o trecho (ver `SessaoAvaliacao.estado`).
+        """
+        sessao = self.obter(session_id)
+        with sessao.lock:
+            if sessao.status != 'open':
+                raise ConflitoSessao("A sessão já foi fechada.")
+            if seq == sessao.next_seq - 1:
+                return dict(sessao.estado(), duplicate=True)
+            if seq != sessao.next_seq:
+                raise ConflitoSessao(f"Trecho fora de ordem: esperado {sessao.next_seq}, recebido {seq}.")
+
+            start = time.perf_counter()
+            with stage_timer('session_decode'):
+                audio, sample_rate = decodificar_trecho(stream, sessao.sample_rate)
+            if sessao.extractor is None:
+                # A taxa do primeiro trecho vale para a sessão inteira
+                sessao.sample_rate = sample_rate
+                sessao.extractor = IncrementalSegmentFeatures(sample_rate, sessao.segment_duration,
+                                                              pipeline=self.controller.pipeline)
+                sessao.writer = sf.SoundFile(sessao.audio_path, 'w', samplerate=sample_rate, channels=1,
+                                             format='FLAC', subtype='PCM_16')
+            sessao.writer.write(audio)
+
+            with stage_timer('mfcc'):
+                segments = sessao.extractor.push(audio)
+            self._classificar(sessao, segments)
+            sessao.processing_seconds += time.perf_counter() - start
+            sessao.next_seq += 1
+            sessao.updated_at = time.time()
+            return sessao.estado()
+
+    def fechar(self, session_id):
+        """
+        Avalia o último segmento, possivelmente incompleto, e encerra a sessão. Fechar novamente uma sessão
+        já fechada retorna o mesmo resultado.
+
+        Retorna:
+            dict: O estado final da sessão, com o resultado no formato de `avaliar_noite`, ou com 'error'
+                  se a sessão não tiver áudio (a sessão é encerrada do mesmo jeito).
+        """
+        sessao = self.obter(session_id)
+        with sessao.lock:
+            if sessao.status == 'closed':
+                return sessao.estado()
+
+            start = time.perf_counter()
+            if sessao.extractor is not None:
+                with stage_timer('mfcc'):
+                    segments = sessao.extractor.finish()
+                self._classificar(sessao, segments)
+                sessao.writer.close()
+            if sessao.total_segments == 0:
+                # O writer já foi fechado: a sessão é encerrada com o erro, e novos trechos são recusados
+                sessao.resultado = {"error": "Sessão sem áudio para avaliar."}
+            else:
+                sessao.processing_seconds += time.perf_counter() - start
+                record_evaluation(sessao.audio_seconds, sessao.total_segments, sessao.processing_seconds)
+                resultado = self.controller._montar_resultado(
+                    sessao.snore_segments / sessao.total_segments * 100, sessao.threshold)
+                if self.on_close is not None:
+                    resultado['audio_id'] = self.on_close(sessao, sessao.audio_path, resultado, sessao.timeline)
+                sessao.resultado = resultado
+            sessao.status = 'closed'
+            sessao.updated_at = time.time()
+            shutil.rmtree(sessao.session_dir, ignore_errors=True)
+            return sessao.estado()
+
+    def expirar(self):
+        """Descarta as sessões (abertas ou fechadas) sem atividade há mais de `ttl_seconds`."""
+        limite = time.time() - self.ttl_seconds
+        with self._lock:
+            expiradas = [s for s in self._sessions.values() if s.updated_at < limite]
+            for sessao in expiradas:
+                del self._sessions[sessao.id]
+        for sessao in expiradas:
+            with sessao.lock:
+                if sessao.writer is not None and not sessao.writer.closed:
+                    sessao.writer.close()
+            shutil.rmtree(sessao.session_dir, ignore_errors=True)
+        return len(expiradas)
+
+    def _classificar(self, sessao, segments):
+        if len(segments) == 0:
+            return
+        predictions = self.controller.predizer(segments)
+        sessao.timeline.append(predictions[:, 1])
+        sessao.snore_segments += int(np.sum(np.argmax(predictions, axis=1)))
+        sessao.total_segments += len(segments)
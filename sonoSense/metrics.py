@@ -0,0 +1,153 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Limites (em segundos) dos buckets dos histogramas de latência
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{key}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        """Contador monotônico no formato do Prometheus, com séries opcionais por rótulo."""
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0, **labels):
+        key = tuple((name, labels[name]) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels):
+        key = tuple((name, labels[name]) for name in self.label_names)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        """Histograma cumulativo no formato do Prometheus, com séries opcionais por rótulo."""
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple((name, labels[name]) for name in self.label_names)
+        with self._lock:
+            series = self._series.setdefault(key, {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series['buckets']):
+                    lines.append(f"{self.name}_bucket{_format_labels(key + (('le', bound),))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, help_text, callback):
+        """Valor instantâneo no formato do Prometheus, lido de `callback` no momento da exportação."""
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+
+    def render(self):
+        try:
+            value = float(self.callback())
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+
+class Registry:
+    def __init__(self):
+        """Conjunto de métricas exportadas juntas no formato de texto do Prometheus."""
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # Substitui uma métrica de mesmo nome (por exemplo, ao recriar o app)
+            self._metrics = [m for m in self._metrics if m.name != metric.name] + [metric]
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    'sonosense_stage_seconds', 'Latência de cada etapa da avaliação de áudio, em segundos.', ('stage',)))
+ERRORS = registry.register(Counter(
+    'sonosense_errors_total', 'Erros ocorridos em cada etapa da avaliação de áudio.', ('stage',)))
+SEGMENTS = registry.register(Counter(
+    'sonosense_segments_total', 'Segmentos de áudio classificados pelo modelo.'))
+SEGMENTS_SKIPPED = registry.register(Counter(
+    'sonosense_segments_skipped_total', 'Segmentos descartados como silêncio pelo gate de energia, sem passar pelo modelo.'))
+AUDIO_SECONDS = registry.register(Counter(
+    'sonosense_audio_seconds_total', 'Segundos de áudio avaliados.'))
+EVALUATION_SECONDS = registry.register(Counter(
+    'sonosense_evaluation_seconds_total', 'Tempo de relógio gasto avaliando áudio, em segundos.'))
+registry.register(Gauge(
+    'sonosense_audio_seconds_per_wall_second', 'Segundos de áudio avaliados por segundo de processamento.',
+    lambda: AUDIO_SECONDS.value() / EVALUATION_SECONDS.value() if EVALUATION_SECONDS.value() else 0.0))
+
+
+@contextmanager
+def stage_timer(stage):
+    """
+    Mede a duração do bloco `with` no histograma de etapas. Exceções são contadas em
+    `sonosense_errors_total` com o mesmo rótulo de etapa e propagadas.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def record_evaluation(audio_seconds, segments, wall_seconds):
+    """Acumula os contadores de vazão de uma avaliação concluída."""
+    AUDIO_SECONDS.inc(audio_seconds)
+    SEGMENTS.inc(segments)
+    EVALUATION_SECONDS.inc(wall_seconds)
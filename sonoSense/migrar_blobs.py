@@ -0,0 +1,27 @@
+import argparse
+from config import db_config, AUDIO_BLOB_DIR
+from models.audio_model import AudioModel
+from models.blob_store import LocalBlobStore
+
+def main():
+    """
+    Move os áudios guardados na coluna audio_data (LONGBLOB) da tabela audios para o blob store,
+    um por vez. Pode ser interrompida e executada novamente: apenas as linhas ainda não migradas são lidas.
+    """
+    parser = argparse.ArgumentParser(description="Migra os áudios do MySQL para o blob store.")
+    parser.add_argument("--blob-dir", default=AUDIO_BLOB_DIR, help="Diretório do blob store local.")
+    parser.add_argument("--batch-size", type=int, default=100,
+                        help="Quantidade de ids lidos por consulta; os áudios são migrados um por vez.")
+    args = parser.parse_args()
+
+    audio_model = AudioModel(**db_config, blob_store=LocalBlobStore(args.blob_dir))
+    audio_model.connect()
+    try:
+        total = audio_model.migrate_blobs(batch_size=args.batch_size)
+        print(f"Migração concluída: {total} áudios movidos para '{args.blob_dir}'.")
+    finally:
+        audio_model.close_connection()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+# /models/audio_decoder.py
+import shutil
+import struct
+import threading
+import subprocess
+import numpy as np # type: ignore
+
+# Quantidade máxima de bytes do stderr do ffmpeg guardados para a mensagem de erro
+STDERR_MAX_BYTES = 64 * 1024
+
+
+def ffmpeg_disponivel():
+    """Indica se o executável do ffmpeg está disponível no PATH."""
+    return shutil.which("ffmpeg") is not None
+
+
+class _FFmpegPipe:
+    def __init__(self, output_args, stream, chunk_size=1 << 16):
+        """
+        Executa o ffmpeg lendo o áudio de `stream` pela entrada padrão. Os bytes são enviados por uma thread
+        e o stderr é lido por outra, enquanto quem chamou lê a saída padrão (`stdout`): se o stderr não fosse
+        drenado em paralelo, um ffmpeg que escreve muitos erros (entrada corrompida) encheria o pipe e os dois
+        processos ficariam bloqueados. Apenas os últimos STDERR_MAX_BYTES do stderr são guardados.
+        """
+        command = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0", "-vn"] + output_args + ["pipe:1"]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE)
+        self.stdout = self.process.stdout
+        self._stderr = bytearray()
+        self._threads = [threading.Thread(target=self._feed, args=(stream, chunk_size), daemon=True),
+                         threading.Thread(target=self._drain, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def _feed(self, stream, chunk_size):
+        try:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                self.process.stdin.write(chunk)
+        except (BrokenPipeError, OSError, ValueError):
+            pass
+        finally:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+
+    def _drain(self):
+        for chunk in iter(lambda: self.process.stderr.read(4096), b''):
+            self._stderr += chunk
+            del self._stderr[:-STDERR_MAX_BYTES]
+
+    def finish(self):
+        """Aguarda o fim do ffmpeg. Retorna (código de saída, mensagens de erro)."""
+        self.process.wait()
+        for thread in self._threads:
+            thread.join()
+        self.stdout.close()
+        return self.process.returncode, self._stderr.decode(errors='ignore').strip()
+
+    def kill(self):
+        """Interrompe o ffmpeg (ex.: quem chamou parou de ler a saída antes do fim)."""
+        if self.process.poll() is None:
+            self.process.kill()
+        self.finish()
+
+
+def decode_audio_stream(stream, sample_rate=None, chunk_size=1 << 16):
+    """
+    Decodifica um áudio em qualquer formato suportado pelo ffmpeg diretamente em memória, sem arquivos
+    temporários: os bytes de `stream` são enviados ao ffmpeg pela entrada padrão e o áudio decodificado,
+    mono e em float32, é lido da saída padrão para um array do NumPy.
+
+    O sinal inteiro fica na memória: use esta função para trechos curtos (ex.: os de uma sessão) e
+    `iter_audio_blocks` para gravações longas.
+
+    Formatos que exigem acesso aleatório ao arquivo (por exemplo MP4/M4A com o índice no fim) podem
+    falhar quando lidos por pipe; nesse caso é levantado um RuntimeError e quem chamou deve recorrer à
+    conversão por arquivo temporário.
+
+    Parâmetros:
+        stream (file-like): Objeto com método `read` que fornece os bytes do áudio (ex.: `request.files['audio'].stream`).
+        sample_rate (int, opcional): Taxa de amostragem de saída. Se None, mantém a taxa original do áudio.
+        chunk_size (int, opcional): Tamanho, em bytes, de cada bloco enviado ao ffmpeg.
+
+    Retorna:
+        tuple: (audio, sample_rate), com o sinal mono em float32 e a sua taxa de amostragem.
+    """
+    # WAV em float32: o cabeçalho informa a taxa de amostragem quando ela não é fixada
+    output_args = ["-ac", "1"]
+    if sample_rate is not None:
+        output_args += ["-ar", str(int(sample_rate))]
+    output_args += ["-acodec", "pcm_f32le", "-f", "wav"]
+
+    pipe = _FFmpegPipe(output_args, stream, chunk_size)
+    output = pipe.stdout.read()
+    returncode, stderr = pipe.finish()
+
+    if returncode != 0 or not output:
+        raise RuntimeError(f"ffmpeg falhou ao decodificar o áudio: {stderr}")
+    return _parse_wav_float32(output)
+
+
+def iter_audio_blocks(stream, sample_rate, block_samples=1 << 18, chunk_size=1 << 16):
+    """
+    Decodifica um áudio com o ffmpeg em fluxo, como `decode_audio_stream`, gerando o sinal mono em float32
+    na taxa fixa `sample_rate` em blocos de `block_samples` amostras (o último pode ser menor). Apenas um
+    bloco fica na memória por vez, independente da duração da gravação.
+
+    Se o ffmpeg falhar, é levantado um RuntimeError ao fim da leitura, possivelmente depois de alguns blocos
+    já terem sido gerados: quem chamou deve descartar o que já processou antes de recorrer à conversão por
+    arquivo temporário.
+
+    Parâmetros:
+        stream (file-like): Objeto com método `read` que fornece os bytes do áudio.
+        sample_rate (int): Taxa de amostragem de saída.
+        block_samples (int, opcional): Quantidade de amostras de cada bloco gerado.
+        chunk_size (int, opcional): Tamanho, em bytes, de cada bloco enviado ao ffmpeg.
+
+    Retorna:
+        generator: Gera arrays float32 com até `block_samples` amostras.
+    """
+    pipe = _FFmpegPipe(["-ac", "1", "-ar", str(int(sample_rate)), "-acodec", "pcm_f32le", "-f", "f32le"],
+                       stream, chunk_size)
+    total = 0
+    try:
+        while True:
+            data = pipe.stdout.read(block_samples * 4)
+            if len(data) < 4:
+                break
+            block = np.frombuffer(data[:len(data) - len(data) % 4], dtype=np.float32)
+            total += len(block)
+            yield block
+    except BaseException:
+        pipe.kill()
+        raise
+
+    returncode, stderr = pipe.finish()
+    if returncode != 0 or total == 0:
+        raise RuntimeError(f"ffmpeg falhou ao decodificar o áudio: {stderr}")
+
+
+def _parse_wav_float32(data):
+    """
+    Lê um WAV mono float32 gerado pelo ffmpeg em pipe e retorna (amostras, taxa).
+    Como o ffmpeg não consegue voltar ao início da saída para corrigir os tamanhos do cabeçalho, o tamanho
+    do bloco 'data' é ignorado e todos os bytes após ele são considerados amostras.
+    """
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise RuntimeError("Saída do ffmpeg não é um WAV válido.")
+
+    sample_rate = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size = struct.unpack("<I", data[offset + 4:offset + 8])[0]
+        if chunk_id == b"fmt ":
+            sample_rate = struct.unpack("<I", data[offset + 12:offset + 16])[0]
+        elif chunk_id == b"data":
+            samples = data[offset + 8:]
+            samples = samples[:len(samples) - len(samples) % 4]
+            return np.frombuffer(samples, dtype=np.float32), sample_rate
+        offset += 8 + chunk_size + (chunk_size % 2)
+
+    raise RuntimeError("Saída do ffmpeg sem bloco de dados.")
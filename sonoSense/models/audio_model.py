@@ -1,97 +1,507 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
 import mysql.connector  # type: ignore
+from mysql.connector import pooling  # type: ignore
+from mysql.connector.errors import PoolError  # type: ignore
+from models.blob_store import LocalBlobStore
 
 class AudioModel:
-    def __init__(self, host, port, user, password, database):
+    def __init__(self, host, port, user, password, database, pool_size=5, pool_timeout=10, blob_store=None):
         self.host = host
         self.port = port
         self.user = user
         self.password = password
         self.database = database
-        self.connection = None
-        self.cursor = None
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        # Os bytes dos áudios ficam no blob store; a tabela guarda apenas hash, tamanho e formato
+        self.blob_store = blob_store if blob_store is not None else LocalBlobStore()
+        self.pool = None
+        self._connections = []
+        self._pool_lock = threading.Lock()
 
     def connect(self):
-        """Estabelece a conexão com o banco de dados MySQL."""
-        if not self.connection or not self.connection.is_connected():
-            self.connection = mysql.connector.connect(
-                host=self.host,
-                port=self.port,
-                user=self.user,
-                password=self.password,
-                database=self.database
-            )
-            if self.connection.is_connected():
-                self.cursor = self.connection.cursor()
-                print("Conexão com o MySQL estabelecida com sucesso!")
-
+        """
+        Cria o pool de conexões com o banco de dados MySQL. As conexões são abertas aqui e entregues ao pool
+        com `add_connection`, para que `close_connection` possa encerrá-las. Se a criação das tabelas falhar,
+        o pool é descartado e a próxima chamada tenta de novo.
+        """
+        with self._pool_lock:
+            if self.pool is not None:
+                return
+            config = dict(host=self.host, port=self.port, user=self.user, password=self.password,
+                          database=self.database)
+            pool = pooling.MySQLConnectionPool(pool_name=f"audios_{id(self)}", pool_size=self.pool_size,
+                                               pool_reset_session=True)
+            pool.set_config(**config)  # Usada pelo pool para reconectar conexões que caíram
+            connections = []
+            try:
+                for _ in range(self.pool_size):
+                    connections.append(mysql.connector.connect(**config))
+                    pool.add_connection(connections[-1])
+            except Exception:
+                for connection in connections:
+                    connection.close()
+                raise
+            self.pool = pool
+            self._connections = connections
+            try:
                 self.create_table()
+            except Exception:
+                self.close_connection()
+                raise
+            print("Pool de conexões com o MySQL criado com sucesso!")
+
+    def _checkout(self):
+        """
+        Retira uma conexão do pool, aguardando até `pool_timeout` segundos se todas estiverem em uso.
+        O pool reconecta automaticamente conexões que caíram.
+        """
+        if self.pool is None:
+            self.connect()
+        deadline = time.monotonic() + self.pool_timeout
+        while True:
+            try:
+                return self.pool.get_connection()
+            except PoolError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.01)
+
+    @contextmanager
+    def _cursor(self, commit=False):
+        """
+        Fornece um cursor de uma conexão exclusiva do pool durante o bloco `with`. Com `commit=True`, a
+        transação é confirmada ao fim do bloco ou desfeita em caso de erro. A conexão sempre volta ao pool.
+        """
+        connection = self._checkout()
+        cursor = connection.cursor()
+        try:
+            yield cursor
+            if commit:
+                connection.commit()
+        except Exception:
+            if commit:
+                connection.rollback()
+            raise
+        finally:
+            cursor.close()
+            connection.close()  # Devolve a conexão ao pool
 
     def create_table(self):
-        """Cria a tabela de áudios caso não exista."""
+        """Cria a tabela de áudios caso não exista e atualiza tabelas criadas por versões anteriores."""
         create_table_query = '''
         CREATE TABLE IF NOT EXISTS audios (
             id INT AUTO_INCREMENT PRIMARY KEY,
             name VARCHAR(255) NOT NULL,
-            audio_data LONGBLOB NOT NULL,
+            audio_hash CHAR(64) NOT NULL,
+            audio_size BIGINT NOT NULL,
+            audio_format VARCHAR(16) NOT NULL,
             resultado TEXT NOT NULL,
-            percent_ronco DECIMAL(5, 2) NOT NULL
+            percent_ronco DECIMAL(5, 2) NOT NULL,
+            INDEX idx_audios_hash (audio_hash),
+            INDEX idx_audios_percent (percent_ronco, id),
+            INDEX idx_audios_name (name, id)
         );
         '''
-        self.cursor.execute(create_table_query)
-        self.connection.commit()
+        with self._cursor(commit=True) as cursor:
+            cursor.execute(create_table_query)
+            cursor.execute(
+                "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'audios'"
+            )
+            columns = {row[0] for row in cursor.fetchall()}
+
+            # Tabelas antigas guardam o áudio em audio_data (LONGBLOB): adiciona as colunas do blob store
+            # e torna audio_data opcional até a migração com `migrate_blobs`
+            if 'audio_hash' not in columns:
+                cursor.execute("""
+                ALTER TABLE audios
+                    ADD COLUMN audio_hash CHAR(64) NULL AFTER name,
+                    ADD COLUMN audio_size BIGINT NULL AFTER audio_hash,
+                    ADD COLUMN audio_format VARCHAR(16) NULL AFTER audio_size,
+                    MODIFY audio_data LONGBLOB NULL,
+                    ADD INDEX idx_audios_hash (audio_hash)
+                """)
+
+            # Índices usados pela listagem paginada (`iter_audios`)
+            cursor.execute(
+                "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'audios'"
+            )
+            indexes = {row[0] for row in cursor.fetchall()}
+            if 'idx_audios_percent' not in indexes:
+                cursor.execute("CREATE INDEX idx_audios_percent ON audios (percent_ronco, id)")
+            if 'idx_audios_name' not in indexes:
+                cursor.execute("CREATE INDEX idx_audios_name ON audios (name, id)")
+
+            # Nível persistente do cache de resultados (ver `ResultCache`)
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS resultados_cache (
+                cache_key CHAR(64) PRIMARY KEY,
+                resultado TEXT NOT NULL,
+                percent_ronco DOUBLE NOT NULL,
+                skipped_fraction DOUBLE NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            ''')
+            cursor.execute(
+                "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'resultados_cache'"
+            )
+            if 'skipped_fraction' not in {row[0] for row in cursor.fetchall()}:
+                cursor.execute("ALTER TABLE resultados_cache ADD COLUMN skipped_fraction DOUBLE NULL")
+
+            # Linha do tempo de cada avaliação: probabilidade de ronco por segmento, quantizada em um byte
+            # (uint8), e episódios de ronco codificados em run-length (ver `SnoreTimeline`)
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS audio_timelines (
+                audio_id INT PRIMARY KEY,
+                segment_duration DOUBLE NOT NULL,
+                num_segments INT NOT NULL,
+                probabilities LONGBLOB NOT NULL,
+                model_version VARCHAR(255) NULL
+            );
+            ''')
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS snore_episodes (
+                audio_id INT NOT NULL,
+                start_segment INT NOT NULL,
+                end_segment INT NOT NULL,
+                mean_probability FLOAT NOT NULL,
+                PRIMARY KEY (audio_id, start_segment)
+            );
+            ''')
 
-    def insert_audio(self, audio_id, audio_name, audio_data, resultado, percent_ronco):
-        """Insere ou atualiza o áudio no banco de dados, aceitando dados binários, o resultado da avaliação e o percent_ronco."""
+    def _store_blob(self, audio_name, audio_data):
+        """Grava os bytes no blob store e retorna (hash, tamanho, formato) para a tabela."""
+        audio_data = audio_data or b''
+        audio_hash = self.blob_store.put(audio_data)
+        audio_format = os.path.splitext(audio_name or '')[1].lstrip('.').lower()[:16]
+        return audio_hash, len(audio_data), audio_format
+
+    def insert_audio(self, audio_id, audio_name, audio_data, resultado, percent_ronco, timeline=None,
+                     model_version=None):
+        """
+        Insere ou atualiza o áudio no banco de dados, aceitando dados binários, o resultado da avaliação e o percent_ronco.
+        Se `timeline` (SnoreTimeline) for informada, a linha do tempo da avaliação é gravada na mesma transação.
+        Retorna o id do áudio, ou None em caso de erro.
+        """
         try:
             percent_ronco = float(percent_ronco)
+            audio_hash, audio_size, audio_format = self._store_blob(audio_name, audio_data)
 
             if audio_id is None:
                 insert_query = """
-                INSERT INTO audios (name, audio_data, resultado, percent_ronco)
-                VALUES (%s, %s, %s, %s)
+                INSERT INTO audios (name, audio_hash, audio_size, audio_format, resultado, percent_ronco)
+                VALUES (%s, %s, %s, %s, %s, %s)
                 """
-                self.cursor.execute(insert_query, (audio_name, audio_data, resultado, percent_ronco))
-                self.connection.commit()
+                with self._cursor(commit=True) as cursor:
+                    cursor.execute(insert_query, (audio_name, audio_hash, audio_size, audio_format,
+                                                  resultado, percent_ronco))
+                    audio_id = cursor.lastrowid
+                    if timeline is not None:
+                        self._save_timeline(cursor, audio_id, timeline, model_version)
                 print(f"Áudio {audio_name} inserido com sucesso!")
             else:
                 update_query = """
                 UPDATE audios
-                SET name = %s, audio_data = %s, resultado = %s, percent_ronco = %s
+                SET name = %s, audio_hash = %s, audio_size = %s, audio_format = %s, resultado = %s, percent_ronco = %s
                 WHERE id = %s
                 """
-                self.cursor.execute(update_query, (audio_name, audio_data, resultado, percent_ronco, audio_id))
-                self.connection.commit()
+                with self._cursor(commit=True) as cursor:
+                    cursor.execute(update_query, (audio_name, audio_hash, audio_size, audio_format,
+                                                  resultado, percent_ronco, audio_id))
+                    if timeline is not None:
+                        self._save_timeline(cursor, audio_id, timeline, model_version)
                 print(f"Áudio {audio_name} atualizado com sucesso!")
+            return audio_id
 
         except Exception as e:
             print(f"Erro ao inserir/atualizar o áudio: {e}")
+            return None
+
+    def _save_timeline(self, cursor, audio_id, timeline, model_version=None):
+        """Grava (ou substitui) a linha do tempo e os episódios de ronco de um áudio, no cursor informado."""
+        cursor.execute(
+            "REPLACE INTO audio_timelines (audio_id, segment_duration, num_segments, probabilities, model_version) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            (audio_id, float(timeline.segment_duration), len(timeline), timeline.quantized(), model_version)
+        )
+        cursor.execute("DELETE FROM snore_episodes WHERE audio_id = %s", (audio_id,))
+        episodes = timeline.episodes()
+        if episodes:
+            cursor.executemany(
+                "INSERT INTO snore_episodes (audio_id, start_segment, end_segment, mean_probability) "
+                "VALUES (%s, %s, %s, %s)",
+                [(audio_id, start, end, mean) for start, end, mean in episodes]
+            )
+
+    def copy_timeline(self, audio_id, audio_hash, model_version):
+        """
+        Copia para `audio_id` a linha do tempo de outro áudio com o mesmo conteúdo (`audio_hash`) avaliado
+        pela mesma versão do modelo, por exemplo quando o resultado veio do cache. Retorna True se copiou.
+        """
+        with self._cursor(commit=True) as cursor:
+            cursor.execute(
+                "SELECT t.audio_id FROM audio_timelines t JOIN audios a ON a.id = t.audio_id "
+                "WHERE a.audio_hash = %s AND t.model_version = %s AND t.audio_id <> %s "
+                "ORDER BY t.audio_id DESC LIMIT 1",
+                (audio_hash, model_version, audio_id)
+            )
+            row = cursor.fetchone()
+            if not row:
+                return False
+            cursor.execute(
+                "REPLACE INTO audio_timelines (audio_id, segment_duration, num_segments, probabilities, model_version) "
+                "SELECT %s, segment_duration, num_segments, probabilities, model_version "
+                "FROM audio_timelines WHERE audio_id = %s",
+                (audio_id, row[0])
+            )
+            cursor.execute("DELETE FROM snore_episodes WHERE audio_id = %s", (audio_id,))
+            cursor.execute(
+                "INSERT INTO snore_episodes (audio_id, start_segment, end_segment, mean_probability) "
+                "SELECT %s, start_segment, end_segment, mean_probability FROM snore_episodes WHERE audio_id = %s",
+                (audio_id, row[0])
+            )
+        return True
+
+    def get_timeline_info(self, audio_id):
+        """Retorna (segment_duration, num_segments) da linha do tempo do áudio, ou None se não existir."""
+        with self._cursor() as cursor:
+            cursor.execute("SELECT segment_duration, num_segments FROM audio_timelines WHERE audio_id = %s",
+                           (audio_id,))
+            return cursor.fetchone()
+
+    def get_timeline_probabilities(self, audio_id, start_segment, end_segment):
+        """
+        Lê apenas os bytes das probabilidades dos segmentos [start_segment, end_segment) da linha do tempo,
+        sem transferir o array inteiro. Retorna os bytes quantizados (ver `dequantize_probabilities`).
+        """
+        with self._cursor() as cursor:
+            cursor.execute(
+                "SELECT SUBSTRING(probabilities, %s, %s) FROM audio_timelines WHERE audio_id = %s",
+                (int(start_segment) + 1, max(int(end_segment) - int(start_segment), 0), audio_id)
+            )
+            row = cursor.fetchone()
+        return bytes(row[0]) if row and row[0] is not None else b''
+
+    def get_episodes(self, audio_id, start_segment, end_segment):
+        """
+        Retorna os episódios de ronco do áudio que se sobrepõem aos segmentos [start_segment, end_segment),
+        como tuplas (segmento_inicial, segmento_final, probabilidade_media).
+        """
+        with self._cursor() as cursor:
+            cursor.execute(
+                "SELECT start_segment, end_segment, mean_probability FROM snore_episodes "
+                "WHERE audio_id = %s AND start_segment < %s AND end_segment > %s ORDER BY start_segment",
+                (audio_id, int(end_segment), int(start_segment))
+            )
+            return cursor.fetchall()
+
+    def insert_audios(self, audios, batch_size=500):
+        """
+        Insere vários áudios de uma vez, em uma única transação, usando `executemany` em lotes de
+        `batch_size` linhas. Cada item de `audios` é uma tupla (name, audio_data, resultado, percent_ronco).
+        Se alguma inserção falhar, nenhuma linha é gravada. Retorna o número de linhas inseridas.
+        """
+        rows = [(name, *self._store_blob(name, data), resultado, float(percent_ronco))
+                for name, data, resultado, percent_ronco in audios]
+        return self._insert_rows(rows, batch_size)
+
+    def insert_audio_files(self, audios, batch_size=500):
+        """
+        Como `insert_audios`, mas cada item é uma tupla (name, audio_path, resultado, percent_ronco): os
+        arquivos são copiados para o blob store um de cada vez, sem carregar os bytes na memória, e apenas
+        os metadados vão para o banco.
+        """
+        rows = []
+        for name, audio_path, resultado, percent_ronco in audios:
+            audio_format = os.path.splitext(name or '')[1].lstrip('.').lower()[:16]
+            rows.append((name, self.blob_store.put_file(audio_path), os.path.getsize(audio_path), audio_format,
+                         resultado, float(percent_ronco)))
+        return self._insert_rows(rows, batch_size)
+
+    def _insert_rows(self, rows, batch_size):
+        insert_query = """
+        INSERT INTO audios (name, audio_hash, audio_size, audio_format, resultado, percent_ronco)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        """
+        with self._cursor(commit=True) as cursor:
+            for first in range(0, len(rows), batch_size):
+                cursor.executemany(insert_query, rows[first:first + batch_size])
+        print(f"{len(rows)} áudios inseridos com sucesso!")
+        return len(rows)
+
+    def migrate_blobs(self, batch_size=100):
+        """
+        Move os áudios ainda guardados na coluna audio_data para o blob store. Os ids das linhas a migrar são
+        lidos em páginas de `batch_size`, e cada áudio é lido e migrado individualmente (uma transação por
+        linha), para que apenas um LONGBLOB fique na memória por vez. Cada linha migrada recebe hash, tamanho
+        e formato e tem audio_data esvaziado. Pode ser interrompida e executada novamente. Retorna o número de
+        linhas migradas. Tabelas criadas já com o blob store não têm a coluna audio_data: nesse caso, não há o
+        que migrar.
+        """
+        with self._cursor() as cursor:
+            cursor.execute(
+                "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'audios' AND COLUMN_NAME = 'audio_data'"
+            )
+            if not cursor.fetchall():
+                print("A tabela audios não tem a coluna audio_data: nenhum áudio a migrar.")
+                return 0
+
+        migrated = 0
+        last_id = 0
+        while True:
+            with self._cursor() as cursor:
+                cursor.execute(
+                    "SELECT id FROM audios WHERE audio_hash IS NULL AND id > %s ORDER BY id LIMIT %s",
+                    (last_id, batch_size)
+                )
+                ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                break
+
+            for audio_id in ids:
+                with self._cursor(commit=True) as cursor:
+                    cursor.execute("SELECT name, audio_data FROM audios WHERE id = %s AND audio_hash IS NULL",
+                                   (audio_id,))
+                    row = cursor.fetchone()
+                    if row is None:
+                        continue  # Migrada por outra execução desde a leitura dos ids
+                    audio_hash, audio_size, audio_format = self._store_blob(*row)
+                    cursor.execute(
+                        "UPDATE audios SET audio_hash = %s, audio_size = %s, audio_format = %s, audio_data = NULL "
+                        "WHERE id = %s",
+                        (audio_hash, audio_size, audio_format, audio_id)
+                    )
+                migrated += 1
+            last_id = ids[-1]
+            print(f"{migrated} áudios migrados para o blob store...")
+        return migrated
+
+    def get_cached_result(self, cache_key):
+        """Recupera um resultado de avaliação do cache persistente, ou None se não existir."""
+        with self._cursor() as cursor:
+            cursor.execute("SELECT resultado, percent_ronco, skipped_fraction FROM resultados_cache "
+                           "WHERE cache_key = %s", (cache_key,))
+            result = cursor.fetchone()
+        if result:
+            cached = {"message": result[0], "percent_ronco": float(result[1])}
+            if result[2] is not None:
+                cached["skipped_fraction"] = float(result[2])
+            return cached
+        return None
+
+    def save_cached_result(self, cache_key, resultado, percent_ronco, skipped_fraction=None):
+        """Grava (ou substitui) um resultado de avaliação no cache persistente."""
+        with self._cursor(commit=True) as cursor:
+            cursor.execute(
+                "REPLACE INTO resultados_cache (cache_key, resultado, percent_ronco, skipped_fraction) "
+                "VALUES (%s, %s, %s, %s)",
+                (cache_key, resultado, float(percent_ronco),
+                 float(skipped_fraction) if skipped_fraction is not None else None)
+            )
 
     def get_audio(self, audio_id):
-        """Recupera um áudio pelo ID."""
-        select_query = "SELECT name, audio_data, resultado, percent_ronco FROM audios WHERE id = %s"
-        self.cursor.execute(select_query, (audio_id,))
-        result = self.cursor.fetchone()
+        """Recupera um áudio pelo ID, com os bytes lidos do blob store."""
+        select_query = "SELECT name, audio_hash, resultado, percent_ronco FROM audios WHERE id = %s"
+        with self._cursor() as cursor:
+            cursor.execute(select_query, (audio_id,))
+            result = cursor.fetchone()
         if result:
-            return result
+            name, audio_hash, resultado, percent_ronco = result
+            return name, self.blob_store.get(audio_hash) if audio_hash else None, resultado, percent_ronco
         return None
 
     def get_latest_audio(self):
             """Recupera o áudio mais recente do banco de dados."""
             select_query = "SELECT id, name, resultado, percent_ronco FROM audios ORDER BY id DESC LIMIT 1"
-            self.cursor.execute(select_query)
-            result = self.cursor.fetchone()
+            with self._cursor() as cursor:
+                cursor.execute(select_query)
+                result = cursor.fetchone()
             return result
-    
+
     def close_connection(self):
-        """Fecha a conexão com o banco de dados."""
-        if self.connection.is_connected():
-            self.cursor.close()
-            self.connection.close()
-            print("Conexão com o MySQL encerrada.")
+        """Fecha as conexões do pool com o banco de dados."""
+        if self.pool is not None:
+            self.pool = None
+            connections, self._connections = self._connections, []
+            for connection in connections:
+                try:
+                    connection.close()
+                except Exception as e:
+                    print(f"Erro ao encerrar conexão com o MySQL: {e}")
+            print("Conexões com o MySQL encerradas.")
+
+    def discard_pool(self):
+        """
+        Descarta o pool sem fechar as conexões. Usado em processos filhos criados por fork, que herdam os
+        sockets do processo pai e não podem reutilizá-los nem encerrá-los; o próximo acesso cria um pool novo.
+        """
+        self.pool = None
+        self._connections = []
+        self._pool_lock = threading.Lock()
+
+    def ping(self):
+        """Verifica se o banco de dados responde. Lança uma exceção se não responder."""
+        with self._cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+        return True
 
     def get_all_audios(self):
         """Recupera todos os áudios do banco de dados."""
-        select_query = "SELECT id, name, resultado, percent_ronco FROM audios"
-        self.cursor.execute(select_query)
-        result = self.cursor.fetchall()
-        return result
+        return list(self.iter_audios())
+
+    def iter_audios(self, after_id=0, limit=None, min_percent=None, max_percent=None, name=None, chunk_size=500):
+        """
+        Percorre os áudios em ordem de id com paginação por chave (keyset): retorna apenas linhas com
+        id maior que `after_id`, até `limit` linhas. Filtros opcionais: faixa de percent_ronco
+        [`min_percent`, `max_percent`] e prefixo do nome (`name`).
+
+        As linhas são lidas de um cursor não bufferizado em blocos de `chunk_size`, então o uso de memória
+        não depende do tamanho da tabela. A conexão fica reservada até o gerador terminar ou ser fechado.
+
+        Retorna:
+            generator: Tuplas (id, name, resultado, percent_ronco).
+        """
+        conditions = ["id > %s"]
+        params = [after_id or 0]
+        if min_percent is not None:
+            conditions.append("percent_ronco >= %s")
+            params.append(min_percent)
+        if max_percent is not None:
+            conditions.append("percent_ronco <= %s")
+            params.append(max_percent)
+        if name:
+            escaped = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            conditions.append("name LIKE %s")
+            params.append(escaped + "%")
+
+        select_query = f"SELECT id, name, resultado, percent_ronco FROM audios WHERE {' AND '.join(conditions)} ORDER BY id"
+        if limit is not None:
+            select_query += " LIMIT %s"
+            params.append(int(limit))
+
+        connection = self._checkout()
+        cursor = connection.cursor(buffered=False)
+        try:
+            cursor.execute(select_query, tuple(params))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            # Descarta linhas não lidas antes de devolver a conexão ao pool
+            try:
+                if connection.unread_result:
+                    connection.consume_results()
+            except Exception:
+                pass
+            cursor.close()
+            connection.close()
@@ -0,0 +1,105 @@
+# /models/blob_store.py
+import os
+import abc
+import uuid
+import shutil
+import hashlib
+
+
+class BlobStore(abc.ABC):
+    """
+    Interface de armazenamento de áudios endereçado por conteúdo: cada blob é identificado pelo hash
+    SHA-256 dos seus bytes. Implementações (diretório local, object store, etc.) devem fornecer
+    `put`, `get`, `exists` e `delete`.
+    """
+
+    @staticmethod
+    def hash_bytes(data):
+        """Calcula o hash SHA-256 (hexadecimal) usado como chave do blob."""
+        return hashlib.sha256(data).hexdigest()
+
+    @abc.abstractmethod
+    def put(self, data):
+        """Armazena os bytes e retorna o seu hash. Gravar um conteúdo já existente não o duplica."""
+        raise NotImplementedError
+
+    def put_file(self, file_path):
+        """
+        Armazena o conteúdo de um arquivo e retorna o seu hash. Implementações podem sobrescrever para
+        copiar o arquivo em blocos, sem carregá-lo inteiro na memória.
+        """
+        with open(file_path, 'rb') as f:
+            return self.put(f.read())
+
+    @abc.abstractmethod
+    def get(self, blob_hash):
+        """Retorna os bytes do blob, ou None se não existir."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def exists(self, blob_hash):
+        """Indica se o blob existe."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def delete(self, blob_hash):
+        """Remove o blob, se existir."""
+        raise NotImplementedError
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root_dir='audio_blobs'):
+        """
+        Armazena os blobs em um diretório local, particionado pelos primeiros caracteres do hash
+        (ex.: audio_blobs/ab/cd/abcd...) para não concentrar muitos arquivos em um único diretório.
+
+        Parâmetros:
+            root_dir (str, opcional): Diretório raiz dos blobs. Valor padrão é 'audio_blobs'.
+        """
+        self.root_dir = root_dir
+        os.makedirs(root_dir, exist_ok=True)
+
+    def _path(self, blob_hash):
+        return os.path.join(self.root_dir, blob_hash[:2], blob_hash[2:4], blob_hash)
+
+    def put(self, data):
+        blob_hash = self.hash_bytes(data)
+        path = self._path(blob_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Escrita atômica: o blob só aparece no caminho final quando estiver completo
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return blob_hash
+
+    def put_file(self, file_path, chunk_size=1 << 20):
+        # Calcula o hash em blocos e só copia o arquivo se o blob ainda não existir
+        sha = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                sha.update(chunk)
+        blob_hash = sha.hexdigest()
+        path = self._path(blob_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            shutil.copyfile(file_path, tmp_path)
+            os.replace(tmp_path, path)
+        return blob_hash
+
+    def get(self, blob_hash):
+        path = self._path(blob_hash)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def exists(self, blob_hash):
+        return os.path.exists(self._path(blob_hash))
+
+    def delete(self, blob_hash):
+        path = self._path(blob_hash)
+        if os.path.exists(path):
+            os.remove(path)
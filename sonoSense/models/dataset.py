@@ -1,9 +1,13 @@
 # /models/dataset.py
 import os
 import sys
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np # type: ignore
 import kagglehub # type: ignore
 from models.features import extract_features
+from models.feature_pipeline import get_pipeline
+from models.feature_cache import FeatureCache
 
 
 def download_dataset():
@@ -25,7 +29,40 @@ def download_dataset():
     return path
 
 
-def load_dataset(path):
+def list_dataset_files(path):
+    """
+    Lista os arquivos de áudio do dataset de ronco com os respectivos rótulos.
+
+    Parâmetros:
+        path (str): Caminho para o diretório onde o dataset foi baixado (obtido através de `download_dataset()`).
+
+    Retorna:
+        list: Lista de tuplas (caminho_do_arquivo, rótulo), primeiro os áudios de ronco (rótulo 1) e depois
+              os de não ronco (rótulo 0).
+    """
+    return list_labelled_files(os.path.join(path, "Snoring Dataset"))
+
+
+def list_labelled_files(folder):
+    """
+    Lista os arquivos de áudio de um diretório com uma subpasta por rótulo, no mesmo formato do dataset de
+    ronco: "1" para ronco e "0" para não ronco. Uma subpasta ausente é tratada como vazia, o que permite
+    acrescentar clipes novos de apenas uma das classes.
+
+    Retorna:
+        list: Lista de tuplas (caminho_do_arquivo, rótulo), primeiro os de ronco e depois os de não ronco.
+    """
+    files = []
+    for label, subfolder in ((1, "1"), (0, "0")):
+        folder_path = os.path.join(folder, subfolder)
+        if not os.path.isdir(folder_path):
+            continue
+        for filename in os.listdir(folder_path):
+            files.append((os.path.join(folder_path, filename), label))
+    return files
+
+
+def load_dataset(path, workers=1, cache_dir=None, n_mfcc=40, fixed_frames=44):
     """
     Carrega os dados do dataset de ronco a partir dos diretórios especificados e extrai as features dos áudios.
 
@@ -36,43 +73,63 @@ def load_dataset(path):
             "0": Contém os áudios de não ronco (rótulo 0).
 
     A função executa os seguintes passos:
-        1. Define o caminho base para os dados combinando o caminho fornecido com a pasta "Snoring Dataset".
-        2. Cria caminhos para as duas categorias de áudio, utilizando as subpastas "1" e "0".
-        3. Para cada arquivo de áudio em cada subpasta:
-            - Extrai os coeficientes MFCC utilizando a função `extract_features`.
-            - Se a extração for bem-sucedida, armazena as features em uma lista e atribui o rótulo correspondente (1 para ronco, 0 para não ronco).
-        4. Converte as listas de features e rótulos para arrays do NumPy, garantindo que os dados estejam em formato homogêneo.
+        1. Lista os arquivos das subpastas "1" e "0" com `list_dataset_files`.
+        2. Se `cache_dir` for informado, reaproveita as features já extraídas de arquivos que não mudaram
+           (ver `FeatureCache`).
+        3. Extrai os coeficientes MFCC dos arquivos restantes com `extract_features`, em série ou, se
+           `workers` for maior que 1, em um pool de processos, e grava o resultado no cache.
+        4. Descarta os arquivos cuja extração falhou e converte as features e rótulos para arrays do NumPy.
 
     Parâmetros:
         path (str): Caminho para o diretório onde o dataset foi baixado (obtido através de `download_dataset()`).
+        workers (int, opcional): Número de processos usados na extração. Valor padrão é 1 (extração em série).
+        cache_dir (str, opcional): Diretório do cache persistente de features. Se None, o cache não é usado.
+        n_mfcc (int, opcional): Número de coeficientes MFCC a serem extraídos. Valor padrão é 40.
+        fixed_frames (int, opcional): Número fixo de frames da dimensão temporal dos MFCCs. Valor padrão é 44.
 
     Retorna:
         tuple: Uma tupla contendo dois arrays do NumPy:
                 - features: Um array contendo as features extraídas dos áudios.
                 - labels: Um array contendo os rótulos correspondentes (1 para ronco, 0 para não ronco).
     """
-    base_folder = os.path.join(path, "Snoring Dataset")
-    folder_snore = os.path.join(base_folder, "1")
-    folder_non_snore = os.path.join(base_folder, "0")
-    
+    return load_files(list_dataset_files(path), workers, cache_dir, n_mfcc, fixed_frames)
+
+
+def load_files(files, workers=1, cache_dir=None, n_mfcc=40, fixed_frames=44):
+    """
+    Extrai as features de uma lista de tuplas (caminho_do_arquivo, rótulo), como a de `list_labelled_files`,
+    com o mesmo cache e o mesmo pool de processos de `load_dataset`.
+
+    Retorna:
+        tuple: (features, labels), sem os arquivos cuja extração falhou.
+    """
+    feature_pipeline = get_pipeline(n_mfcc, fixed_frames).describe()
+    cache = FeatureCache(cache_dir, n_mfcc, fixed_frames, feature_pipeline) if cache_dir else None
+
+    results = [cache.get(file_path) if cache else None for file_path, _ in files]
+    pending = [i for i, data in enumerate(results) if data is None]
+    if cache:
+        print(f"Features em cache: {len(files) - len(pending)} de {len(files)} arquivos.")
+
+    # Extrai apenas os arquivos novos ou alterados
+    extract = partial(extract_features, n_mfcc=n_mfcc, fixed_frames=fixed_frames)
+    pending_paths = [files[i][0] for i in pending]
+    if workers > 1 and len(pending_paths) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            extracted = list(executor.map(extract, pending_paths, chunksize=16))
+    else:
+        extracted = [extract(file_path) for file_path in pending_paths]
+
+    for i, data in zip(pending, extracted):
+        results[i] = data
+        if cache and data is not None:
+            cache.put(files[i][0], data)
+
     features = []
     labels = []
-    
-    # Processa os áudios de ronco (rótulo 1)
-    for filename in os.listdir(folder_snore):
-        file_path = os.path.join(folder_snore, filename)
-        data = extract_features(file_path)
+    for (_, label), data in zip(files, results):
         if data is not None:
             features.append(data)
-            labels.append(1)
-    
-    # Processa os áudios de não ronco (rótulo 0)
-    for filename in os.listdir(folder_non_snore):
-        file_path = os.path.join(folder_non_snore, filename)
-        data = extract_features(file_path)
-        if data is not None:
-            features.append(data)
-            labels.append(0)
+            labels.append(label)
     
     return np.array(features), np.array(labels)
-
@@ -0,0 +1,150 @@
+# /models/energy_gate.py
+import numpy as np  # type: ignore
+from models.features import segment_bounds
+
+
+class EnergyGate:
+    def __init__(self, rms_threshold_db=-50.0, flux_threshold_db=None, frame_length=1024, n_bands=32,
+                 chunk_frames=4096):
+        """
+        Primeiro estágio, barato, da avaliação: descarta os segmentos claramente silenciosos antes dos MFCCs
+        e da CNN. Um segmento só é enviado ao modelo (candidato) se a sua energia e a sua variação espectral
+        passarem dos limiares; os demais são contados como "sem ronco".
+
+        As medidas são calculadas de forma vetorizada, em frames sem sobreposição de `frame_length` amostras
+        dentro de cada segmento (ver `stats_at`):
+            - RMS de cada frame, em dBFS; o segmento usa o maior valor dos seus frames.
+            - Fluxo espectral de cada frame: média, entre `n_bands` bandas de frequência, do aumento positivo
+              de energia (em dB) em relação ao frame anterior; o segmento usa o maior valor dos seus frames.
+              Ruído de fundo estacionário tem fluxo baixo; o início de um ronco produz um fluxo alto.
+
+        Parâmetros:
+            rms_threshold_db (float, opcional): RMS mínimo, em dBFS, de um segmento candidato. Valor padrão é -50.
+            flux_threshold_db (float, opcional): Fluxo espectral mínimo, em dB, de um segmento candidato. Se None
+                                                 (padrão), o fluxo não é calculado e apenas o RMS é usado.
+                                                 Ruído branco fica em torno de 1-1.5 dB com os valores padrão;
+                                                 use `validar_gate.py` para escolher o limiar com dados reais.
+            frame_length (int, opcional): Tamanho, em amostras, dos frames de análise. Valor padrão é 1024.
+            n_bands (int, opcional): Quantidade de bandas usadas no fluxo espectral. Valor padrão é 32.
+            chunk_frames (int, opcional): Frames processados por vez na FFT, para limitar o uso de memória.
+        """
+        self.rms_threshold_db = rms_threshold_db
+        self.flux_threshold_db = flux_threshold_db
+        self.frame_length = frame_length
+        self.n_bands = n_bands
+        self.chunk_frames = chunk_frames
+
+    def describe(self):
+        """Descrição dos limiares, usada para diferenciar resultados com e sem o gate (ex.: no cache)."""
+        return f"gate:rms={self.rms_threshold_db},flux={self.flux_threshold_db},frame={self.frame_length}"
+
+    def segment_stats(self, audio, sample_rate, segment_duration=1.0, with_flux=True):
+        """
+        Calcula o RMS (dBFS) e o fluxo espectral (dB) de cada segmento da gravação, com os mesmos limites
+        de segmento de `extract_segment_features`.
+
+        Retorna:
+            tuple: Dois arrays (rms_db, flux_db) com um valor por segmento. `flux_db` é None se
+                   `with_flux=False`.
+        """
+        starts, ends = segment_bounds(len(audio), sample_rate, segment_duration)
+        rms_db, flux_db, _ = self.stats_at(audio, starts, ends, with_flux)
+        return rms_db, flux_db
+
+    def stats_at(self, audio, starts, ends, with_flux=True, previous=None):
+        """
+        Calcula as medidas dos segmentos consecutivos [starts, ends) de `audio`. Cada segmento é dividido em
+        frames próprios, a partir do seu início, de modo que as medidas de um segmento dependem apenas das
+        suas amostras (e, no fluxo, do último frame do segmento anterior): o sinal pode ser processado por
+        partes, como em `IncrementalSegmentFeatures`, com o mesmo resultado do sinal inteiro.
+
+        O último frame de um segmento, incompleto, é completado com as amostras anteriores do segmento, e
+        não com zeros, para não subestimar a energia do fim do segmento. Um segmento mais curto que um frame
+        (ex.: o último da gravação) forma um único frame, com o RMS calculado apenas sobre as suas amostras.
+        O tamanho dos frames é sempre `frame_length`, para que as medidas correspondam aos limiares
+        calibrados (ver `validar_gate.py`).
+
+        Parâmetros:
+            audio (numpy.ndarray): Sinal que contém os segmentos.
+            starts, ends (numpy.ndarray): Limites dos segmentos em `audio`, consecutivos e em ordem.
+            with_flux (bool, opcional): Se False, o fluxo espectral não é calculado.
+            previous (numpy.ndarray, opcional): Energia por banda do frame anterior ao primeiro segmento,
+                                                retornada pela chamada anterior.
+
+        Retorna:
+            tuple: (rms_db, flux_db, previous), com `previous` a ser passado na próxima chamada.
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        rms_db = np.full(len(starts), -np.inf)
+        flux_db = np.full(len(starts), -np.inf) if with_flux else None
+        if len(starts) == 0:
+            return rms_db, flux_db, previous
+
+        frame_length = self.frame_length
+        lengths = ends - starts
+        per_segment = np.maximum(1, -(-lengths // frame_length))
+        first_frame = np.cumsum(per_segment) - per_segment
+        frame_segment = np.repeat(np.arange(len(starts)), per_segment)
+        position = np.arange(len(frame_segment)) - first_frame[frame_segment]
+        frame_starts = starts[frame_segment] + position * frame_length
+        last = position == per_segment[frame_segment] - 1
+        frame_starts[last] = np.maximum(starts, ends - frame_length)[frame_segment[last]]
+        frame_valid = np.minimum(frame_length, lengths[frame_segment])
+
+        frame_rms_db = np.empty(len(frame_segment))
+        frame_flux = np.empty(len(frame_segment)) if with_flux else None
+        offsets = np.arange(frame_length)
+        for first in range(0, len(frame_segment), self.chunk_frames):
+            chunk = slice(first, first + self.chunk_frames)
+            idx = frame_starts[chunk, None] + offsets[None, :]
+            valid = offsets[None, :] < frame_valid[chunk, None]
+            frames = np.where(valid, audio[np.minimum(idx, len(audio) - 1)], 0).astype(np.float32)
+
+            energy = np.sum(np.square(frames, dtype=np.float64), axis=1) / frame_valid[chunk]
+            frame_rms_db[chunk] = 20 * np.log10(np.maximum(np.sqrt(energy), 1e-10))
+            if with_flux:
+                frame_flux[chunk], previous = self._spectral_flux(frames, previous)
+
+        # Cada segmento usa o maior valor dos seus frames
+        rms_db = np.maximum.reduceat(frame_rms_db, first_frame)
+        if with_flux:
+            flux_db = np.maximum.reduceat(frame_flux, first_frame)
+        return rms_db, flux_db, previous
+
+    def _spectral_flux(self, frames, previous=None):
+        window = np.hanning(frames.shape[1]).astype(np.float32)
+        n_bins = frames.shape[1] // 2 + 1
+        n_bands = max(1, min(self.n_bands, n_bins - 1))
+        # Bins agrupados em bandas (sem o componente DC), reduzindo a variância do ruído em cada bin
+        band_edges = np.linspace(1, n_bins, n_bands + 1).astype(np.int64)
+
+        power = np.abs(np.fft.rfft(frames * window, axis=1)) ** 2
+        band_db = 10 * np.log10(np.add.reduceat(power[:, :n_bins], band_edges[:-1], axis=1) + 1e-10)
+        band_db_prev = np.vstack([previous if previous is not None else band_db[:1], band_db[:-1]])
+        return np.maximum(band_db - band_db_prev, 0).mean(axis=1), band_db[-1:]
+
+    def candidates(self, audio, sample_rate, segment_duration=1.0):
+        """
+        Retorna uma máscara booleana com um valor por segmento: True para os segmentos que devem ser
+        enviados ao modelo e False para os descartados como silêncio.
+        """
+        rms_db, flux_db = self.segment_stats(audio, sample_rate, segment_duration,
+                                             with_flux=self.flux_threshold_db is not None)
+        return self.apply(rms_db, flux_db)
+
+    def candidates_at(self, audio, starts, ends, previous=None):
+        """
+        Como `candidates`, para os segmentos [starts, ends) de uma parte do sinal (ver `stats_at`).
+        Retorna (mask, previous), com `previous` a ser passado na chamada da parte seguinte.
+        """
+        rms_db, flux_db, previous = self.stats_at(audio, starts, ends, with_flux=self.flux_threshold_db is not None,
+                                                  previous=previous)
+        return self.apply(rms_db, flux_db), previous
+
+    def apply(self, rms_db, flux_db):
+        """Aplica os limiares às medidas já calculadas por `segment_stats`."""
+        mask = rms_db >= self.rms_threshold_db
+        if self.flux_threshold_db is not None:
+            mask &= flux_db >= self.flux_threshold_db
+        return mask
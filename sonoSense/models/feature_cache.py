@@ -0,0 +1,56 @@
+# /models/feature_cache.py
+import os
+import hashlib
+import numpy as np # type: ignore
+
+
+class FeatureCache:
+    def __init__(self, cache_dir, n_mfcc=40, fixed_frames=44, feature_pipeline=None):
+        """
+        Cache persistente em disco das features extraídas de cada arquivo de áudio.
+
+        Cada entrada é um arquivo .npy cujo nome é o hash SHA-256 de: caminho absoluto do áudio, data de
+        modificação (mtime), tamanho do arquivo e parâmetros de extração (`n_mfcc`, `fixed_frames` e a
+        descrição do pipeline de features, que inclui a taxa de amostragem).
+        Assim, um arquivo alterado ou extraído com outros parâmetros gera uma chave nova e é recalculado.
+
+        Parâmetros:
+            cache_dir (str): Diretório onde as features serão armazenadas.
+            n_mfcc (int, opcional): Número de coeficientes MFCC usado na extração.
+            fixed_frames (int, opcional): Número fixo de frames usado na extração.
+            feature_pipeline (str, opcional): Descrição do pipeline de features (`FeaturePipeline.describe`).
+        """
+        self.cache_dir = cache_dir
+        self.n_mfcc = n_mfcc
+        self.fixed_frames = fixed_frames
+        self.feature_pipeline = feature_pipeline
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, file_path):
+        """Calcula a chave do cache para um arquivo de áudio."""
+        stat = os.stat(file_path)
+        raw = (f"{os.path.abspath(file_path)}|{stat.st_mtime_ns}|{stat.st_size}|{self.n_mfcc}|{self.fixed_frames}"
+               f"|{self.feature_pipeline}")
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def get(self, file_path):
+        """Retorna as features em cache do arquivo ou None se não houver entrada válida."""
+        entry = self._entry_path(self.key(file_path))
+        if not os.path.exists(entry):
+            return None
+        try:
+            return np.load(entry)
+        except Exception as e:
+            print(f"Entrada de cache inválida para {file_path}: {e}")
+            return None
+
+    def put(self, file_path, features):
+        """Armazena as features de um arquivo. A escrita é atômica para suportar execuções concorrentes."""
+        entry = self._entry_path(self.key(file_path))
+        tmp_path = f"{entry}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, features)
+        os.replace(tmp_path, entry)
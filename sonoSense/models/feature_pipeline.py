@@ -0,0 +1,195 @@
+# /models/feature_pipeline.py
+import os
+import json
+import functools
+import numpy as np  # type: ignore
+import scipy.fft  # type: ignore
+import scipy.signal  # type: ignore
+import soxr  # type: ignore
+import librosa  # type: ignore
+from config import FEATURE_SAMPLE_RATE
+
+
+class FeaturePipeline:
+    def __init__(self, sample_rate=FEATURE_SAMPLE_RATE, n_mfcc=40, fixed_frames=44, n_fft=2048, hop_length=512,
+                 n_mels=128, top_db=80.0):
+        """
+        Pipeline único de features (MFCC) usado no treinamento (`extract_features`) e na avaliação
+        (`extract_segment_features`, streaming e sessões), para que as features dos dois lados sejam iguais
+        por construção.
+
+        Todo áudio é reamostrado com o soxr para a taxa fixa `sample_rate`, então o custo por segundo de
+        áudio e a quantidade de frames por segundo não dependem da taxa da gravação enviada. O banco de
+        filtros mel, a janela e a matriz da DCT são calculados uma única vez, e os MFCCs são calculados em
+        lotes de segmentos com o mesmo resultado de `librosa.feature.mfcc` (STFT centrada com preenchimento
+        por zeros, espectrograma de potência, `power_to_db` com corte de `top_db` e DCT tipo II ortonormal).
+
+        Parâmetros:
+            sample_rate (int, opcional): Taxa de amostragem das features (FEATURE_SAMPLE_RATE do config). Se
+                                         None, cada áudio mantém a sua taxa original.
+            n_mfcc (int, opcional): Número de coeficientes MFCC. Valor padrão é 40.
+            fixed_frames (int, opcional): Número fixo de frames de saída (preenchido com zeros ou truncado).
+            n_fft, hop_length, n_mels, top_db: Parâmetros da STFT e do espectrograma mel (padrões do librosa).
+        """
+        self.sample_rate = sample_rate
+        self.n_mfcc = n_mfcc
+        self.fixed_frames = fixed_frames
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.n_mels = n_mels
+        self.top_db = top_db
+        self.window = scipy.signal.get_window('hann', n_fft, fftbins=True).astype(np.float32)
+        self.dct_matrix = scipy.fft.dct(np.eye(n_mels), type=2, norm='ortho', axis=0)[:n_mfcc].astype(np.float32)
+        self._mel_bases = {}
+        if sample_rate is not None:
+            self.mel_basis(sample_rate)
+
+    def describe(self):
+        """Descrição dos parâmetros do pipeline, usada para diferenciar features (cache, feature store, modelo)."""
+        return (f"features:sr={self.sample_rate or 'original'},n_mfcc={self.n_mfcc},frames={self.fixed_frames},"
+                f"n_fft={self.n_fft},hop={self.hop_length},n_mels={self.n_mels},top_db={self.top_db}")
+
+    def mel_basis(self, sample_rate):
+        """Banco de filtros mel (n_mels, 1 + n_fft // 2) da taxa informada, calculado na primeira utilização."""
+        if sample_rate not in self._mel_bases:
+            self._mel_bases[sample_rate] = librosa.filters.mel(sr=sample_rate, n_fft=self.n_fft, n_mels=self.n_mels)
+        return self._mel_bases[sample_rate]
+
+    def target_rate(self, sample_rate):
+        """Taxa em que as features de um áudio com a taxa `sample_rate` são calculadas."""
+        return self.sample_rate or sample_rate
+
+    def resample(self, audio, sample_rate):
+        """Reamostra o sinal mono para a taxa do pipeline. Retorna (audio, sample_rate)."""
+        target = self.target_rate(sample_rate)
+        if target == sample_rate:
+            return np.asarray(audio, dtype=np.float32), sample_rate
+        return soxr.resample(np.asarray(audio, dtype=np.float32), sample_rate, target, quality='HQ'), target
+
+    def resampler(self, sample_rate):
+        """
+        Retorna um `soxr.ResampleStream` para reamostrar em blocos um sinal com a taxa `sample_rate`, ou None
+        se ele já estiver na taxa do pipeline.
+        """
+        target = self.target_rate(sample_rate)
+        if target == sample_rate:
+            return None
+        return soxr.ResampleStream(sample_rate, target, 1, dtype='float32', quality='HQ')
+
+    def load(self, file_path):
+        """Carrega um arquivo de áudio em mono, já na taxa do pipeline. Retorna (audio, sample_rate)."""
+        audio, sample_rate = librosa.load(file_path, sr=None)
+        return self.resample(audio, sample_rate)
+
+    def clip_features(self, audio, sample_rate):
+        """
+        MFCCs de um clipe inteiro, de forma (n_mfcc, fixed_frames, 1), como os do dataset de treinamento.
+        O clipe é tratado como um único segmento.
+        """
+        audio, sample_rate = self.resample(audio, sample_rate)
+        if len(audio) == 0:
+            raise ValueError("Áudio vazio.")
+        return self.segments_mfcc(audio, sample_rate, np.array([0]), np.array([len(audio)]))[0]
+
+    def segments_mfcc(self, audio, sample_rate, starts, ends, batch_size=256):
+        """
+        Calcula os MFCCs dos segmentos [starts, ends) de `audio` (já na taxa do pipeline), em lotes de
+        `batch_size` segmentos. Retorna um array (num_segmentos, n_mfcc, fixed_frames, 1).
+        """
+        output = np.zeros((len(starts), self.n_mfcc, self.fixed_frames, 1), dtype=np.float32)
+        for first in range(0, len(starts), batch_size):
+            windows, lengths = _segment_windows(audio, starts[first:first + batch_size], ends[first:first + batch_size])
+            mfccs = self.mfcc_batch(windows, lengths, sample_rate)
+            frames = min(self.fixed_frames, mfccs.shape[-1])
+            output[first:first + len(mfccs), :, :frames, 0] = mfccs[:, :, :frames]
+        return output
+
+    def mfcc_batch(self, windows, lengths, sample_rate):
+        """
+        MFCCs de uma matriz de segmentos (num_segmentos, tamanho_maximo), em que o segmento i ocupa as
+        primeiras `lengths[i]` amostras e o resto é zero. Os frames além do fim real de cada segmento não
+        participam do corte de `top_db` e são zerados, como no cálculo individual de cada segmento.
+
+        Retorna:
+            numpy.ndarray: Array (num_segmentos, n_mfcc, num_frames).
+        """
+        pad = self.n_fft // 2
+        padded = np.zeros((len(windows), windows.shape[1] + 2 * pad), dtype=np.float32)
+        padded[:, pad:pad + windows.shape[1]] = windows
+        frames = np.lib.stride_tricks.sliding_window_view(padded, self.n_fft, axis=1)[:, ::self.hop_length]
+
+        # Espectrograma de potência e mel com as matrizes pré-calculadas
+        spectrum = scipy.fft.rfft(frames * self.window, axis=-1, workers=-1)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        mel = power @ self.mel_basis(sample_rate).T
+        log_mel = 10.0 * np.log10(np.maximum(mel, 1e-10))
+
+        # Corte de top_db por segmento, apenas sobre os frames reais de cada um (center=True)
+        valid = 1 + np.asarray(lengths) // self.hop_length
+        frame_mask = np.arange(log_mel.shape[1])[None, :] < valid[:, None]
+        floor = np.where(frame_mask[:, :, None], log_mel, -np.inf).max(axis=(1, 2), keepdims=True) - self.top_db
+        log_mel = np.maximum(log_mel, floor)
+
+        mfccs = log_mel @ self.dct_matrix.T
+        mfccs = np.where(frame_mask[:, :, None], mfccs, 0)
+        return np.ascontiguousarray(mfccs.transpose(0, 2, 1))
+
+
+def _segment_windows(audio, starts, ends):
+    """
+    Monta a matriz (num_segmentos, tamanho_maximo) com o áudio de cada segmento, preenchendo com zeros
+    o que passa do fim de cada segmento.
+
+    Quando os segmentos são igualmente espaçados (caso comum), a matriz é uma visão com strides sobre o
+    sinal, sem cópia. Caso contrário, os segmentos são copiados por indexação.
+    """
+    # Trabalha apenas no trecho do sinal coberto pelos segmentos
+    audio = audio[starts[0]:ends.max()]
+    starts, ends = starts - starts[0], ends - starts[0]
+    lengths = ends - starts
+    seg_len = int(lengths.max())
+    step = int(starts[1] - starts[0]) if len(starts) > 1 else seg_len
+    uniform = step == seg_len and np.all(np.diff(starts) == step) and np.all(lengths[:-1] == seg_len)
+
+    if uniform:
+        # Completa o fim do sinal com zeros para que o último segmento tenha o mesmo tamanho dos demais
+        tail = starts[-1] + seg_len - len(audio)
+        if tail > 0:
+            audio = np.pad(audio, (0, tail), mode='constant')
+        windows = np.lib.stride_tricks.sliding_window_view(audio, seg_len)[::step]
+        return windows[:len(starts)], lengths
+
+    idx = starts[:, None] + np.arange(seg_len)[None, :]
+    mask = idx < ends[:, None]
+    windows = np.where(mask, audio[np.minimum(idx, len(audio) - 1)], 0).astype(audio.dtype)
+    return windows, lengths
+
+
+@functools.lru_cache(maxsize=None)
+def get_pipeline(n_mfcc=40, fixed_frames=44, hop_length=512, top_db=80.0, sample_rate=FEATURE_SAMPLE_RATE):
+    """Retorna o pipeline compartilhado com os parâmetros informados, com as matrizes já calculadas."""
+    return FeaturePipeline(sample_rate=sample_rate, n_mfcc=n_mfcc, fixed_frames=fixed_frames,
+                           hop_length=hop_length, top_db=top_db)
+
+
+def feature_metadata_path(model_path):
+    """Caminho do arquivo com o pipeline de features de um modelo (ex.: modelo_sono.features.json)."""
+    return os.path.splitext(model_path)[0] + '.features.json'
+
+
+def save_feature_pipeline(model_path, feature_pipeline):
+    """
+    Grava, ao lado do modelo, a descrição do pipeline de features (`FeaturePipeline.describe`) com que ele
+    foi treinado, para que a avaliação não use o modelo com features diferentes.
+    """
+    with open(feature_metadata_path(model_path), 'w') as f:
+        json.dump({"feature_pipeline": feature_pipeline}, f, indent=2)
+
+
+def read_feature_pipeline(model_path):
+    """Retorna a descrição do pipeline de features gravada com o modelo, ou None se ela não existir."""
+    path = feature_metadata_path(model_path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f).get("feature_pipeline")
@@ -0,0 +1,123 @@
+# /models/feature_store.py
+import os
+import json
+import numpy as np # type: ignore
+import tensorflow as tf  # type: ignore
+from sklearn.model_selection import train_test_split  # type: ignore
+
+# Valores usados no índice de divisão (split.npy)
+SPLIT_TRAIN = 0
+SPLIT_TEST = 1
+
+
+def write_feature_store(store_dir, features, labels, test_size=0.2, random_state=42, chunk_size=1024,
+                        feature_pipeline=None):
+    """
+    Grava as features e rótulos (saída de `load_dataset`) em um diretório de feature store, que pode ser
+    lido depois por memory-map sem carregar o dataset inteiro na memória.
+
+    O diretório contém:
+        - features.npy: Array (num_amostras, n_mfcc, frames, 1) em float32, lido com memory-map.
+        - labels.npy: Rótulos de cada amostra.
+        - split.npy: Índice de divisão de cada amostra (0 para treino, 1 para teste). A divisão usa
+          `train_test_split` com os mesmos parâmetros de `Controller.preparar_dados`.
+        - meta.json: Formato e quantidade de amostras da store e os parâmetros do pipeline de features.
+
+    Parâmetros:
+        store_dir (str): Diretório onde a feature store será gravada.
+        features (numpy.ndarray): Features extraídas dos áudios.
+        labels (numpy.ndarray): Rótulos correspondentes às features.
+        test_size (float, opcional): Proporção das amostras reservada para teste. Valor padrão é 0.2.
+        random_state (int, opcional): Semente da divisão entre treino e teste. Valor padrão é 42.
+        chunk_size (int, opcional): Quantidade de amostras copiadas por vez para o arquivo.
+        feature_pipeline (str, opcional): Descrição do pipeline que extraiu as features
+                                          (`FeaturePipeline.describe`).
+
+    Retorna:
+        str: O caminho do diretório da feature store.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    num_samples = len(features)
+
+    store = np.lib.format.open_memmap(os.path.join(store_dir, "features.npy"), mode="w+",
+                                      dtype=np.float32, shape=features.shape)
+    for first in range(0, num_samples, chunk_size):
+        store[first:first + chunk_size] = features[first:first + chunk_size]
+    store.flush()
+    del store
+
+    _, test_idx = train_test_split(np.arange(num_samples), test_size=test_size, random_state=random_state)
+    split = np.full(num_samples, SPLIT_TRAIN, dtype=np.int8)
+    split[test_idx] = SPLIT_TEST
+
+    np.save(os.path.join(store_dir, "labels.npy"), np.asarray(labels, dtype=np.int64))
+    np.save(os.path.join(store_dir, "split.npy"), split)
+    with open(os.path.join(store_dir, "meta.json"), "w") as f:
+        json.dump({"num_samples": num_samples, "feature_shape": list(features.shape[1:]),
+                   "feature_pipeline": feature_pipeline}, f)
+
+    print(f"Feature store gravada em '{store_dir}' com {num_samples} amostras.")
+    return store_dir
+
+
+def open_feature_store(store_dir):
+    """
+    Abre uma feature store gravada por `write_feature_store`.
+
+    Retorna:
+        tuple: (features, labels, split), onde features é um memory-map somente leitura.
+    """
+    features = np.load(os.path.join(store_dir, "features.npy"), mmap_mode="r")
+    labels = np.load(os.path.join(store_dir, "labels.npy"))
+    split = np.load(os.path.join(store_dir, "split.npy"))
+    return features, labels, split
+
+
+def read_feature_store_meta(store_dir):
+    """Retorna o conteúdo do meta.json de uma feature store."""
+    with open(os.path.join(store_dir, "meta.json")) as f:
+        return json.load(f)
+
+
+def make_dataset(store_dir, subset="train", batch_size=32, shuffle=True, shuffle_buffer=None, num_classes=2,
+                 seed=42):
+    """
+    Cria um pipeline `tf.data` que lê as amostras de uma feature store sob demanda.
+
+    Apenas os índices das amostras passam pelo buffer de embaralhamento; as features de cada lote são
+    lidas do memory-map depois do agrupamento, então o uso de memória é constante e independe do tamanho
+    do dataset. Os rótulos são convertidos para one-hot, como em `Controller.preparar_dados`.
+
+    Parâmetros:
+        store_dir (str): Diretório da feature store.
+        subset (str, opcional): "train" ou "test". Valor padrão é "train".
+        batch_size (int, opcional): Tamanho dos lotes. Valor padrão é 32.
+        shuffle (bool, opcional): Se as amostras devem ser embaralhadas a cada época. Valor padrão é True.
+        shuffle_buffer (int, opcional): Tamanho do buffer de embaralhamento. Se None, usa o total de amostras.
+        num_classes (int, opcional): Número de classes para o one-hot. Valor padrão é 2.
+        seed (int, opcional): Semente do embaralhamento. Valor padrão é 42.
+
+    Retorna:
+        tf.data.Dataset: Dataset de tuplas (features, rótulos_one_hot).
+    """
+    features, labels, split = open_feature_store(store_dir)
+    indices = np.flatnonzero(split == (SPLIT_TRAIN if subset == "train" else SPLIT_TEST))
+    feature_shape = features.shape[1:]
+
+    def load_batch(batch_idx):
+        # Leitura em ordem crescente é mais amigável ao memory-map
+        batch_idx = np.sort(batch_idx)
+        return np.asarray(features[batch_idx], dtype=np.float32), labels[batch_idx]
+
+    def to_tensors(batch_idx):
+        x, y = tf.numpy_function(load_batch, [batch_idx], (tf.float32, tf.int64))
+        x = tf.ensure_shape(x, (None,) + tuple(feature_shape))
+        y = tf.ensure_shape(y, (None,))
+        return x, tf.one_hot(y, num_classes)
+
+    dataset = tf.data.Dataset.from_tensor_slices(indices)
+    if shuffle:
+        dataset = dataset.shuffle(shuffle_buffer or len(indices), seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(to_tensors, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
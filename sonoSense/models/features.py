@@ -1,10 +1,13 @@
 # /models/features.py
 import numpy as np # type: ignore
-import librosa # type: ignore
+import soundfile as sf # type: ignore
+from models.feature_pipeline import get_pipeline
 
 def extract_features(file_path, n_mfcc=40, fixed_frames=44):
     """
-    Extrai os coeficientes MFCC de um arquivo de áudio e padroniza o número de frames.
+    Extrai os coeficientes MFCC de um arquivo de áudio e padroniza o número de frames, com o mesmo
+    pipeline de features da avaliação (ver `FeaturePipeline`): o áudio é reamostrado para a taxa das
+    features e o clipe inteiro é tratado como um segmento.
     
     Parâmetros:
         file_path (str): Caminho para o arquivo de áudio a ser processado.
@@ -15,22 +18,204 @@ def extract_features(file_path, n_mfcc=40, fixed_frames=44):
         numpy.ndarray ou None: Um array com os MFCCs de forma (n_mfcc, fixed_frames, 1) se o processamento for bem-sucedido.
     """
     try:
-        # Carrega o áudio e obtém a taxa de amostragem
-        audio, sample_rate = librosa.load(file_path, sr=None)
-        
-        # Extrai os coeficientes MFCC
-        mfccs = librosa.feature.mfcc(y=audio, sr=sample_rate, n_mfcc=n_mfcc)
-
-        # Padroniza o número de frames
-        if mfccs.shape[1] < fixed_frames:
-            pad_width = fixed_frames - mfccs.shape[1]
-            mfccs = np.pad(mfccs, pad_width=((0, 0), (0, pad_width)), mode='constant')
-        else:
-            mfccs = mfccs[:, :fixed_frames]
-        
-        # Expande a dimensão para adicionar o canal (necessário para CNNs)
-        mfccs = np.expand_dims(mfccs, axis=-1)
-        return mfccs
+        pipeline = get_pipeline(n_mfcc, fixed_frames)
+        audio, sample_rate = pipeline.load(file_path)
+        return pipeline.clip_features(audio, sample_rate)
     except Exception as e:
         print(f"Erro ao processar {file_path}: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def segment_bounds(n_samples, sample_rate, segment_duration=1.0):
+    """
+    Calcula os limites (em amostras) dos segmentos de uma gravação, reproduzindo exatamente a
+    segmentação por `np.arange` usada na avaliação segmento a segmento.
+
+    Parâmetros:
+        n_samples (int): Número total de amostras do sinal.
+        sample_rate (int): Taxa de amostragem do sinal.
+        segment_duration (float, opcional): Duração de cada segmento em segundos. Valor padrão é 1.0.
+
+    Retorna:
+        tuple: Dois arrays do NumPy (starts, ends) com os índices de início e fim de cada segmento.
+    """
+    total_duration = n_samples / sample_rate
+    start_times = np.arange(0, total_duration, segment_duration)
+    end_times = np.minimum(start_times + segment_duration, total_duration)
+    starts = (start_times * sample_rate).astype(np.int64)
+    ends = (end_times * sample_rate).astype(np.int64)
+    return starts, ends
+
+
+def extract_segment_features(audio, sample_rate, segment_duration=1.0, n_mfcc=40, fixed_frames=44,
+                             batch_size=256, hop_length=512, top_db=80.0, mask=None, pipeline=None):
+    """
+    Extrai os MFCCs de todos os segmentos de uma gravação de forma vetorizada, produzindo o mesmo
+    resultado que chamar `librosa.feature.mfcc` segmento a segmento sobre o sinal reamostrado.
+
+    O sinal é reamostrado para a taxa do pipeline de features (ver `FeaturePipeline`) e os segmentos são
+    processados em lotes, com o espectrograma mel e a DCT calculados sobre a matriz de segmentos. O corte
+    de `top_db` é aplicado por segmento, como no cálculo individual, e os frames que excedem o tamanho real
+    de um segmento curto são zerados, reproduzindo o preenchimento original.
+
+    Parâmetros:
+        audio (numpy.ndarray): Sinal de áudio mono.
+        sample_rate (int): Taxa de amostragem do sinal.
+        segment_duration (float, opcional): Duração de cada segmento em segundos. Valor padrão é 1.0.
+        n_mfcc (int, opcional): Número de coeficientes MFCC a serem extraídos. Valor padrão é 40.
+        fixed_frames (int, opcional): Número fixo de frames desejado para a dimensão temporal dos MFCCs.
+        batch_size (int, opcional): Quantidade de segmentos processados por lote. Limita o uso de memória.
+        hop_length (int, opcional): Salto entre frames do STFT (o mesmo padrão do librosa).
+        top_db (float, opcional): Faixa dinâmica máxima em dB (o mesmo padrão do librosa).
+        mask (numpy.ndarray, opcional): Máscara booleana com um valor por segmento do sinal já reamostrado.
+                                        Se informada, apenas os segmentos marcados como True são processados
+                                        (ver `EnergyGate`).
+        pipeline (FeaturePipeline, opcional): Pipeline de features a usar (ex.: o do modelo carregado, ver
+                                              `Controller.verificar_pipeline_modelo`). Se None, usa o de
+                                              `get_pipeline` com os parâmetros acima.
+
+    Retorna:
+        numpy.ndarray: Um array de forma (num_segmentos, n_mfcc, fixed_frames, 1), com apenas os segmentos
+                       selecionados por `mask`, na ordem original, quando ela for informada.
+    """
+    pipeline = pipeline or get_pipeline(n_mfcc, fixed_frames, hop_length, top_db)
+    audio, sample_rate = pipeline.resample(audio, sample_rate)
+    starts, ends = segment_bounds(len(audio), sample_rate, segment_duration)
+    if mask is not None:
+        starts, ends = starts[mask], ends[mask]
+    if len(starts) == 0:
+        return np.zeros((0, pipeline.n_mfcc, pipeline.fixed_frames, 1), dtype=np.float32)
+
+    return pipeline.segments_mfcc(audio, sample_rate, starts, ends, batch_size)
+
+
+class IncrementalSegmentFeatures:
+    def __init__(self, sample_rate, segment_duration=1.0, n_mfcc=40, fixed_frames=44, batch_size=256,
+                 hop_length=512, top_db=80.0, gate=None, pipeline=None):
+        """
+        Extrai os MFCCs dos segmentos de um sinal que chega aos poucos (blocos de um arquivo, trechos enviados
+        durante a gravação), sem conhecer a duração total de antemão.
+
+        Os trechos são reamostrados em fluxo para a taxa do pipeline de features e os segmentos seguem os
+        mesmos limites de `extract_segment_features` sobre o sinal completo. As amostras de um segmento que
+        atravessa a fronteira entre dois trechos ficam em um buffer até que o segmento esteja completo; o
+        último segmento, possivelmente mais curto, só é extraído por `finish`.
+
+        Com um `gate` (EnergyGate), apenas os MFCCs dos segmentos candidatos são extraídos e retornados; a
+        máscara de todos os segmentos completados na última chamada fica em `mask`.
+
+        Parâmetros:
+            sample_rate (int): Taxa de amostragem do sinal recebido.
+            segment_duration (float, opcional): Duração de cada segmento em segundos. Valor padrão é 1.0.
+            n_mfcc, fixed_frames, batch_size, hop_length, top_db: Os mesmos de `extract_segment_features`.
+            gate (EnergyGate, opcional): Descarta os segmentos silenciosos antes dos MFCCs.
+            pipeline (FeaturePipeline, opcional): O mesmo de `extract_segment_features`.
+        """
+        self.pipeline = pipeline or get_pipeline(n_mfcc, fixed_frames, hop_length, top_db)
+        self.input_rate = sample_rate
+        self.sample_rate = self.pipeline.target_rate(sample_rate)  # Taxa das amostras em `total_samples`
+        self.segment_duration = segment_duration
+        self.batch_size = batch_size
+        self.gate = gate
+        self.mask = np.zeros(0, dtype=bool)  # Segmentos completados na última chamada (True: extraído)
+        self._gate_previous = None
+        self._resampler = self.pipeline.resampler(sample_rate)
+        self.total_samples = 0
+        self.next_segment = 0
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._offset = 0  # Índice, no sinal, da primeira amostra do buffer
+
+    def push(self, samples):
+        """
+        Acrescenta amostras mono ao sinal e retorna os MFCCs (N, n_mfcc, fixed_frames, 1) dos segmentos que
+        ficaram completos, possivelmente nenhum.
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        if self._resampler is not None:
+            samples = self._resampler.resample_chunk(samples)
+        self._add(samples)
+
+        # Mesma aritmética de `segment_bounds`: o segmento k vai de k*d a k*d + d segundos
+        last = int(self.total_samples / (self.segment_duration * self.sample_rate)) + 1
+        k = np.arange(self.next_segment, last + 1)
+        ends = ((k * self.segment_duration + self.segment_duration) * self.sample_rate).astype(np.int64)
+        complete = k[ends <= self.total_samples]
+        starts = (complete * self.segment_duration * self.sample_rate).astype(np.int64)
+        return self._extract(starts, ends[:len(complete)])
+
+    def finish(self):
+        """Retorna os MFCCs dos segmentos restantes, incluindo o último segmento incompleto."""
+        if self._resampler is not None:
+            # Amostras que ainda estavam no filtro do reamostrador
+            self._add(self._resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True))
+            self._resampler = None
+        starts, ends = segment_bounds(self.total_samples, self.sample_rate, self.segment_duration)
+        return self._extract(starts[self.next_segment:], ends[self.next_segment:])
+
+    def _add(self, samples):
+        self._buffer = np.concatenate([self._buffer, samples])
+        self.total_samples += len(samples)
+
+    def _extract(self, starts, ends):
+        starts, ends = starts - self._offset, ends - self._offset
+        self.mask = np.ones(len(starts), dtype=bool)
+        if self.gate is not None and len(starts) > 0:
+            self.mask, self._gate_previous = self.gate.candidates_at(self._buffer, starts, ends, self._gate_previous)
+        if self.mask.any():
+            batch = self.pipeline.segments_mfcc(self._buffer, self.sample_rate, starts[self.mask],
+                                                ends[self.mask], self.batch_size)
+        else:
+            batch = np.zeros((0, self.pipeline.n_mfcc, self.pipeline.fixed_frames, 1), dtype=np.float32)
+        self.next_segment += len(starts)
+
+        # Descarta as amostras que nenhum segmento pendente ainda utiliza
+        keep_from = int(self.next_segment * self.segment_duration * self.sample_rate)
+        keep_from = min(max(keep_from, self._offset), self._offset + len(self._buffer))
+        self._buffer = self._buffer[keep_from - self._offset:]
+        self._offset = keep_from
+        return batch
+
+
+def stream_segment_features(audio_path, segment_duration=1.0, n_mfcc=40, fixed_frames=44, batch_size=256,
+                            block_duration=60.0, hop_length=512, top_db=80.0, pipeline=None):
+    """
+    Lê um arquivo WAV em blocos e gera os MFCCs dos seus segmentos em lotes de tamanho fixo, sem
+    carregar a gravação inteira na memória.
+
+    Os segmentos seguem exatamente os mesmos limites de `extract_segment_features`. As amostras de um
+    segmento que atravessa a fronteira entre dois blocos são mantidas em um buffer e completadas com o
+    bloco seguinte, de modo que o resultado é idêntico ao da extração sobre o sinal completo. O pico de
+    memória depende apenas de `block_duration` e `batch_size`, e não da duração da gravação.
+
+    Parâmetros:
+        audio_path (str): Caminho para o arquivo de áudio (WAV ou outro formato suportado pelo soundfile).
+        segment_duration (float, opcional): Duração de cada segmento em segundos. Valor padrão é 1.0.
+        n_mfcc (int, opcional): Número de coeficientes MFCC a serem extraídos. Valor padrão é 40.
+        fixed_frames (int, opcional): Número fixo de frames desejado para a dimensão temporal dos MFCCs.
+        batch_size (int, opcional): Quantidade de segmentos em cada lote gerado.
+        block_duration (float, opcional): Duração, em segundos, de cada bloco lido do arquivo.
+        hop_length (int, opcional): Salto entre frames do STFT (o mesmo padrão do librosa).
+        top_db (float, opcional): Faixa dinâmica máxima em dB (o mesmo padrão do librosa).
+        pipeline (FeaturePipeline, opcional): O mesmo de `extract_segment_features`.
+
+    Retorna:
+        generator: Gera lotes de forma (até batch_size, n_mfcc, fixed_frames, 1).
+    """
+    info = sf.info(audio_path)
+    blocksize = max(int(block_duration * info.samplerate), 1)
+    extractor = IncrementalSegmentFeatures(info.samplerate, segment_duration, n_mfcc, fixed_frames, batch_size,
+                                           hop_length, top_db, pipeline=pipeline)
+
+    pending = np.zeros((0, extractor.pipeline.n_mfcc, extractor.pipeline.fixed_frames, 1), dtype=np.float32)
+    for block in sf.blocks(audio_path, blocksize=blocksize, dtype='float32', always_2d=True):
+        # Converte para mono da mesma forma que o librosa.load
+        block = block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]
+        pending = np.concatenate([pending, extractor.push(block)])
+        while len(pending) >= batch_size:
+            yield pending[:batch_size]
+            pending = pending[batch_size:]
+
+    # Ao fim do arquivo todos os segmentos restantes estão completos
+    pending = np.concatenate([pending, extractor.finish()])
+    for first in range(0, len(pending), batch_size):
+        yield pending[first:first + batch_size]
@@ -0,0 +1,88 @@
+import json
+import time
+import sqlite3
+import threading
+
+
+class JobStore:
+    def __init__(self, db_path='jobs.db'):
+        """
+        Armazena o estado dos jobs de avaliação assíncrona em um banco SQLite local, para que os jobs
+        sobrevivam a um reinício do processo.
+
+        Parâmetros:
+            db_path (str, opcional): Caminho do arquivo SQLite. Valor padrão é 'jobs.db'.
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.create_table()
+
+    def create_table(self):
+        """Cria a tabela de jobs caso não exista."""
+        with self._lock:
+            self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                upload_path TEXT NOT NULL,
+                params TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            ''')
+            self.connection.commit()
+
+    def create_job(self, job_id, filename, upload_path, params):
+        """Registra um novo job com status 'queued'."""
+        now = time.time()
+        with self._lock:
+            self.connection.execute(
+                "INSERT INTO jobs (id, status, filename, upload_path, params, created_at, updated_at) "
+                "VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, filename, upload_path, json.dumps(params), now, now)
+            )
+            self.connection.commit()
+
+    def update_status(self, job_id, status, result=None, error=None):
+        """Atualiza o status de um job e, opcionalmente, o resultado ou a mensagem de erro."""
+        with self._lock:
+            self.connection.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+            )
+            self.connection.commit()
+
+    def get_job(self, job_id):
+        """Recupera um job pelo ID como dicionário, ou None se não existir."""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT id, status, filename, upload_path, params, result, error, created_at, updated_at "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def get_unfinished_jobs(self):
+        """Recupera os jobs que ainda não terminaram (status 'queued' ou 'running'), do mais antigo ao mais novo."""
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT id, status, filename, upload_path, params, result, error, created_at, updated_at "
+                "FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def _to_dict(self, row):
+        return {
+            'id': row[0],
+            'status': row[1],
+            'filename': row[2],
+            'upload_path': row[3],
+            'params': json.loads(row[4]),
+            'result': json.loads(row[5]) if row[5] else None,
+            'error': row[6],
+            'created_at': row[7],
+            'updated_at': row[8]
+        }
@@ -1,4 +1,8 @@
+import os
+import json
+import time
 from tensorflow.keras.models import Sequential  # type: ignore
+from tensorflow.keras.optimizers import Adam  # type: ignore
 from tensorflow.keras.layers import Conv2D, MaxPooling2D, Flatten, Dense, Dropout  # type: ignore
 
 def build_model(input_shape):
@@ -28,3 +32,44 @@ def build_model(input_shape):
     
     model.compile(loss='categorical_crossentropy', optimizer='adam', metrics=['accuracy'])
     return model
+
+
+def compile_for_fine_tuning(model, learning_rate=1e-4):
+    """
+    Recompila um modelo já treinado para o ajuste fino, com a mesma função de perda e métricas de
+    `build_model` e uma taxa de aprendizado menor, para não destruir os pesos aprendidos.
+    """
+    model.compile(loss='categorical_crossentropy', optimizer=Adam(learning_rate=learning_rate), metrics=['accuracy'])
+    return model
+
+
+def create_version_dir(output_dir='modelos'):
+    """
+    Cria o diretório de uma nova versão do modelo em `output_dir`, nomeado pela data e hora
+    (ex.: modelos/20250301-021500). Retorna o caminho criado.
+    """
+    version = time.strftime('%Y%m%d-%H%M%S')
+    version_dir = os.path.join(output_dir, version)
+    suffix = 1
+    while os.path.exists(version_dir):
+        suffix += 1
+        version_dir = os.path.join(output_dir, f"{version}-{suffix}")
+    os.makedirs(version_dir)
+    return version_dir
+
+
+def save_model_version(model, version_dir, metadata):
+    """
+    Grava o artefato versionado do modelo: `modelo_sono.h5` e `metadata.json` (métricas de validação,
+    versão de origem e parâmetros do treinamento) em `version_dir`.
+
+    Retorna:
+        str: O caminho do modelo gravado.
+    """
+    model_path = os.path.join(version_dir, 'modelo_sono.h5')
+    model.save(model_path)
+    metadata = dict(metadata, version=os.path.basename(version_dir))
+    with open(os.path.join(version_dir, 'metadata.json'), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    print(f"Versão do modelo salva em '{version_dir}'.")
+    return model_path
@@ -0,0 +1,96 @@
+# /models/result_cache.py
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    def __init__(self, audio_model=None, max_bytes=4 * 1024 * 1024):
+        """
+        Cache dos resultados de avaliação em dois níveis: um LRU em memória, limitado pelo tamanho total
+        das entradas (`max_bytes`), e um nível persistente no banco de dados (tabela resultados_cache do
+        `audio_model`). Um acerto no banco é promovido para a memória.
+
+        Parâmetros:
+            audio_model (AudioModel, opcional): Modelo de acesso ao MySQL usado no nível persistente.
+                                                Se None, apenas o nível em memória é usado.
+            max_bytes (int, opcional): Tamanho máximo, em bytes, das entradas mantidas em memória.
+        """
+        self.audio_model = audio_model
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(audio_hash, model_fingerprint, segment_duration, threshold):
+        """Monta a chave do cache a partir do hash do áudio, da versão do modelo e dos parâmetros da avaliação."""
+        raw = f"{audio_hash}|{model_fingerprint}|{float(segment_duration)}|{float(threshold)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Retorna o resultado em cache para a chave, ou None."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(self._entries[key][0])
+
+        resultado = None
+        if self.audio_model is not None:
+            try:
+                resultado = self.audio_model.get_cached_result(key)
+            except Exception as e:
+                print(f"Erro ao consultar o cache de resultados no banco: {e}")
+
+        with self._lock:
+            if resultado is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._put_memory(key, resultado)
+        return dict(resultado)
+
+    def put(self, key, resultado):
+        """
+        Armazena o resultado nos dois níveis do cache, com os mesmos campos da resposta original (incluindo
+        `skipped_fraction`, quando a avaliação usou o gate de energia).
+        """
+        campos = {"message": resultado["message"], "percent_ronco": float(resultado["percent_ronco"])}
+        if resultado.get("skipped_fraction") is not None:
+            campos["skipped_fraction"] = float(resultado["skipped_fraction"])
+        resultado = campos
+        self._put_memory(key, resultado)
+        if self.audio_model is not None:
+            try:
+                self.audio_model.save_cached_result(key, resultado["message"], resultado["percent_ronco"],
+                                                    resultado.get("skipped_fraction"))
+            except Exception as e:
+                print(f"Erro ao gravar o cache de resultados no banco: {e}")
+
+    def stats(self):
+        """Retorna os contadores de acertos e falhas, a taxa de acerto e a ocupação do nível em memória."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._entries),
+                "memory_bytes": self._size,
+            }
+
+    def _put_memory(self, key, resultado):
+        size = len(key) + len(json.dumps(resultado))
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            self._entries[key] = (resultado, size)
+            self._size += size
+            # Remove as entradas usadas há mais tempo até respeitar o limite de tamanho
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self._size -= old_size
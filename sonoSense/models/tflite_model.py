@@ -0,0 +1,178 @@
+# /models/tflite_model.py
+import os
+import time
+import uuid
+import threading
+import numpy as np  # type: ignore
+
+# O interpretador é procurado primeiro nos pacotes leves (sem o TensorFlow completo)
+try:
+    from ai_edge_litert.interpreter import Interpreter  # type: ignore
+except ImportError:
+    try:
+        from tflite_runtime.interpreter import Interpreter  # type: ignore
+    except ImportError:
+        Interpreter = None
+
+
+def _interpreter_class():
+    if Interpreter is not None:
+        return Interpreter
+    import tensorflow as tf  # type: ignore
+    return tf.lite.Interpreter
+
+
+def export_tflite(model, output_path='modelo_sono.tflite', quantize=False, calibration_data=None,
+                  num_calibration=500):
+    """
+    Converte um modelo Keras para TFLite e grava o resultado em `output_path`.
+
+    Com `quantize=True`, aplica quantização int8 pós-treinamento (pesos, ativações, entrada e saída),
+    calibrada com amostras reais de features (`calibration_data`, por exemplo o conjunto de treino).
+
+    Parâmetros:
+        model (tensorflow.keras.Model): Modelo treinado.
+        output_path (str, opcional): Caminho do arquivo .tflite. Valor padrão é 'modelo_sono.tflite'.
+        quantize (bool, opcional): Se True, quantiza o modelo para int8. Valor padrão é False.
+        calibration_data (numpy.ndarray, opcional): Amostras (N, 40, 44, 1) usadas na calibração.
+                                                    Obrigatório quando `quantize=True`.
+        num_calibration (int, opcional): Quantidade máxima de amostras usadas na calibração.
+
+    Retorna:
+        str: O caminho do arquivo gravado.
+    """
+    import tensorflow as tf  # type: ignore
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize:
+        if calibration_data is None or len(calibration_data) == 0:
+            raise ValueError("A quantização int8 precisa de amostras de calibração.")
+        rng = np.random.default_rng(42)
+        idx = np.sort(rng.permutation(len(calibration_data))[:num_calibration])
+        samples = np.asarray(calibration_data[idx], dtype=np.float32)
+
+        def representative_dataset():
+            for sample in samples:
+                yield [sample[np.newaxis]]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+
+    data = converter.convert()
+    tmp_path = f"{output_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, output_path)
+    print(f"Modelo TFLite{' int8' if quantize else ''} salvo como '{output_path}' ({len(data) / 1024:.0f} KB).")
+    return output_path
+
+
+class TFLiteModel:
+    def __init__(self, model_path='modelo_sono.tflite', batch_size=256, num_threads=None):
+        """
+        Backend de inferência com o interpretador TFLite. Expõe `predict` e `predict_on_batch` com a
+        mesma semântica do modelo Keras (probabilidades de cada classe), então pode substituí-lo no
+        `Controller` e no `InferenceEngine`.
+
+        Os segmentos são enviados ao interpretador em lotes de até `batch_size`; o tensor de entrada só
+        é redimensionado quando o tamanho do lote muda. Modelos quantizados (int8) têm a entrada
+        quantizada e a saída dequantizada automaticamente.
+
+        Parâmetros:
+            model_path (str, opcional): Caminho do arquivo .tflite. Valor padrão é 'modelo_sono.tflite'.
+            batch_size (int, opcional): Tamanho máximo de cada lote enviado ao interpretador.
+            num_threads (int, opcional): Threads usadas pelo interpretador. Se None, usa todos os núcleos.
+        """
+        self.model_path = model_path
+        self.batch_size = batch_size
+        self.interpreter = _interpreter_class()(model_path=model_path,
+                                                num_threads=num_threads or os.cpu_count() or 1)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._current_batch = int(self._input['shape'][0])
+        # O interpretador não pode ser usado por duas threads ao mesmo tempo
+        self._lock = threading.Lock()
+
+    @property
+    def quantized(self):
+        return self._input['dtype'] == np.int8
+
+    def predict(self, segments, verbose=None):
+        """
+        Retorna as probabilidades (N, num_classes) dos segmentos (N, 40, 44, 1). `verbose` é aceito
+        apenas por compatibilidade com `Model.predict`.
+        """
+        segments = np.asarray(segments, dtype=np.float32)
+        outputs = []
+        with self._lock:
+            for first in range(0, len(segments), self.batch_size):
+                outputs.append(self._invoke(segments[first:first + self.batch_size]))
+        if not outputs:
+            return np.zeros((0, int(self._output['shape'][-1])), dtype=np.float32)
+        return np.concatenate(outputs)
+
+    def predict_on_batch(self, batch):
+        return self.predict(batch)
+
+    def _invoke(self, batch):
+        if len(batch) != self._current_batch:
+            self.interpreter.resize_tensor_input(self._input['index'], [len(batch)] + list(batch.shape[1:]))
+            self.interpreter.allocate_tensors()
+            self._input = self.interpreter.get_input_details()[0]
+            self._output = self.interpreter.get_output_details()[0]
+            self._current_batch = len(batch)
+
+        if self.quantized:
+            scale, zero_point = self._input['quantization']
+            batch = np.clip(np.round(batch / scale + zero_point), -128, 127).astype(np.int8)
+        self.interpreter.set_tensor(self._input['index'], batch)
+        self.interpreter.invoke()
+        output = self.interpreter.get_tensor(self._output['index'])
+        if self._output['dtype'] == np.int8:
+            scale, zero_point = self._output['quantization']
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output.copy()
+
+
+def compare_backends(keras_model, tflite_model, features, labels, repeats=3):
+    """
+    Compara o modelo Keras e o backend TFLite no mesmo conjunto de features: acurácia de cada um,
+    concordância entre as classes previstas e latência (melhor de `repeats` execuções).
+
+    Parâmetros:
+        keras_model (tensorflow.keras.Model): Modelo Keras de referência.
+        tflite_model (TFLiteModel): Backend TFLite a comparar.
+        features (numpy.ndarray): Features (N, 40, 44, 1).
+        labels (numpy.ndarray): Rótulos (N,) ou one-hot (N, num_classes).
+        repeats (int, opcional): Quantidade de execuções usadas na medição de latência.
+
+    Retorna:
+        dict: Métricas de cada backend ('keras' e 'tflite') e a concordância entre eles.
+    """
+    labels = np.asarray(labels)
+    if labels.ndim > 1:
+        labels = np.argmax(labels, axis=1)
+
+    report = {}
+    predictions = {}
+    for name, predict in (('keras', lambda x: keras_model.predict(x, verbose=0)),
+                          ('tflite', tflite_model.predict)):
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            probs = predict(features)
+            timings.append(time.perf_counter() - start)
+        predictions[name] = np.argmax(probs, axis=1)
+        seconds = min(timings)
+        report[name] = {
+            "accuracy": float(np.mean(predictions[name] == labels)),
+            "seconds": seconds,
+            "ms_per_segment": seconds / len(features) * 1000,
+        }
+    report["agreement"] = float(np.mean(predictions['keras'] == predictions['tflite']))
+    report["speedup"] = report['keras']['seconds'] / report['tflite']['seconds']
+    return report
@@ -0,0 +1,94 @@
+# /models/timeline.py
+import numpy as np  # type: ignore
+
+
+def quantize_probabilities(probabilities):
+    """Quantiza probabilidades em [0, 1] para bytes (um uint8 por segmento, resolução de 1/255)."""
+    return np.round(np.clip(probabilities, 0.0, 1.0) * 255).astype(np.uint8).tobytes()
+
+
+def dequantize_probabilities(data):
+    """Converte os bytes gravados por `quantize_probabilities` de volta para probabilidades (float32)."""
+    return np.frombuffer(data, dtype=np.uint8).astype(np.float32) / 255
+
+
+def run_length_episodes(snore):
+    """
+    Codifica em run-length os trechos consecutivos de segmentos com ronco.
+
+    Parâmetros:
+        snore (numpy.ndarray): Array booleano com um valor por segmento.
+
+    Retorna:
+        tuple: Dois arrays (starts, ends) com o primeiro segmento e o segmento seguinte ao último de cada
+               episódio (intervalos semiabertos [start, end)).
+    """
+    edges = np.diff(np.concatenate([[0], np.asarray(snore, dtype=np.int8), [0]]))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def downsample_curve(probabilities, points, agg='mean'):
+    """
+    Reduz a curva de probabilidades para no máximo `points` valores, agregando blocos consecutivos de
+    segmentos pela média (`agg='mean'`) ou pelo máximo (`agg='max'`).
+
+    Retorna:
+        tuple: (curva, segmentos_por_ponto).
+    """
+    probabilities = np.asarray(probabilities, dtype=np.float32)
+    if len(probabilities) == 0 or points <= 0:
+        return np.zeros(0, dtype=np.float32), 1
+    step = max(1, -(-len(probabilities) // points))
+    starts = np.arange(0, len(probabilities), step)
+    reducer = np.maximum if agg == 'max' else np.add
+    curve = reducer.reduceat(probabilities, starts)
+    if agg != 'max':
+        curve = curve / np.diff(np.append(starts, len(probabilities)))
+    return curve, step
+
+
+class SnoreTimeline:
+    def __init__(self, segment_duration=1.0, threshold=0.5):
+        """
+        Acumula a probabilidade de ronco de cada segmento de uma gravação, na ordem da avaliação, para que a
+        linha do tempo da noite possa ser gravada junto com o resultado (ver `AudioModel.insert_audio`).
+
+        Parâmetros:
+            segment_duration (float, opcional): Duração de cada segmento em segundos. Valor padrão é 1.0.
+            threshold (float, opcional): Probabilidade a partir da qual um segmento é considerado ronco nos
+                                         episódios. O padrão 0.5 equivale ao argmax das duas classes.
+        """
+        self.segment_duration = segment_duration
+        self.threshold = threshold
+        self._chunks = []
+
+    def append(self, probabilities):
+        """Acrescenta as probabilidades de ronco de segmentos consecutivos."""
+        self._chunks.append(np.asarray(probabilities, dtype=np.float32).reshape(-1))
+
+    @property
+    def probabilities(self):
+        if len(self._chunks) != 1:
+            self._chunks = [np.concatenate(self._chunks) if self._chunks else np.zeros(0, dtype=np.float32)]
+        return self._chunks[0]
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self._chunks)
+
+    def quantized(self):
+        """Retorna as probabilidades quantizadas em bytes (um uint8 por segmento)."""
+        return quantize_probabilities(self.probabilities)
+
+    def episodes(self):
+        """
+        Retorna os episódios de ronco como uma lista de tuplas (segmento_inicial, segmento_final, probabilidade_media),
+        com o segmento final exclusivo.
+        """
+        probabilities = self.probabilities
+        starts, ends = run_length_episodes(probabilities > self.threshold)
+        if len(starts) == 0:
+            return []
+        # Média de cada episódio pela soma acumulada
+        sums = np.cumsum(np.concatenate([[0.0], probabilities.astype(np.float64)]))
+        means = (sums[ends] - sums[starts]) / (ends - starts)
+        return [(int(s), int(e), float(m)) for s, e, m in zip(starts, ends, means)]
@@ -0,0 +1,20 @@
+import os
+import sys
+import pytest  # type: ignore
+
+# Os módulos do sonoSense são importados a partir da raiz do projeto (ex.: `from models.features import ...`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def controller(tmp_path_factory):
+    """Controller com um modelo de pesos fixos, sem depender de um modelo_sono.h5 treinado."""
+    import tensorflow as tf  # type: ignore
+    from controllers.controller import Controller
+    from models.model import build_model
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(tmp_path_factory.mktemp('modelo'))
+        ctrl = Controller()
+    tf.keras.utils.set_random_seed(42)
+    ctrl.model = build_model((40, 44, 1))
+    return ctrl
@@ -0,0 +1,139 @@
+import asyncio
+import sqlite3
+import threading
+import sqlglot  # type: ignore
+from sqlglot import exp  # type: ignore
+from mysql_mimic import MysqlServer, Session, ResultColumn, ColumnType  # type: ignore
+from mysql_mimic.charset import CharacterSet  # type: ignore
+
+# Tabelas do information_schema consultadas pelo AudioModel, recriadas a partir do catálogo do SQLite
+_INFO_SCHEMA = '''
+CREATE TABLE information_schema.COLUMNS (TABLE_SCHEMA TEXT, TABLE_NAME TEXT, COLUMN_NAME TEXT);
+CREATE TABLE information_schema.STATISTICS (TABLE_SCHEMA TEXT, TABLE_NAME TEXT, INDEX_NAME TEXT);
+'''
+
+
+class SQLiteSession(Session):
+    def __init__(self, db_path, database):
+        """
+        Sessão do servidor substituto: as consultas recebidas pelo protocolo do MySQL são traduzidas com o
+        sqlglot e executadas em um banco SQLite, com uma conexão (e uma transação) por cliente.
+        """
+        super().__init__()
+        self.db_path = db_path
+        self.schema_name = database
+        self.sqlite = None
+        self.last_insert_id = 0
+
+    async def init(self, connection):
+        await super().init(connection)
+        self.sqlite = sqlite3.connect(self.db_path, timeout=0.5)
+        self.sqlite.execute("ATTACH DATABASE ':memory:' AS information_schema")
+        self.sqlite.executescript(_INFO_SCHEMA)
+        # O pacote OK do mysql_mimic não informa o id gerado, usado pelo cliente em `cursor.lastrowid`
+        ok = connection.ok
+        connection.ok = lambda **kwargs: ok(**{'last_insert_id': self.last_insert_id, **kwargs})
+
+    async def close(self):
+        if self.sqlite is not None:
+            self.sqlite.close()
+            self.sqlite = None
+        await super().close()
+
+    async def _commit_middleware(self, q):
+        if isinstance(q.expression, exp.Commit):
+            self.sqlite.commit()
+            return [], []
+        return await q.next()
+
+    async def _rollback_middleware(self, q):
+        if isinstance(q.expression, exp.Rollback):
+            self.sqlite.rollback()
+            return [], []
+        return await q.next()
+
+    async def _info_schema_middleware(self, q):
+        # O information_schema é servido pelo SQLite (ver `_atualizar_info_schema`)
+        return await q.next()
+
+    async def query(self, expression, sql, attrs):
+        self.last_insert_id = 0
+        statements = self._traduzir(expression, sql)
+        if 'information_schema' in sql.lower():
+            self._atualizar_info_schema()
+        for statement in statements:
+            cursor = self.sqlite.execute(statement)
+        if cursor.description:
+            rows = cursor.fetchall()
+            return rows, [self._coluna(column[0], [row[i] for row in rows])
+                          for i, column in enumerate(cursor.description)]
+        if isinstance(expression, exp.Insert) or sql.lstrip().upper().startswith('REPLACE'):
+            self.last_insert_id = cursor.lastrowid or 0
+        return [], []
+
+    def _coluna(self, name, values):
+        # Colunas com bytes (ex.: audio_data) são enviadas como BLOB binário, como no MySQL; o tipo das demais
+        # é inferido pelo mysql_mimic a partir dos valores
+        if any(isinstance(value, bytes) for value in values):
+            return ResultColumn(name, ColumnType.LONG_BLOB, character_set=CharacterSet.binary)
+        return name
+
+    def _traduzir(self, expression, sql):
+        """Converte uma consulta do MySQL em uma ou mais consultas do SQLite."""
+        if isinstance(expression, exp.Command):
+            return [sql]  # Ex.: REPLACE INTO, com a mesma sintaxe no SQLite
+        statements = []
+        if isinstance(expression, exp.Create) and isinstance(expression.this, exp.Schema):
+            # Índices declarados no CREATE TABLE viram CREATE INDEX separados
+            table = expression.this.this.name
+            for index in list(expression.this.find_all(exp.IndexColumnConstraint)):
+                columns = ", ".join(c.sql('sqlite') for c in index.expressions)
+                statements.append(f"CREATE INDEX IF NOT EXISTS {index.this.name} ON {table} ({columns})")
+                index.pop()
+        # No MySQL, a barra invertida é o caractere de escape padrão do LIKE
+        expression = expression.transform(
+            lambda node: exp.Escape(this=node, expression=exp.Literal.string('\\'))
+            if isinstance(node, exp.Like) and not isinstance(node.parent, exp.Escape) else node)
+        return [expression.sql('sqlite')] + statements
+
+    def _atualizar_info_schema(self):
+        self.sqlite.execute("DELETE FROM information_schema.COLUMNS")
+        self.sqlite.execute("DELETE FROM information_schema.STATISTICS")
+        tables = [row[0] for row in self.sqlite.execute("SELECT name FROM main.sqlite_master WHERE type = 'table'")]
+        for table in tables:
+            self.sqlite.executemany(
+                "INSERT INTO information_schema.COLUMNS VALUES (?, ?, ?)",
+                [(self.schema_name, table, row[1]) for row in self.sqlite.execute(f"PRAGMA main.table_info({table})")])
+            self.sqlite.executemany(
+                "INSERT INTO information_schema.STATISTICS VALUES (?, ?, ?)",
+                [(self.schema_name, table, row[1]) for row in self.sqlite.execute(f"PRAGMA main.index_list({table})")])
+
+
+class MySQLStandIn:
+    def __init__(self, db_path, database='sonosense'):
+        """
+        Servidor local compatível com o protocolo do MySQL (mysql_mimic), com os dados em um arquivo SQLite,
+        para testar o AudioModel com o mysql.connector real: pool, transações e cursores.
+        """
+        self.db_path = db_path
+        self.database = database
+        self.port = None
+        self._loop = asyncio.new_event_loop()
+        self._server = MysqlServer(session_factory=lambda: SQLiteSession(db_path, database))
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._server.start_server(host='127.0.0.1', port=0), self._loop).result()
+        self.port = self._server.sockets()[0].getsockname()[1]
+        return self
+
+    def stop(self):
+        self._server.close()
+        asyncio.run_coroutine_threadsafe(self._server.wait_closed(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def config(self):
+        """Parâmetros de conexão para o AudioModel."""
+        return dict(host='127.0.0.1', port=self.port, user='root', password='', database=self.database)
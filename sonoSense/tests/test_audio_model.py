@@ -0,0 +1,175 @@
+import pytest  # type: ignore
+from mysql.connector.errors import PoolError  # type: ignore
+from models.audio_model import AudioModel
+from models.blob_store import LocalBlobStore
+
+pytest.importorskip('mysql_mimic')
+from mysql_standin import MySQLStandIn  # noqa: E402
+
+
+@pytest.fixture
+def servidor(tmp_path):
+    standin = MySQLStandIn(str(tmp_path / 'mysql.db')).start()
+    yield standin
+    standin.stop()
+
+
+@pytest.fixture
+def audio_model(servidor, tmp_path):
+    model = AudioModel(**servidor.config(), pool_size=2, pool_timeout=0.2,
+                       blob_store=LocalBlobStore(str(tmp_path / 'blobs')))
+    model.connect()
+    yield model
+    model.close_connection()
+
+
+def test_checkout_e_devolucao_ao_pool(audio_model):
+    primeira = audio_model._checkout()
+    segunda = audio_model._checkout()
+    # Com todas as conexões em uso, o checkout espera até pool_timeout e falha
+    with pytest.raises(PoolError):
+        audio_model._checkout()
+
+    primeira.close()  # Devolve a conexão ao pool
+    terceira = audio_model._checkout()
+    segunda.close()
+    terceira.close()
+
+    # Muitas operações seguidas não esgotam o pool: cada uma devolve a sua conexão
+    for _ in range(10):
+        assert audio_model.ping()
+
+
+def test_reconecta_conexao_que_caiu(audio_model):
+    for connection in audio_model._connections:
+        connection.close()
+    assert audio_model.ping()
+
+
+def test_insert_audio_retorna_id(audio_model):
+    primeiro = audio_model.insert_audio(None, 'noite1.wav', b'RIFF1', 'Sono saudável.', 12.5)
+    segundo = audio_model.insert_audio(None, 'noite2.wav', b'RIFF2', 'Sono saudável.', 3)
+    assert (primeiro, segundo) == (1, 2)
+
+    name, audio_data, resultado, percent_ronco = audio_model.get_audio(segundo)
+    assert (name, audio_data, resultado, float(percent_ronco)) == ('noite2.wav', b'RIFF2', 'Sono saudável.', 3.0)
+
+    # Atualização de um áudio existente mantém o id
+    assert audio_model.insert_audio(primeiro, 'noite1.wav', b'RIFF1', 'Reavaliado.', 30) == primeiro
+    assert audio_model.get_audio(primeiro)[2] == 'Reavaliado.'
+
+
+def test_insert_audios_em_lote(audio_model):
+    audios = [(f'noite{i}.wav', f'RIFF{i}'.encode(), 'ok', i) for i in range(7)]
+    assert audio_model.insert_audios(audios, batch_size=3) == 7
+    assert [row[1] for row in audio_model.iter_audios()] == [audio[0] for audio in audios]
+
+
+def test_paginacao_por_chave(audio_model):
+    audio_model.insert_audios([(f'noite_{i}.wav', b'', 'ok', i * 10) for i in range(7)]
+                              + [('noiteX.wav', b'', 'ok', 5)])
+
+    pagina1 = list(audio_model.iter_audios(limit=3))
+    pagina2 = list(audio_model.iter_audios(after_id=pagina1[-1][0], limit=3))
+    pagina3 = list(audio_model.iter_audios(after_id=pagina2[-1][0], limit=3))
+    assert [row[0] for row in pagina1 + pagina2 + pagina3] == list(range(1, 9))
+    assert len(pagina3) == 2
+
+    # Filtros combinados com a paginação, e prefixo de nome com '_' tratado literalmente
+    filtrados = list(audio_model.iter_audios(after_id=2, min_percent=20, max_percent=50, name='noite_'))
+    assert [(row[0], row[1]) for row in filtrados] == [(3, 'noite_2.wav'), (4, 'noite_3.wav'),
+                                                       (5, 'noite_4.wav'), (6, 'noite_5.wav')]
+
+    # Um gerador interrompido devolve a conexão ao pool
+    for _ in range(5):
+        gerador = audio_model.iter_audios(chunk_size=1)
+        next(gerador)
+        gerador.close()
+    assert audio_model.ping()
+
+
+def test_close_connection_encerra_as_conexoes(audio_model):
+    connections = list(audio_model._connections)
+    audio_model.close_connection()
+    assert audio_model.pool is None
+    assert not any(connection.is_connected() for connection in connections)
+
+    # O próximo acesso cria um pool novo
+    assert audio_model.ping()
+
+
+def test_migrate_blobs_sem_coluna_audio_data(audio_model):
+    # Tabelas criadas já com o blob store não têm a coluna audio_data
+    audio_model.insert_audio(None, 'noite.wav', b'RIFF', 'ok', 1)
+    assert audio_model.migrate_blobs() == 0
+
+
+def test_insert_audio_files_grava_apenas_metadados(audio_model, tmp_path):
+    paths = []
+    for i in range(3):
+        paths.append(tmp_path / f'noite{i}.wav')
+        paths[-1].write_bytes(f'RIFF{i}'.encode() * 1000)
+    assert audio_model.insert_audio_files([(p.name, str(p), 'ok', i) for i, p in enumerate(paths)]) == 3
+
+    for audio_id, path in enumerate(paths, start=1):
+        name, audio_data, _, _ = audio_model.get_audio(audio_id)
+        assert (name, audio_data) == (path.name, path.read_bytes())
+
+
+def test_cache_de_resultados_guarda_skipped_fraction(audio_model):
+    audio_model.save_cached_result('a' * 64, 'Sono saudável.', 12.5, 0.25)
+    audio_model.save_cached_result('b' * 64, 'Sono saudável.', 3)
+    assert audio_model.get_cached_result('a' * 64) == {"message": 'Sono saudável.', "percent_ronco": 12.5,
+                                                       "skipped_fraction": 0.25}
+    assert audio_model.get_cached_result('b' * 64) == {"message": 'Sono saudável.', "percent_ronco": 3.0}
+
+
+def test_cache_de_resultados_antigo_ganha_skipped_fraction(audio_model):
+    with audio_model._cursor(commit=True) as cursor:
+        cursor.execute("DROP TABLE resultados_cache")
+        cursor.execute("CREATE TABLE resultados_cache (cache_key CHAR(64) PRIMARY KEY, resultado TEXT NOT NULL, "
+                       "percent_ronco DOUBLE NOT NULL)")
+    audio_model.create_table()
+    audio_model.save_cached_result('a' * 64, 'ok', 1, 0.5)
+    assert audio_model.get_cached_result('a' * 64)["skipped_fraction"] == 0.5
+
+
+def test_connect_tenta_de_novo_se_a_criacao_das_tabelas_falhar(servidor, tmp_path, monkeypatch):
+    model = AudioModel(**servidor.config(), pool_size=2, blob_store=LocalBlobStore(str(tmp_path / 'blobs')))
+    create_table = model.create_table
+
+    def falha():
+        raise RuntimeError("falha ao criar as tabelas")
+    monkeypatch.setattr(model, 'create_table', falha)
+    with pytest.raises(RuntimeError):
+        model.connect()
+    assert model.pool is None and model._connections == []
+
+    # A próxima conexão cria o pool e as tabelas
+    monkeypatch.setattr(model, 'create_table', create_table)
+    model.connect()
+    assert model.insert_audio(None, 'noite.wav', b'RIFF', 'ok', 1) == 1
+    model.close_connection()
+
+
+def test_migrate_blobs_move_um_audio_por_vez(audio_model, servidor):
+    # Tabela anterior ao blob store, já com as colunas do blob store: os bytes ficam na coluna audio_data
+    import sqlite3
+    sqlite = sqlite3.connect(servidor.db_path)
+    sqlite.executescript("""
+        DROP TABLE audios;
+        CREATE TABLE audios (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, audio_hash TEXT,
+                             audio_size INTEGER, audio_format TEXT, audio_data BLOB, resultado TEXT NOT NULL,
+                             percent_ronco REAL NOT NULL);
+    """)
+    sqlite.executemany("INSERT INTO audios (name, audio_data, resultado, percent_ronco) VALUES (?, ?, 'ok', 1)",
+                       [(f'noite{i}.wav', f'RIFF{i}'.encode() * 100) for i in range(5)])
+    sqlite.commit()
+    sqlite.close()
+
+    assert audio_model.migrate_blobs(batch_size=2) == 5
+    for audio_id in range(1, 6):
+        name, audio_data, _, _ = audio_model.get_audio(audio_id)
+        assert audio_data == f'RIFF{audio_id - 1}'.encode() * 100
+    # Nada a migrar na segunda execução
+    assert audio_model.migrate_blobs(batch_size=2) == 0
@@ -0,0 +1,47 @@
+import sys
+import numpy as np  # type: ignore
+import pytest  # type: ignore
+import soundfile as sf  # type: ignore
+import avaliar_lote
+from models.feature_pipeline import get_pipeline, save_feature_pipeline
+
+
+@pytest.fixture
+def pasta_modelo(tmp_path, monkeypatch):
+    """Diretório de trabalho com um modelo_sono.h5 de pesos fixos e duas gravações curtas."""
+    import tensorflow as tf  # type: ignore
+    from models.model import build_model
+    tf.keras.utils.set_random_seed(42)
+    build_model((40, 44, 1)).save(str(tmp_path / 'modelo_sono.h5'))
+    save_feature_pipeline(str(tmp_path / 'modelo_sono.h5'), get_pipeline().describe())
+
+    gravacoes = tmp_path / 'gravacoes'
+    gravacoes.mkdir()
+    rng = np.random.default_rng(0)
+    for nome, sample_rate, duracao in (('noite1.wav', 22050, 3.5), ('noite2.wav', 16000, 2.0)):
+        sf.write(str(gravacoes / nome), (0.1 * rng.standard_normal(int(duracao * sample_rate))).astype(np.float32),
+                 sample_rate, subtype='PCM_16')
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def _executar(monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', ['avaliar_lote.py', *args])
+    avaliar_lote.main()
+
+
+def test_avalia_duas_gravacoes_e_retoma_pelo_checkpoint(pasta_modelo, monkeypatch, capsys):
+    _executar(monkeypatch, 'gravacoes', '--output', 'resultados.npz', '--workers', '1', '--batch-size', '4')
+
+    resultados = np.load(pasta_modelo / 'resultados.npz')
+    assert list(resultados['name']) == ['noite1.wav', 'noite2.wav']
+    assert list(resultados['status']) == ['done', 'done']
+    assert list(resultados['segments']) == [4, 2]
+    assert ((resultados['percent_ronco'] >= 0) & (resultados['percent_ronco'] <= 100)).all()
+    assert len(set(resultados['model_version'])) == 1
+
+    # Executar de novo não avalia nada: os dois arquivos já estão no checkpoint com esta versão do modelo
+    capsys.readouterr()
+    _executar(monkeypatch, 'gravacoes', '--output', 'resultados.npz', '--workers', '1')
+    assert "2 gravações; 2 já avaliadas" in capsys.readouterr().out
+    assert list(np.load(pasta_modelo / 'resultados.npz')['status']) == ['done', 'done']
@@ -0,0 +1,46 @@
+import numpy as np  # type: ignore
+from models.energy_gate import EnergyGate
+from models.features import IncrementalSegmentFeatures
+
+SAMPLE_RATE = 22050
+
+
+def _noite():
+    """10 s de silêncio (ruído a -80 dBFS) com ronco (tom de 150 Hz) nos segmentos 2, 3 e 7."""
+    rng = np.random.default_rng(0)
+    audio = 1e-4 * rng.standard_normal(10 * SAMPLE_RATE)
+    t = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+    for segmento in (2, 3, 7):
+        audio[segmento * SAMPLE_RATE:(segmento + 1) * SAMPLE_RATE] += 0.3 * np.sin(2 * np.pi * 150 * t)
+    return audio.astype(np.float32)
+
+
+def test_descarta_silencio_e_mantem_segmentos_altos():
+    mask = EnergyGate(rms_threshold_db=-50.0).candidates(_noite(), SAMPLE_RATE)
+    np.testing.assert_array_equal(np.flatnonzero(mask), [2, 3, 7])
+
+
+def test_fluxo_espectral_descarta_tom_estacionario():
+    # Um tom contínuo é alto, mas não varia: com o limiar de fluxo, só os inícios de ronco passam
+    audio = _noite()
+    t = np.arange(len(audio)) / SAMPLE_RATE
+    audio += (0.05 * np.sin(2 * np.pi * 1000 * t)).astype(np.float32)
+    rms_db, _ = EnergyGate().segment_stats(audio, SAMPLE_RATE, with_flux=False)
+    assert (rms_db > -50).all()
+    mask = EnergyGate(rms_threshold_db=-50.0, flux_threshold_db=2.0).candidates(audio, SAMPLE_RATE)
+    np.testing.assert_array_equal(np.flatnonzero(mask), [2, 7])
+
+
+def test_gate_por_partes_igual_ao_sinal_inteiro():
+    audio = _noite()
+    gate = EnergyGate(rms_threshold_db=-50.0, flux_threshold_db=1.0)
+    esperado = gate.candidates(audio, SAMPLE_RATE)
+
+    extractor = IncrementalSegmentFeatures(SAMPLE_RATE, gate=gate)
+    masks = []
+    for trecho in np.array_split(audio, 7):
+        extractor.push(trecho)
+        masks.append(extractor.mask)
+    extractor.finish()
+    masks.append(extractor.mask)
+    np.testing.assert_array_equal(np.concatenate(masks), esperado)
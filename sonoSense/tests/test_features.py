@@ -0,0 +1,80 @@
+import numpy as np  # type: ignore
+import pytest  # type: ignore
+import soundfile as sf  # type: ignore
+from models.features import extract_segment_features, stream_segment_features, IncrementalSegmentFeatures
+
+SAMPLE_RATE = 22050  # Taxa do pipeline de features: o caminho vetorizado não reamostra o sinal
+
+
+def _gravacao(n_samples):
+    """Sinal com ruído e um tom que liga e desliga, para que os segmentos tenham conteúdo diferente."""
+    rng = np.random.default_rng(0)
+    t = np.arange(n_samples) / SAMPLE_RATE
+    tone = 0.3 * np.sin(2 * np.pi * 180 * t) * (np.sin(2 * np.pi * 0.2 * t) > 0)
+    return (tone + 0.01 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+@pytest.mark.parametrize('n_samples, n_segments', [
+    (10 * SAMPLE_RATE, 10),  # Segmentos todos completos
+    (10 * SAMPLE_RATE + 8000, 11),  # Último segmento mais curto
+    (10 * SAMPLE_RATE + 1, 11),  # Último segmento com uma única amostra
+])
+def test_segmentos_vetorizados_iguais_ao_laco(controller, n_samples, n_segments):
+    audio = _gravacao(n_samples)
+    vetorizado = controller.extrair_segmentos(audio, SAMPLE_RATE, vectorized=True)
+    referencia = controller.extrair_segmentos(audio, SAMPLE_RATE, vectorized=False)
+
+    assert vetorizado.shape == referencia.shape == (n_segments, 40, 44, 1)
+    np.testing.assert_allclose(vetorizado, referencia, rtol=0, atol=1e-2)
+
+    pred_vetorizado = controller.predizer(vetorizado)
+    pred_referencia = controller.predizer(referencia)
+    np.testing.assert_allclose(pred_vetorizado, pred_referencia, rtol=0, atol=1e-4)
+    np.testing.assert_array_equal(np.argmax(pred_vetorizado, axis=1), np.argmax(pred_referencia, axis=1))
+
+
+def test_mascara_seleciona_os_mesmos_segmentos(controller):
+    audio = _gravacao(10 * SAMPLE_RATE + 8000)
+    mask = np.arange(11) % 3 != 0
+    referencia = controller.extrair_segmentos(audio, SAMPLE_RATE, vectorized=False)
+    np.testing.assert_allclose(controller.extrair_segmentos(audio, SAMPLE_RATE, mask=mask), referencia[mask],
+                               rtol=0, atol=1e-2)
+
+
+def _gravacao_na_taxa(n_samples, sample_rate):
+    rng = np.random.default_rng(1)
+    t = np.arange(n_samples) / sample_rate
+    tone = 0.3 * np.sin(2 * np.pi * 180 * t) * (np.sin(2 * np.pi * 0.2 * t) > 0)
+    return (tone + 0.01 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+@pytest.mark.parametrize('sample_rate', [16000, 22050, 44100, 48000])
+@pytest.mark.parametrize('seed', [0, 1])
+def test_incremental_igual_ao_vetorizado(sample_rate, seed):
+    # 6.4 s: o último segmento é incompleto
+    audio = _gravacao_na_taxa(int(6.4 * sample_rate), sample_rate)
+    referencia = extract_segment_features(audio, sample_rate)
+
+    # Trechos de tamanho aleatório, que cortam os segmentos em pontos quaisquer (inclusive trechos vazios)
+    rng = np.random.default_rng(seed)
+    cortes = np.sort(rng.integers(0, len(audio), size=12))
+    extractor = IncrementalSegmentFeatures(sample_rate)
+    partes = [extractor.push(trecho) for trecho in np.split(audio, cortes)]
+    partes.append(extractor.finish())
+    incremental = np.concatenate(partes)
+
+    assert incremental.shape == referencia.shape == (7, 40, 44, 1)
+    np.testing.assert_allclose(incremental, referencia, rtol=0, atol=1e-3)
+
+
+@pytest.mark.parametrize('sample_rate', [16000, 22050, 44100, 48000])
+def test_streaming_do_arquivo_igual_ao_vetorizado(tmp_path, sample_rate):
+    audio = _gravacao_na_taxa(int(5.3 * sample_rate), sample_rate)
+    path = str(tmp_path / 'noite.wav')
+    sf.write(path, audio, sample_rate, subtype='FLOAT')
+    referencia = extract_segment_features(audio, sample_rate)
+
+    # Blocos de 0.7 s: a fronteira entre blocos cai no meio dos segmentos
+    lotes = list(stream_segment_features(path, batch_size=4, block_duration=0.7))
+    assert [len(lote) for lote in lotes] == [4, 2]
+    np.testing.assert_allclose(np.concatenate(lotes), referencia, rtol=0, atol=1e-3)
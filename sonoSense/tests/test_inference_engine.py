@@ -0,0 +1,62 @@
+import time
+import threading
+import numpy as np  # type: ignore
+import pytest  # type: ignore
+from controllers.inference_engine import InferenceEngine
+
+
+def _predict(batch):
+    """Predição determinística por segmento: o resultado de um segmento não depende do lote."""
+    score = batch.mean(axis=(1, 2, 3))
+    return np.stack([1 - score, score], axis=1)
+
+
+def _requisicoes(n):
+    rng = np.random.default_rng(0)
+    return [rng.random((size, 40, 44, 1), dtype=np.float32) for size in rng.integers(1, 300, size=n)]
+
+
+def test_lotes_compartilhados_iguais_as_predicoes_individuais():
+    # O primeiro lote só é predito depois que todas as requisições estão na fila, para que os lotes seguintes
+    # juntem segmentos de várias requisições
+    liberar = threading.Event()
+
+    def predict(batch):
+        liberar.wait(timeout=10)
+        return _predict(batch)
+
+    engine = InferenceEngine(predict, max_batch_size=256, max_wait=0.02)
+    requisicoes = _requisicoes(12)
+    resultados = [None] * len(requisicoes)
+
+    def enviar(i):
+        resultados[i] = engine.predict(requisicoes[i])
+
+    threads = [threading.Thread(target=enviar, args=(i,)) for i in range(len(requisicoes))]
+    for thread in threads:
+        thread.start()
+    while engine.metrics()['requests'] < len(requisicoes):
+        time.sleep(0.001)
+    liberar.set()
+    for thread in threads:
+        thread.join()
+
+    for segmentos, resultado in zip(requisicoes, resultados):
+        np.testing.assert_allclose(resultado, _predict(segmentos), rtol=0, atol=1e-6)
+    metricas = engine.metrics()
+    assert metricas['segments'] == sum(len(r) for r in requisicoes)
+    assert metricas['max_batch_size_seen'] <= 256
+    assert metricas['batches'] < metricas['requests'] + sum(len(r) > 256 for r in requisicoes)
+    assert metricas['pending_segments'] == 0
+
+
+def test_requisicao_vazia_e_erro_na_predicao():
+    engine = InferenceEngine(_predict, max_batch_size=64)
+    assert engine.predict(np.zeros((0, 40, 44, 1), dtype=np.float32)).shape == (0, 2)
+
+    def falha(batch):
+        raise RuntimeError("modelo indisponível")
+
+    engine = InferenceEngine(falha, max_batch_size=64)
+    with pytest.raises(RuntimeError, match="modelo indisponível"):
+        engine.predict(np.ones((100, 40, 44, 1), dtype=np.float32))
@@ -0,0 +1,66 @@
+import io
+import time
+import numpy as np  # type: ignore
+import pytest  # type: ignore
+import soundfile as sf  # type: ignore
+from werkzeug.datastructures import FileStorage  # type: ignore
+from controllers.job_runner import JobRunner
+from models.job_store import JobStore
+
+
+class JobStoreComHistorico(JobStore):
+    """JobStore que guarda a sequência de status de cada job."""
+
+    def __init__(self, db_path):
+        self.historico = {}
+        super().__init__(db_path)
+
+    def create_job(self, job_id, filename, upload_path, params):
+        self.historico[job_id] = ['queued']
+        super().create_job(job_id, filename, upload_path, params)
+
+    def update_status(self, job_id, status, result=None, error=None):
+        self.historico[job_id].append(status)
+        super().update_status(job_id, status, result, error)
+
+
+@pytest.fixture
+def runner(controller, tmp_path):
+    runner = JobRunner(controller, JobStoreComHistorico(str(tmp_path / 'jobs.db')), workers=1,
+                       jobs_dir=str(tmp_path / 'jobs'))
+    yield runner
+    runner.dispatcher.shutdown(wait=True)
+    runner.process_pool.shutdown(wait=True)
+
+
+def _aguardar(job_store, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = job_store.get_job(job_id)
+        if job['status'] in ('done', 'error'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} não terminou em {timeout}s.")
+
+
+def test_job_vai_de_queued_a_done(runner):
+    buf = io.BytesIO()
+    sf.write(buf, (0.1 * np.random.default_rng(0).standard_normal(3 * 22050 + 500)).astype(np.float32), 22050,
+             format='WAV', subtype='PCM_16')
+    buf.seek(0)
+    job_id = runner.submit('noite.wav', FileStorage(buf, 'noite.wav'), {'segment_duration': 1.0, 'threshold': 20})
+
+    job = _aguardar(runner.job_store, job_id)
+    assert runner.job_store.historico[job_id] == ['queued', 'running', 'done']
+    assert job['error'] is None
+    assert 0 <= job['result']['percent_ronco'] <= 100
+    assert job['result']['message']
+
+
+def test_job_com_erro_guarda_a_mensagem(runner):
+    job_id = runner.submit('noite.wav', FileStorage(io.BytesIO(b'isto nao e audio'), 'noite.wav'), {})
+
+    job = _aguardar(runner.job_store, job_id)
+    assert runner.job_store.historico[job_id] == ['queued', 'running', 'error']
+    assert job['result'] is None
+    assert job['error']
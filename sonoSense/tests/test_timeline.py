@@ -0,0 +1,60 @@
+import numpy as np  # type: ignore
+import pytest  # type: ignore
+from models.timeline import (SnoreTimeline, run_length_episodes, downsample_curve, quantize_probabilities,
+                             dequantize_probabilities)
+
+
+@pytest.mark.parametrize('snore, episodios', [
+    ([], []),
+    ([False, False, False], []),
+    ([True, True, True, True], [(0, 4)]),
+    ([True, False, True, True, False], [(0, 1), (2, 4)]),
+    ([False, True, True], [(1, 3)]),
+])
+def test_run_length_episodes(snore, episodios):
+    starts, ends = run_length_episodes(np.array(snore, dtype=bool))
+    assert list(zip(starts.tolist(), ends.tolist())) == episodios
+
+
+def test_downsample_curve_vazia():
+    curve, step = downsample_curve([], 10)
+    assert len(curve) == 0 and step == 1
+    curve, step = downsample_curve([0.5, 0.2], 0)
+    assert len(curve) == 0 and step == 1
+
+
+def test_downsample_curve_com_mais_pontos_que_segmentos():
+    probabilities = np.array([0.1, 0.9, 0.4], dtype=np.float32)
+    curve, step = downsample_curve(probabilities, 100)
+    assert step == 1
+    np.testing.assert_array_equal(curve, probabilities)
+
+
+@pytest.mark.parametrize('agg, esperado', [('mean', [0.5, 0.5, 0.8]), ('max', [0.9, 0.6, 0.8])])
+def test_downsample_curve_agrega_blocos(agg, esperado):
+    # 5 segmentos em 3 pontos: blocos de 2, com o último bloco incompleto
+    curve, step = downsample_curve([0.1, 0.9, 0.4, 0.6, 0.8], 3, agg=agg)
+    assert step == 2
+    np.testing.assert_allclose(curve, esperado, rtol=1e-6)
+
+
+def test_episodios_da_linha_do_tempo():
+    timeline = SnoreTimeline(segment_duration=1.0)
+    assert timeline.episodes() == []
+    timeline.append([0.9, 0.8])
+    timeline.append([0.1])
+    timeline.append([0.7])
+    assert len(timeline) == 4
+    assert [(s, e) for s, e, _ in timeline.episodes()] == [(0, 2), (3, 4)]
+    assert timeline.episodes()[0][2] == pytest.approx(0.85)
+
+    # Linha do tempo toda com ronco: um único episódio
+    timeline = SnoreTimeline()
+    timeline.append(np.ones(5))
+    assert [(s, e) for s, e, _ in timeline.episodes()] == [(0, 5)]
+
+
+def test_quantizacao_ida_e_volta():
+    probabilities = np.array([0.0, 0.25, 1.0, 1.2, -0.1], dtype=np.float32)
+    np.testing.assert_allclose(dequantize_probabilities(quantize_probabilities(probabilities)),
+                               np.clip(probabilities, 0, 1), atol=1 / 255)
@@ -0,0 +1,133 @@
+import json
+import argparse
+import numpy as np  # type: ignore
+from controllers.controller import Controller
+from models.dataset import download_dataset, list_dataset_files
+from models.energy_gate import EnergyGate
+from models.features import extract_segment_features
+
+
+def _limiares(texto):
+    # Lista separada por vírgulas; um item vazio (ou "none") desativa o limiar
+    return [None if item.strip().lower() in ('', 'none') else float(item) for item in texto.split(',')]
+
+
+def avaliar_combinacoes(rms_db, flux_db, full_labels, labels, rms_values, flux_values):
+    """
+    Compara o caminho completo (todos os segmentos pelo modelo) com o caminho com gate para cada
+    combinação de limiares. Segmentos descartados pelo gate contam como sem ronco.
+
+    Parâmetros:
+        rms_db, flux_db (numpy.ndarray): Medidas de cada segmento (ver `EnergyGate.segment_stats`).
+        full_labels (numpy.ndarray): Classes previstas pelo modelo em todos os segmentos.
+        labels (numpy.ndarray, opcional): Rótulos verdadeiros. Se None, a acurácia não é calculada.
+        rms_values, flux_values (list): Limiares avaliados.
+
+    Retorna:
+        list: Um dicionário de métricas por combinação de limiares.
+    """
+    linhas = []
+    for rms in rms_values:
+        for flux in flux_values:
+            gate = EnergyGate(rms_threshold_db=rms if rms is not None else -np.inf, flux_threshold_db=flux)
+            mask = gate.apply(rms_db, flux_db)
+            gated_labels = np.where(mask, full_labels, 0)
+            full_snore = max(int(np.sum(full_labels)), 1)
+            linha = {
+                "rms_threshold_db": rms,
+                "flux_threshold_db": flux,
+                "skipped_fraction": float(1 - np.mean(mask)),
+                "agreement": float(np.mean(gated_labels == full_labels)),
+                # Fração dos segmentos com ronco do caminho completo que o gate descartou
+                "snore_lost_fraction": float(np.sum(full_labels & ~mask) / full_snore),
+                "percent_ronco_full": float(np.mean(full_labels) * 100),
+                "percent_ronco_gated": float(np.mean(gated_labels) * 100),
+            }
+            if labels is not None:
+                linha["accuracy_full"] = float(np.mean(full_labels == labels))
+                linha["accuracy_gated"] = float(np.mean(gated_labels == labels))
+            linhas.append(linha)
+    return linhas
+
+
+def _imprimir(titulo, linhas):
+    print(f"\n{titulo}")
+    print(f"{'rms_db':>8} {'flux_db':>8} {'descart.':>9} {'concord.':>9} {'ronco perdido':>14} "
+          f"{'acur. completo':>15} {'acur. gate':>11}")
+    for linha in linhas:
+        acc_full = f"{linha['accuracy_full'] * 100:.2f}%" if 'accuracy_full' in linha else '-'
+        acc_gated = f"{linha['accuracy_gated'] * 100:.2f}%" if 'accuracy_gated' in linha else '-'
+        print(f"{str(linha['rms_threshold_db']):>8} {str(linha['flux_threshold_db']):>8} "
+              f"{linha['skipped_fraction'] * 100:>8.1f}% {linha['agreement'] * 100:>8.2f}% "
+              f"{linha['snore_lost_fraction'] * 100:>13.2f}% {acc_full:>15} {acc_gated:>11}")
+
+
+def main():
+    """
+    Mede a perda de acurácia do gate de energia (`EnergyGate`) em relação ao caminho completo, para
+    escolher os limiares antes de ativá-lo na API (ENERGY_GATE=1, GATE_RMS_DB, GATE_FLUX_DB).
+
+    No dataset de ronco, cada clipe é um segmento: o modelo classifica todos os clipes uma única vez e
+    cada combinação de limiares é avaliada sobre as mesmas predições. Gravações completas informadas com
+    `--night` são avaliadas da mesma forma, segmento a segmento, comparando o percent_ronco.
+    """
+    parser = argparse.ArgumentParser(description="Valida os limiares do gate de energia.")
+    parser.add_argument("--dataset", default=None,
+                        help="Diretório do dataset (com a pasta 'Snoring Dataset'). Se omitido, baixa o dataset.")
+    parser.add_argument("--night", action="append", default=[], help="Gravação noturna a avaliar (repetível).")
+    parser.add_argument("--rms-db", default="none,-70,-60,-50,-40", help="Limiares de RMS (dBFS) avaliados.")
+    parser.add_argument("--flux-db", default="none,0.5,1.0,1.5", help="Limiares de fluxo espectral (dB) avaliados.")
+    parser.add_argument("--backend", default="keras", choices=["keras", "tflite"])
+    parser.add_argument("--segment-duration", type=float, default=1.0)
+    parser.add_argument("--output", default=None, help="Arquivo JSON onde gravar as métricas.")
+    args = parser.parse_args()
+
+    rms_values = _limiares(args.rms_db)
+    flux_values = _limiares(args.flux_db)
+    stats_gate = EnergyGate()
+    ctrl = Controller(backend=args.backend)
+    model = ctrl.obter_modelo()
+    if model is None:
+        raise SystemExit("Modelo não encontrado. Treine (ou exporte) o modelo antes de validar o gate.")
+
+    relatorio = {}
+
+    path = args.dataset or download_dataset()
+    rms_db, flux_db, features, labels = [], [], [], []
+    for file_path, label in list_dataset_files(path):
+        try:
+            audio, sample_rate = ctrl.pipeline.load(file_path)
+        except Exception as e:
+            print(f"Erro ao processar {file_path}: {e}")
+            continue
+        if len(audio) == 0:
+            continue
+        # O clipe inteiro é um único segmento, como em `extract_features`
+        rms, flux = stats_gate.segment_stats(audio, sample_rate, len(audio) / sample_rate)
+        rms_db.append(rms[0])
+        flux_db.append(flux[0])
+        features.append(ctrl.pipeline.clip_features(audio, sample_rate))
+        labels.append(label)
+
+    full_labels = np.argmax(model.predict(np.array(features)), axis=1).astype(bool)
+    relatorio["dataset"] = avaliar_combinacoes(np.array(rms_db), np.array(flux_db), full_labels,
+                                               np.array(labels).astype(bool), rms_values, flux_values)
+    _imprimir(f"Dataset ({len(labels)} clipes)", relatorio["dataset"])
+
+    for night in args.night:
+        # Na taxa das features, para que o gate e os MFCCs usem os mesmos segmentos (como em `avaliar_audio`)
+        audio, sample_rate = ctrl.pipeline.load(night)
+        rms, flux = stats_gate.segment_stats(audio, sample_rate, args.segment_duration)
+        segments = extract_segment_features(audio, sample_rate, args.segment_duration, pipeline=ctrl.pipeline)
+        night_labels = np.argmax(model.predict(segments), axis=1).astype(bool)
+        relatorio[night] = avaliar_combinacoes(rms, flux, night_labels, None, rms_values, flux_values)
+        _imprimir(f"Gravação {night} ({len(segments)} segmentos)", relatorio[night])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(relatorio, f, indent=2)
+        print(f"\nMétricas gravadas em {args.output}")
+
+
+if __name__ == '__main__':
+    main()